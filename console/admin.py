@@ -9,7 +9,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 
 from console.models import Block, Transaction, Pair, Position, PositionTransaction, BlackList, Bot, \
-                            Executor, PnL
+                            Executor, PnL, BytecodeTemplate
 
 class ConsoleAdminSite(admin.AdminSite):
     def index(self, request, extra_context=None):
@@ -167,6 +167,18 @@ class ExecutorAdmin(FullPermissionModelAdmin):
         <button><a class="btn" href="/admin/console/executor/{obj.id}/change/">Edit</a></button>&emsp;
         """)
        
+class BytecodeTemplateAdmin(FullPermissionModelAdmin):
+    list_filter = ['is_deleted', 'verdict']
+    list_display = ('id', 'code_hash', 'sample_token', 'verdict', 'observations', 'tax', 'contract_verified', 'buttons')
+    fields = ('code_hash', 'sample_token', 'code_size', 'verdict', 'observations', 'tax', 'contract_verified',)
+    readonly_fields = ('code_hash', 'sample_token', 'code_size',)
+    
+    @admin.display(description='Actions')
+    def buttons(self, obj):
+        return format_html(f"""
+        <button><a class="btn" href="/admin/console/bytecodetemplate/{obj.id}/change/">Edit</a></button>&emsp;
+        """)
+       
 admin_site = ConsoleAdminSite(name="console_admin")
 
 admin_site.register(Block, BlockAdmin)
@@ -176,4 +188,5 @@ admin_site.register(Position, PositionAdmin)
 admin_site.register(BlackList, BlacklistAdmin)
 admin_site.register(Bot, BotAdmin)
 admin_site.register(PnL, PnlAdmin)
-admin_site.register(Executor, ExecutorAdmin)
\ No newline at end of file
+admin_site.register(Executor, ExecutorAdmin)
+admin_site.register(BytecodeTemplate, BytecodeTemplateAdmin)
\ No newline at end of file
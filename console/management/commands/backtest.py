@@ -0,0 +1,79 @@
+import os
+import json
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from data import PairEventType
+from strategy import StrategyConfig, BacktestDataset, BacktestInspector, Backtester, load_recorded_inspections
+from console.models import HistoricalPair, PairEvent
+
+def load_dataset(from_block, to_block) -> BacktestDataset:
+    # pairs created in the range with their Sync/Swap events, as ingested by `ingest_history`
+    pairs = list(HistoricalPair.objects.filter(block_number__gte=from_block, block_number__lte=to_block)
+                 .order_by('block_number').values_list('address', 'token', 'token_index', 'block_number', 'block_timestamp'))
+    if len(pairs)==0:
+        raise CommandError(f"no ingested pair between #{from_block} and #{to_block}")
+
+    dataset = BacktestDataset(from_block, to_block, anchor_block=pairs[0][3], anchor_timestamp=pairs[0][4])
+    token_indices = {}
+    for address, token, token_index, block_number, _ in pairs:
+        dataset.add_pair(block_number, address, token, token_index)
+        token_indices[address] = token_index
+
+    events = PairEvent.objects.filter(pair__in=list(token_indices.keys()),
+                                      event_type__in=[PairEventType.SYNC, PairEventType.SWAP],
+                                      block_number__gte=from_block,
+                                      block_number__lte=to_block).order_by('block_number', 'log_index') \
+                                .values_list('pair', 'event_type', 'block_number', 'amount0_in', 'amount1_in', 'reserve0', 'reserve1')
+
+    for pair, event_type, block_number, amount0_in, amount1_in, reserve0, reserve1 in events.iterator(chunk_size=10000):
+        if event_type == PairEventType.SYNC:
+            dataset.add_sync(block_number, pair, int(reserve0), int(reserve1))
+        else:
+            dataset.add_swap(block_number, pair, int(amount1_in if token_indices[pair]==0 else amount0_in))
+
+    logging.warning(f"BACKTEST loaded {len(pairs)} pairs between #{from_block} and #{to_block}")
+    return dataset
+
+class Command(BaseCommand):
+    help = "Replay the ingested history through the strategy and report the simulated positions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-block', type=int, required=True)
+        parser.add_argument('--to-block', type=int, required=True)
+        parser.add_argument('--recorded', default=None, help="inspection results recorded by the live bot")
+        parser.add_argument('--fill-delay', type=int, default=1, help="blocks between an order and its fill")
+        parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE', help="override a strategy config value")
+        parser.add_argument('--output', default=None, help="write the positions and summary as json")
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level=logging.ERROR)
+
+        config = StrategyConfig.from_env()
+        for item in options['set']:
+            name, value = item.split('=', 1)
+            if not hasattr(config, name):
+                raise CommandError(f"unknown strategy config {name}")
+            setattr(config, name, type(getattr(config, name))(value))
+
+        dataset = load_dataset(options['from_block'], options['to_block'])
+        inspector = BacktestInspector(dataset,
+                                      reserve_eth_min=float(os.environ.get('RESERVE_ETH_MIN_THRESHOLD')),
+                                      reserve_eth_max=float(os.environ.get('RESERVE_ETH_MAX_THRESHOLD')),
+                                      price_impact_max=float(os.environ.get('PRICE_IMPACT_MAX_THRESHOLD', '500')),
+                                      recorded=load_recorded_inspections(options['recorded']) if options['recorded'] is not None else None)
+
+        result = Backtester(dataset, config, inspector, options['fill_delay']).run()
+        for position in result.positions:
+            self.stdout.write(str(position))
+        self.stdout.write(json.dumps(result.summary()))
+
+        if options['output'] is not None:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'config': config.__dict__,
+                    'summary': result.summary(),
+                    'positions': [{**position.__dict__, 'amount_in': float(position.amount_in), 'amount_token': float(position.amount_token),
+                                   'amount_out': float(position.amount_out), 'profit': float(position.profit), 'pnl': float(position.pnl)} for position in result.positions],
+                }, f, indent=2)
@@ -0,0 +1,220 @@
+import os
+import io
+import csv
+import bisect
+import logging
+
+from web3 import Web3
+from web3.middleware import geth_poa_middleware
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from library import LogIngestor, PAIR_CREATED_TOPIC, SYNC_TOPIC, SWAP_TOPIC, MINT_TOPIC, BURN_TOPIC, \
+                    log_topic, decode_pair_created_log, decode_sync_log, decode_swap_log, decode_mint_log, decode_burn_log
+from data import PairEventType
+from console.models import HistoricalPair, IngestionCheckpoint
+
+ADDRESS_BATCH_SIZE = 500 # pair addresses per eth_getLogs
+
+PAIR_COLUMNS = ['address', 'token', 'token_index', 'block_number', 'block_timestamp', 'tx_hash']
+EVENT_COLUMNS = ['pair', 'event_type', 'block_number', 'log_index', 'tx_hash', 'sender', 'to',
+                 'amount0_in', 'amount1_in', 'amount0_out', 'amount1_out', 'reserve0', 'reserve1']
+
+class Command(BaseCommand):
+    help = "Ingest PairCreated/Sync/Swap/Mint/Burn events of the WETH pairs of the configured factory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-block', type=int, required=True)
+        parser.add_argument('--to-block', type=int, default=None, help="defaults to the latest block")
+        parser.add_argument('--phase', choices=['all', 'pairs', 'events'], default='all')
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--reset', action='store_true', help="ignore the saved checkpoints")
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level=logging.INFO)
+
+        self.w3 = Web3(Web3.HTTPProvider(os.environ.get('HTTPS_URL'), request_kwargs={'timeout': 60}))
+        self.w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+        self.factory = Web3.to_checksum_address(os.environ.get('FACTORY_ADDRESS'))
+        self.weth = os.environ.get('WETH_ADDRESS').lower()
+
+        to_block = options['to_block'] if options['to_block'] is not None else self.w3.eth.block_number
+
+        # events are only fetched for known pairs, so pairs are always ingested first
+        if options['phase'] in ['all', 'pairs']:
+            self.ingest(f"pairs:{self.factory.lower()}", options['from_block'], to_block, options, self.fetch_pairs, self.copy_pairs)
+        if options['phase'] in ['all', 'events']:
+            self.load_pairs()
+            if not options['reset']:
+                self.catch_up_events(f"events:{self.factory.lower()}", options)
+            self.ingest(f"events:{self.factory.lower()}", options['from_block'], to_block, options, self.fetch_events, self.copy_events, self.mark_events)
+
+    def ingest(self, name, from_block, to_block, options, fetch, copy, consumed=None):
+        checkpoint = IngestionCheckpoint.objects.filter(name=name).first()
+        if checkpoint is None:
+            checkpoint = IngestionCheckpoint(name=name, from_block=from_block, to_block=to_block, last_block=from_block - 1)
+        elif options['reset'] or checkpoint.last_block < from_block - 1:
+            checkpoint.from_block = from_block
+            checkpoint.last_block = from_block - 1
+        checkpoint.to_block = to_block
+        checkpoint.save()
+
+        start_block = max(from_block, checkpoint.last_block + 1)
+        if start_block > to_block:
+            logging.warning(f"INGESTOR {name} already ingested up to #{checkpoint.last_block}")
+            return
+
+        logging.warning(f"INGESTOR {name} from #{start_block} to #{to_block}")
+
+        def consume(start, end, rows):
+            if len(rows)>0:
+                copy(rows)
+            if consumed is not None:
+                consumed(start, end)
+            checkpoint.last_block = end
+            checkpoint.save(update_fields=['last_block', 'updated_at'])
+
+        ingestor = LogIngestor(max_workers=options['workers'], chunk_size=options['chunk_size'])
+        fetched = ingestor.run(start_block, to_block, fetch, consume)
+        logging.warning(f"INGESTOR {name} done with {fetched} rows")
+
+    def get_logs(self, address, topics, from_block, to_block):
+        return self.w3.eth.get_logs({
+            'address': address,
+            'topics': [topics],
+            'fromBlock': from_block,
+            'toBlock': to_block,
+        })
+
+    def fetch_pairs(self, from_block, to_block):
+        logs = [decode_pair_created_log(log) for log in self.get_logs(self.factory, [Web3.to_hex(PAIR_CREATED_TOPIC)], from_block, to_block)]
+        logs = [log for log in logs if log['args']['token0'].lower()==self.weth or log['args']['token1'].lower()==self.weth]
+
+        timestamps = {number: self.w3.eth.get_block(number)['timestamp'] for number in set(log['blockNumber'] for log in logs)}
+
+        rows = []
+        for log in logs:
+            token_index = 0 if log['args']['token1'].lower()==self.weth else 1
+            rows.append([
+                log['args']['pair'].lower(),
+                log['args']['token0'].lower() if token_index==0 else log['args']['token1'].lower(),
+                token_index,
+                log['blockNumber'],
+                timestamps[log['blockNumber']],
+                Web3.to_hex(log['transactionHash']),
+            ])
+        return rows
+
+    def load_pairs(self):
+        pairs = HistoricalPair.objects.order_by('block_number').values_list('block_number', 'address', 'id')
+        self.pair_blocks = [pair[0] for pair in pairs]
+        self.pair_addresses = [Web3.to_checksum_address(pair[1]) for pair in pairs]
+        # pairs inserted later are not swept by this run, they are caught up by the next one
+        self.pair_max_id = max([pair[2] for pair in pairs], default=0)
+        logging.warning(f"INGESTOR loaded {len(self.pair_addresses)} pairs")
+
+    def mark_events(self, start, end):
+        # the sweep covers the pairs created up to `end` from `start` on
+        HistoricalPair.objects.filter(events_from_block__isnull=True, block_number__lte=end, id__lte=self.pair_max_id).update(events_from_block=start)
+
+    def catch_up_events(self, name, options):
+        # the events checkpoint is per factory, a pair ingested after the sweep passed its creation block (pairs
+        # phase run later or over an older range) misses its events from creation to where the sweep picked it up
+        checkpoint = IngestionCheckpoint.objects.filter(name=name).first()
+        if checkpoint is None or checkpoint.last_block < checkpoint.from_block or checkpoint.last_block < options['from_block'] - 1:
+            return
+
+        pairs = HistoricalPair.objects.filter(id__lte=self.pair_max_id, block_number__lte=checkpoint.last_block) \
+            .filter(Q(events_from_block__isnull=True) | Q(events_from_block__gt=checkpoint.from_block)) \
+            .values_list('id', 'address', 'block_number', 'events_from_block')
+        missed = []
+        for pair_id,address,block_number,events_from_block in pairs:
+            start = max(block_number, checkpoint.from_block)
+            end = events_from_block - 1 if events_from_block is not None else checkpoint.last_block
+            if start <= end:
+                missed.append((pair_id, Web3.to_checksum_address(address), start, end))
+        if len(missed)==0:
+            return
+
+        from_block, to_block = min([pair[2] for pair in missed]), max([pair[3] for pair in missed])
+        logging.warning(f"INGESTOR {name} catching up {len(missed)} pairs from #{from_block} to #{to_block}")
+
+        def fetch(start, end):
+            # events out of the missed range of a pair are already ingested, the insert skips them
+            return self.fetch_event_rows([pair[1] for pair in missed if pair[2] <= end and pair[3] >= start], start, end)
+
+        def consume(start, end, rows):
+            if len(rows)>0:
+                self.copy_events(rows)
+
+        ingestor = LogIngestor(max_workers=options['workers'], chunk_size=options['chunk_size'])
+        fetched = ingestor.run(from_block, to_block, fetch, consume)
+        for pair_id,_,start,_ in missed:
+            HistoricalPair.objects.filter(id=pair_id).update(events_from_block=start)
+        logging.warning(f"INGESTOR {name} caught up with {fetched} rows")
+
+    def fetch_events(self, from_block, to_block):
+        # pairs created up to the end of the range
+        return self.fetch_event_rows(self.pair_addresses[:bisect.bisect_right(self.pair_blocks, to_block)], from_block, to_block)
+
+    def fetch_event_rows(self, addresses, from_block, to_block):
+        topics = [Web3.to_hex(topic) for topic in [SYNC_TOPIC, SWAP_TOPIC, MINT_TOPIC, BURN_TOPIC]]
+
+        rows = []
+        for idx in range(0, len(addresses), ADDRESS_BATCH_SIZE):
+            for log in self.get_logs(addresses[idx:idx+ADDRESS_BATCH_SIZE], topics, from_block, to_block):
+                rows.append(self.build_event_row(log))
+        return rows
+
+    def build_event_row(self, log):
+        topic = log_topic(log)
+        if topic == SYNC_TOPIC:
+            log = decode_sync_log(log)
+            event_type, sender, to = PairEventType.SYNC, None, None
+            amounts = [None, None, None, None, log['args']['reserve0'], log['args']['reserve1']]
+        elif topic == SWAP_TOPIC:
+            log = decode_swap_log(log)
+            event_type, sender, to = PairEventType.SWAP, log['args']['sender'], log['args']['to']
+            amounts = [log['args']['amount0In'], log['args']['amount1In'], log['args']['amount0Out'], log['args']['amount1Out'], None, None]
+        elif topic == MINT_TOPIC:
+            log = decode_mint_log(log)
+            event_type, sender, to = PairEventType.MINT, log['args']['sender'], None
+            amounts = [log['args']['amount0'], log['args']['amount1'], None, None, None, None]
+        else:
+            log = decode_burn_log(log)
+            event_type, sender, to = PairEventType.BURN, log['args']['sender'], log['args']['to']
+            amounts = [None, None, log['args']['amount0'], log['args']['amount1'], None, None]
+
+        return [
+            log['address'].lower(),
+            int(event_type),
+            log['blockNumber'],
+            log['logIndex'],
+            Web3.to_hex(log['transactionHash']),
+            sender.lower() if sender is not None else None,
+            to.lower() if to is not None else None,
+        ] + amounts
+
+    def copy_pairs(self, rows):
+        self.copy_rows('historical_pair', PAIR_COLUMNS, rows, {'created_at': 'now()', 'updated_at': 'now()', 'is_deleted': '0'})
+
+    def copy_events(self, rows):
+        self.copy_rows('pair_event', EVENT_COLUMNS, rows, {'created_at': 'now()', 'updated_at': 'now()', 'is_deleted': '0'})
+
+    def copy_rows(self, table, columns, rows, defaults={}):
+        # COPY into a staging table then insert, so that re-ingested ranges are skipped instead of failing
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([['' if value is None else value for value in row] for row in rows])
+        buffer.seek(0)
+
+        column_list = ', '.join([f'"{column}"' for column in columns])
+        # the model defaults (auto_now_add, is_deleted) are not applied by COPY nor INSERT ... SELECT
+        insert_list = ', '.join([column_list] + [f'"{column}"' for column in defaults])
+        select_list = ', '.join([column_list] + list(defaults.values()))
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"CREATE TEMP TABLE staging_{table} ON COMMIT DROP AS SELECT {column_list} FROM {table} WITH NO DATA")
+                cursor.copy_expert(f"COPY staging_{table} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+                cursor.execute(f"INSERT INTO {table} ({insert_list}) SELECT {select_list} FROM staging_{table} ON CONFLICT DO NOTHING")
@@ -0,0 +1,62 @@
+import os
+import json
+import logging
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from strategy import StrategyConfig, SweepParameter, ParameterSweep, frontier
+from console.management.commands.backtest import load_dataset
+
+class Command(BaseCommand):
+    help = "Search the strategy config over the ingested history with backtests fanned across processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-block', type=int, required=True)
+        parser.add_argument('--to-block', type=int, required=True)
+        parser.add_argument('--method', choices=['grid', 'random', 'bayes'], default='bayes')
+        parser.add_argument('--param', action='append', required=True, metavar='NAME=LOW:HIGH|NAME=V1,V2', help="strategy config value to search")
+        parser.add_argument('--trials', type=int, default=100, help="number of backtests of random and bayesian searches")
+        parser.add_argument('--grid-steps', type=int, default=5, help="values per range parameter of grid searches")
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--recorded', default=None, help="inspection results recorded by the live bot")
+        parser.add_argument('--fill-delay', type=int, default=1, help="blocks between an order and its fill")
+        parser.add_argument('--objective', default='total_profit', choices=['total_profit', 'total_pnl', 'win_rate'])
+        parser.add_argument('--output', default=None, help="write every trial and the frontier as json")
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level=logging.WARNING)
+
+        config = StrategyConfig.from_env()
+        try:
+            parameters = [SweepParameter.parse(spec, config) for spec in options['param']]
+        except ValueError as e:
+            raise CommandError(e)
+
+        dataset = load_dataset(options['from_block'], options['to_block'])
+        inspector_kwargs = {
+            'reserve_eth_min': float(os.environ.get('RESERVE_ETH_MIN_THRESHOLD')),
+            'reserve_eth_max': float(os.environ.get('RESERVE_ETH_MAX_THRESHOLD')),
+            'price_impact_max': float(os.environ.get('PRICE_IMPACT_MAX_THRESHOLD', '500')),
+        }
+
+        with tempfile.TemporaryDirectory() as directory:
+            # workers memory-map these arrays rather than unpickling the dataset each
+            dataset.save(directory)
+            del dataset
+
+            sweep = ParameterSweep(directory, config, parameters, inspector_kwargs, options['recorded'], options['workers'], options['fill_delay'], options['objective'])
+            trials = sweep.run(options['method'], options['trials'], options['seed'], options['grid_steps'])
+
+        pareto = frontier(trials, options['objective'])
+        self.stdout.write(f"{len(trials)} trials, frontier of {options['objective']} against max_drawdown:")
+        for params, summary in pareto:
+            self.stdout.write(f"{json.dumps(params)} {options['objective']} {summary[options['objective']]} max_drawdown {summary['max_drawdown']} positions {summary['positions']}")
+
+        if options['output'] is not None:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'trials': [{'params': params, 'summary': summary} for params, summary in trials],
+                    'frontier': [{'params': params, 'summary': summary} for params, summary in pareto],
+                }, f, indent=2)
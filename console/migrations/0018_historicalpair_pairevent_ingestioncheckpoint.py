@@ -0,0 +1,84 @@
+# Generated by Django 5.0.6 on 2024-09-02 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("console", "0017_pnl_number_failed"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HistoricalPair",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("address", models.CharField(max_length=42, unique=True)),
+                ("token", models.CharField(max_length=42)),
+                ("token_index", models.IntegerField(default=0, null=True)),
+                ("block_number", models.BigIntegerField()),
+                ("block_timestamp", models.BigIntegerField(default=0, null=True)),
+                ("tx_hash", models.CharField(max_length=66, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True, null=True)),
+                ("is_deleted", models.IntegerField(default=0, null=True)),
+            ],
+            options={
+                "db_table": "historical_pair",
+                "indexes": [
+                    models.Index(
+                        fields=["block_number"], name="historical__block_n_a609b0_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="PairEvent",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("pair", models.CharField(max_length=42)),
+                ("event_type", models.IntegerField()),
+                ("block_number", models.BigIntegerField()),
+                ("log_index", models.IntegerField()),
+                ("tx_hash", models.CharField(max_length=66)),
+                ("sender", models.CharField(max_length=42, null=True)),
+                ("to", models.CharField(max_length=42, null=True)),
+                ("amount0_in", models.DecimalField(decimal_places=0, max_digits=78, null=True)),
+                ("amount1_in", models.DecimalField(decimal_places=0, max_digits=78, null=True)),
+                ("amount0_out", models.DecimalField(decimal_places=0, max_digits=78, null=True)),
+                ("amount1_out", models.DecimalField(decimal_places=0, max_digits=78, null=True)),
+                ("reserve0", models.DecimalField(decimal_places=0, max_digits=78, null=True)),
+                ("reserve1", models.DecimalField(decimal_places=0, max_digits=78, null=True)),
+            ],
+            options={
+                "db_table": "pair_event",
+                "indexes": [
+                    models.Index(
+                        fields=["pair", "block_number"], name="pair_event_pair_bc4e89_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("block_number", "log_index"), name="pair_event_block_log_uniq"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="IngestionCheckpoint",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("from_block", models.BigIntegerField()),
+                ("to_block", models.BigIntegerField()),
+                ("last_block", models.BigIntegerField()),
+                ("created_at", models.DateTimeField(auto_now_add=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True, null=True)),
+                ("is_deleted", models.IntegerField(default=0, null=True)),
+            ],
+            options={
+                "db_table": "ingestion_checkpoint",
+            },
+        ),
+    ]
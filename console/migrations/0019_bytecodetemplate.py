@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2024-09-10 08:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("console", "0018_historicalpair_pairevent_ingestioncheckpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BytecodeTemplate",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("code_hash", models.CharField(max_length=66, unique=True)),
+                ("sample_token", models.CharField(max_length=42)),
+                ("code_size", models.IntegerField(default=0, null=True)),
+                ("verdict", models.IntegerField(default=0, null=True)),
+                ("observations", models.IntegerField(default=0, null=True)),
+                ("tax", models.FloatField(default=0, null=True)),
+                ("contract_verified", models.BooleanField(default=False, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True, null=True)),
+                ("is_deleted", models.IntegerField(default=0, null=True)),
+            ],
+            options={
+                "db_table": "bytecode_template",
+            },
+        ),
+    ]
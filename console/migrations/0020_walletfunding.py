@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('console', '0019_bytecodetemplate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletFunding',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('address', models.CharField(max_length=42, unique=True)),
+                ('funder', models.CharField(max_length=42, null=True)),
+                ('funded_block', models.BigIntegerField(null=True)),
+                ('funder_is_hub', models.BooleanField(default=False, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True)),
+                ('is_deleted', models.IntegerField(default=0, null=True)),
+            ],
+            options={
+                'db_table': 'wallet_funding',
+                'indexes': [models.Index(fields=['funder'], name='wallet_fund_funder_4e0ada_idx')],
+            },
+        ),
+    ]
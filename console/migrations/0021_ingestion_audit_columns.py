@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('console', '0020_walletfunding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalpair',
+            name='events_from_block',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='pairevent',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pairevent',
+            name='is_deleted',
+            field=models.IntegerField(default=0, null=True),
+        ),
+        migrations.AddField(
+            model_name='pairevent',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+    ]
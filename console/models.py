@@ -191,5 +191,120 @@ class Executor(models.Model):
 
     def __str__(self) -> str:
         return f"{self.address}"
-    
 
+class HistoricalPair(models.Model):
+    class Meta():
+        db_table = 'historical_pair'
+        indexes = [
+            models.Index(fields=['block_number']),
+        ]
+
+    id = models.BigAutoField(primary_key=True)
+    address = models.CharField(max_length=42, unique=True)
+    token = models.CharField(max_length=42)
+    token_index = models.IntegerField(null=True, default=0)
+    block_number = models.BigIntegerField()
+    block_timestamp = models.BigIntegerField(null=True, default=0)
+    tx_hash = models.CharField(max_length=66, null=True)
+    # first block from which the events of the pair are ingested, None until an events run covers the pair
+    events_from_block = models.BigIntegerField(null=True)
+
+    created_at = models.DateTimeField(null=True,auto_now_add=True)
+    updated_at = models.DateTimeField(null=True,auto_now=True)
+    is_deleted = models.IntegerField(null=True,default=0)
+
+    def __str__(self) -> str:
+        return f"{self.address}"
+
+class PairEvent(models.Model):
+    class Meta():
+        db_table = 'pair_event'
+        constraints = [
+            models.UniqueConstraint(fields=['block_number', 'log_index'], name='pair_event_block_log_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['pair', 'block_number']),
+        ]
+
+    # raw uint amounts, up to 78 digits
+    id = models.BigAutoField(primary_key=True)
+    pair = models.CharField(max_length=42)
+    event_type = models.IntegerField()
+    block_number = models.BigIntegerField()
+    log_index = models.IntegerField()
+    tx_hash = models.CharField(max_length=66)
+    sender = models.CharField(max_length=42, null=True)
+    to = models.CharField(max_length=42, null=True)
+    amount0_in = models.DecimalField(max_digits=78, decimal_places=0, null=True)
+    amount1_in = models.DecimalField(max_digits=78, decimal_places=0, null=True)
+    amount0_out = models.DecimalField(max_digits=78, decimal_places=0, null=True)
+    amount1_out = models.DecimalField(max_digits=78, decimal_places=0, null=True)
+    reserve0 = models.DecimalField(max_digits=78, decimal_places=0, null=True)
+    reserve1 = models.DecimalField(max_digits=78, decimal_places=0, null=True)
+
+    created_at = models.DateTimeField(null=True,auto_now_add=True)
+    updated_at = models.DateTimeField(null=True,auto_now=True)
+    is_deleted = models.IntegerField(null=True,default=0)
+
+    def __str__(self) -> str:
+        return f"{self.pair} #{self.block_number}/{self.log_index}"
+
+class IngestionCheckpoint(models.Model):
+    class Meta():
+        db_table = 'ingestion_checkpoint'
+
+    id = models.BigAutoField(primary_key=True)
+    name = models.CharField(max_length=100, unique=True)
+    from_block = models.BigIntegerField()
+    to_block = models.BigIntegerField()
+    last_block = models.BigIntegerField()
+
+    created_at = models.DateTimeField(null=True,auto_now_add=True)
+    updated_at = models.DateTimeField(null=True,auto_now=True)
+    is_deleted = models.IntegerField(null=True,default=0)
+
+    def __str__(self) -> str:
+        return f"{self.name}"
+
+
+class BytecodeTemplate(models.Model):
+    class Meta():
+        db_table = 'bytecode_template'
+
+    # verdict of the token contracts sharing a normalized runtime code
+    id = models.BigAutoField(primary_key=True)
+    code_hash = models.CharField(max_length=66, unique=True)
+    sample_token = models.CharField(max_length=42)
+    code_size = models.IntegerField(null=True, default=0)
+    verdict = models.IntegerField(null=True, default=0)
+    observations = models.IntegerField(null=True, default=0)
+    tax = models.FloatField(null=True, default=0)
+    contract_verified = models.BooleanField(null=True, default=False)
+
+    created_at = models.DateTimeField(null=True,auto_now_add=True)
+    updated_at = models.DateTimeField(null=True,auto_now=True)
+    is_deleted = models.IntegerField(null=True,default=0)
+
+    def __str__(self) -> str:
+        return f"{self.code_hash}"
+
+class WalletFunding(models.Model):
+    class Meta():
+        db_table = 'wallet_funding'
+        indexes = [
+            models.Index(fields=['funder']),
+        ]
+
+    # first ETH transfer received by a wallet, funder is null when none was found
+    id = models.BigAutoField(primary_key=True)
+    address = models.CharField(max_length=42, unique=True)
+    funder = models.CharField(max_length=42, null=True)
+    funded_block = models.BigIntegerField(null=True)
+    funder_is_hub = models.BooleanField(null=True, default=False)
+
+    created_at = models.DateTimeField(null=True,auto_now_add=True)
+    updated_at = models.DateTimeField(null=True,auto_now=True)
+    is_deleted = models.IntegerField(null=True,default=0)
+
+    def __str__(self) -> str:
+        return f"{self.address}"
@@ -1,4 +1,5 @@
 import os
+import time
 from decimal import Decimal
 
 class Pair:
@@ -28,7 +29,7 @@ class Pair:
         """
 
 class BlockData:
-    def __init__(self, block_number, block_timestamp, base_fee, gas_used, gas_limit, pairs=[], inventory=[], watchlist=[]) -> None:
+    def __init__(self, block_number, block_timestamp, base_fee, gas_used, gas_limit, pairs=[], inventory=[], watchlist=[], trace=None) -> None:
         self.block_number = block_number
         self.block_timestamp = block_timestamp
         self.base_fee = base_fee
@@ -37,6 +38,7 @@ class BlockData:
         self.pairs = pairs
         self.inventory = inventory
         self.watchlist = watchlist
+        self.trace = trace
 
     def __str__(self) -> str:
         return f"""
@@ -59,7 +61,7 @@ class Position:
         return f"Position {self.pair.address} amount {self.amount} buyPrice {self.buy_price} startTime {self.start_time} signer {self.signer} bot {self.bot} pnl {self.pnl}"
    
 class ExecutionOrder:
-    def __init__(self, block_number, block_timestamp, pair: Pair, amount_in, amount_out_min, is_buy, signer=None, bot=None, position:Position = None) -> None:
+    def __init__(self, block_number, block_timestamp, pair: Pair, amount_in, amount_out_min, is_buy, signer=None, bot=None, position:Position = None, is_urgent=False, trace=None) -> None:
         self.block_number = block_number
         self.block_timestamp = block_timestamp
         self.pair = pair
@@ -69,12 +71,14 @@ class ExecutionOrder:
         self.signer = signer
         self.bot = bot
         self.position = position
+        self.is_urgent = is_urgent
+        self.trace = trace
 
     def __str__(self) -> str:
-        return f"ExecutionOrder Block #{self.block_number} Pair {self.pair.address} AmountIn {self.amount_in} AmountOutMin {self.amount_out_min} Signer {self.signer} Bot {self.bot} isBuy {self.is_buy}"
+        return f"ExecutionOrder Block #{self.block_number} Pair {self.pair.address} AmountIn {self.amount_in} AmountOutMin {self.amount_out_min} Signer {self.signer} Bot {self.bot} isBuy {self.is_buy} isUrgent {self.is_urgent}"
     
 class ExecutionAck:
-    def __init__(self, lead_block, block_number, tx_hash, tx_status, pair: Pair, amount_in, amount_out, is_buy, signer=None, bot=None, position: Position = None) -> None:
+    def __init__(self, lead_block, block_number, tx_hash, tx_status, pair: Pair, amount_in, amount_out, is_buy, signer=None, bot=None, position: Position = None, trace=None) -> None:
         self.lead_block = lead_block
         self.block_number = block_number
         self.tx_hash = tx_hash
@@ -86,6 +90,7 @@ class ExecutionAck:
         self.signer = signer
         self.bot = bot
         self.position = position
+        self.trace = trace
 
     def __str__(self) -> str:
         return f"""
@@ -134,15 +139,50 @@ class W3Account:
         self.bot = bot
 
 class SimulationResult:
-    def __init__(self, pair, amount_in, amount_out, slippage, amount_token=0) -> None:
+    def __init__(self, pair, amount_in, amount_out, slippage, amount_token=0, tax=0, ladder=None, max_buy_amount=None) -> None:
         self.pair = pair
         self.amount_in = amount_in
         self.amount_out = amount_out
         self.slippage = slippage
         self.amount_token = amount_token
+        self.tax = tax
+        self.ladder = ladder
+        self.max_buy_amount = max_buy_amount
 
     def __str__(self) -> str:
-        return f"Simulation result {self.pair.address} slippage {self.slippage} amountIn {self.amount_in} amountOut {self.amount_out} amountToken {self.amount_token}"
+        return f"Simulation result {self.pair.address} slippage {self.slippage} amountIn {self.amount_in} amountOut {self.amount_out} amountToken {self.amount_token} tax {self.tax} maxBuyAmount {self.max_buy_amount}"
+
+class LadderStep:
+    # one buy size of a ladder simulation, amount_out is None when the buy or the sell reverted (e.g. max tx amount)
+    def __init__(self, amount_in, amount_token=None, amount_out=None, price_impact=None, tax=None) -> None:
+        self.amount_in = amount_in
+        self.amount_token = amount_token
+        self.amount_out = amount_out
+        self.price_impact = price_impact
+        self.tax = tax
+
+    def to_dict(self):
+        return {
+            'amount_in': self.amount_in,
+            'amount_token': self.amount_token,
+            'amount_out': self.amount_out,
+            'price_impact': self.price_impact,
+            'tax': self.tax,
+        }
+
+    def __str__(self) -> str:
+        return f"LadderStep amountIn {self.amount_in} amountToken {self.amount_token} amountOut {self.amount_out} priceImpact {self.price_impact} tax {self.tax}"
+
+class Quote:
+    def __init__(self, pair, amount_in, amount_token, amount_out, price_impact) -> None:
+        self.pair = pair
+        self.amount_in = amount_in
+        self.amount_token = amount_token
+        self.amount_out = amount_out
+        self.price_impact = price_impact
+
+    def __str__(self) -> str:
+        return f"Quote {self.pair.address} amountIn {self.amount_in} amountToken {self.amount_token} amountOut {self.amount_out} priceImpact {self.price_impact}"
     
 class FilterLogsType(IntEnum):
     PAIR_CREATED = 0
@@ -157,6 +197,12 @@ class FilterLogs:
     def __str__(self) -> str:
         return f"FilterLogs type {self.type} data {self.data}"
     
+class PairEventType(IntEnum):
+    SYNC = 0
+    SWAP = 1
+    MINT = 2
+    BURN = 3
+
 class TxStatus(IntEnum):
     FAILED = 0
     SUCCESS = 1
@@ -165,9 +211,17 @@ class MaliciousPair(IntEnum):
     UNMALICIOUS=0
     CREATOR_BLACKLISTED=1
     CREATOR_RUGGED=2
+    CREATOR_CLUSTER_TAINTED=3
+
+class TemplateVerdict(IntEnum):
+    UNKNOWN=0
+    SAFE=1
+    HONEYPOT=2
+    HIGH_TAX=3
+    UNVERIFIED=4
 
 class InspectionResult:
-    def __init__(self, pair: Pair, from_block, to_block, reserve_inrange=False, simulation_result=None, is_malicious=MaliciousPair.UNMALICIOUS, contract_verified=False, is_creator_call_contract=0, number_tx_mm=0) -> None:
+    def __init__(self, pair: Pair, from_block, to_block, reserve_inrange=False, simulation_result=None, is_malicious=MaliciousPair.UNMALICIOUS, contract_verified=False, is_creator_call_contract=0, number_tx_mm=0, quote=None, trace=None, bytecode_features=None, swap_stats=None, delayed_sells=None) -> None:
         self.pair = pair
         self.from_block = from_block
         self.to_block = to_block
@@ -178,15 +232,50 @@ class InspectionResult:
         self.contract_verified = contract_verified
         self.is_creator_call_contract = is_creator_call_contract
         self.number_tx_mm = number_tx_mm
+        self.quote = quote
+        self.stage_latency = {}
+        self.trace = trace
+        self.bytecode_features = bytecode_features
+        self.swap_stats = swap_stats
+        self.delayed_sells = delayed_sells # [(delay in seconds, amount_out)], amount_out None when the sell reverted
 
     def __str__(self) -> str:
         return f"""
         Inspection result Pair {self.pair.address} fromBlock {self.from_block} toBlock {self.to_block}
         ReserveInrange {self.reserve_inrange} IsMalicious {self.is_malicious} ContractVerified {self.contract_verified}
-        CreatorCallContract {self.is_creator_call_contract} NumberTxMM {self.number_tx_mm}
-        SimulationResult {self.simulation_result}
+        CreatorCallContract {self.is_creator_call_contract} NumberTxMM {self.number_tx_mm} SwapStats {self.swap_stats}
+        Quote {self.quote}
+        {self.bytecode_features}
+        SimulationResult {self.simulation_result} DelayedSells {self.delayed_sells}
         """
 
+class PendingLiquidity:
+    def __init__(self, pair: Pair, tx_hash, amount_token=0, amount_eth=0, received_at=0) -> None:
+        self.pair = pair
+        self.tx_hash = tx_hash
+        self.amount_token = amount_token
+        self.amount_eth = amount_eth
+        self.received_at = received_at
+
+    def __str__(self) -> str:
+        return f"PendingLiquidity Pair {self.pair.address} Token {self.pair.token} Creator {self.pair.creator} Tx {self.tx_hash} AmountToken {self.amount_token} AmountEth {self.amount_eth}"
+
+class PendingThreatType(IntEnum):
+    REMOVE_LIQUIDITY = 0
+    CREATOR_SELL = 1
+    OWNER_CALL = 2
+
+class PendingThreat:
+    def __init__(self, type: PendingThreatType, pair: Pair, tx_hash, sender, received_at=0) -> None:
+        self.type = type
+        self.pair = pair
+        self.tx_hash = tx_hash
+        self.sender = sender
+        self.received_at = received_at
+
+    def __str__(self) -> str:
+        return f"PendingThreat type {self.type} Pair {self.pair.address} Token {self.pair.token} Sender {self.sender} Tx {self.tx_hash}"
+
 class BotCreationOrder:
     def __init__(self, owner, retry_times=0) -> None:
         self.owner = owner
@@ -205,6 +294,8 @@ class BotUpdateOrder:
     
 class ControlOrderType(IntEnum):
     PENDING_POSITIONS=0
+    PROFILER_START=1 # data: sampling interval in seconds
+    PROFILER_STOP=2 # data: output directory of the folded stacks
 
 class ControlOrder:
     def __init__(self, type: ControlOrderType, data) -> None:
@@ -212,4 +303,49 @@ class ControlOrder:
         self.data = data
 
     def __str__(self) -> str:
-        return f"ControlOrder Type{self.type} Data {self.data}"
\ No newline at end of file
+        return f"ControlOrder Type{self.type} Data {self.data}"
+
+class TraceStage(IntEnum):
+    HEADER_RECEIVED=0
+    LOGS_FETCHED=1
+    BLOCK_RECEIVED=2
+    INSPECTED=3
+    ORDER_QUEUED=4
+    ORDER_RECEIVED=5
+    SIGNED=6
+    BROADCAST=7
+    MINED=8
+    ACK_RECEIVED=9
+    PENDING_RECEIVED=10
+
+class Trace:
+    # wall clock time of each stage, carried along with the block, then forked per pair and pickled across processes
+    def __init__(self, block_number, pair=None, stages=None) -> None:
+        self.block_number = block_number
+        self.pair = pair
+        self.stages = stages if stages is not None else {}
+
+    def mark(self, stage: TraceStage, at=None):
+        self.stages[stage] = at if at is not None else time.time()
+        return self
+
+    def fork(self, pair):
+        return Trace(self.block_number, pair, dict(self.stages))
+
+    def origin(self):
+        return min(self.stages.values()) if len(self.stages)>0 else None
+
+    def elapsed(self, stage: TraceStage):
+        if stage not in self.stages:
+            return None
+        return self.stages[stage] - self.origin()
+
+    def to_dict(self):
+        return {
+            'block_number': self.block_number,
+            'pair': self.pair,
+            'stages': {stage.name: at for stage,at in sorted(self.stages.items(), key=lambda item: item[1])},
+        }
+
+    def __str__(self) -> str:
+        return f"Trace #{self.block_number} Pair {self.pair} " + ' '.join([f"{stage.name} +{self.elapsed(stage)*1000:.1f}ms" for stage,_ in sorted(self.stages.items(), key=lambda item: item[1])])
\ No newline at end of file
@@ -14,13 +14,19 @@ import sys # for testing
 sys.path.append('..')
 
 from helpers import timer_decorator, load_abi, constants
+from helpers.utils import calculate_next_block_base_fee
+from library import ContractRegistry, SamplingProfiler, SWAP_TOPIC, decode_swap_log, log_topic
 from executor import BaseExecutor
-from data import ExecutionOrder, Pair, ExecutionAck, TxStatus, BotCreationOrder, Bot, BotUpdateOrder, Position
+from data import ExecutionOrder, Pair, ExecutionAck, TxStatus, BotCreationOrder, Bot, BotUpdateOrder, Position, Trace, TraceStage, ControlOrder
 from factory import BotFactory
 
 glb_lock = threading.Lock()
 BOT_MAX_NUMBER_USED=int(os.environ.get('BOT_MAX_NUMBER_USED'))
 EXECUTION_GAS_LIMIT=int(os.environ.get('EXECUTION_GAS_LIMIT'))
+EXIT_PRIORITY_FEE_MULTIPLIER=5 # emergency sells outbid the regular priority fee to land in the rug block
+HOLD_MAX_DURATION_SECONDS=int(os.environ.get('HOLD_MAX_DURATION_SECONDS', '3600'))
+EXIT_DEADLINE_MARGIN_SECONDS=600 # the position may be liquidated a bit after its max hold duration
+EXIT_DEADLINE_MIN_REMAINING_SECONDS=30 # a pre-signed exit this close to its deadline would revert on-chain
 
 class BuySellExecutor(BaseExecutor):
     def __init__(self, http_url, treasury_key, executor_keys, order_receiver, report_sender, \
@@ -29,10 +35,14 @@ class BuySellExecutor(BaseExecutor):
                 manager_key, bot_factory, bot_factory_abi, bot_implementation, pair_factory, bot_db=True) -> None:
         super().__init__(http_url, treasury_key, executor_keys, order_receiver, report_sender, gas_limit, max_fee_per_gas, max_priority_fee_per_gas, deadline_delay)
         self.weth = weth
-        self.router = self.w3.eth.contract(address=router, abi=router_abi)
+        self.registry = ContractRegistry()
+        self.router = self.registry.contract(self.w3, router, router_abi)
         self.erc20_abi = erc20_abi
         self.pair_abi = pair_abi
 
+        # emergency sell txs signed right after each buy, keyed by (signer, pair): (raw tx, deadline, max fee, priority fee)
+        self.presigned_exits = {}
+
         # bot factory initialize
         self.bot_db = bot_db
         self.bot_abi = bot_abi
@@ -57,8 +67,50 @@ class BuySellExecutor(BaseExecutor):
                 self.bot_order_broker.put(BotCreationOrder(owner=acct.w3_account.address))
             
 
+    def exit_fees(self):
+        priority_fee = self.max_priority_fee_per_gas*EXIT_PRIORITY_FEE_MULTIPLIER
+        base_fee = self.w3.eth.get_block('latest')['baseFeePerGas']
+        return {
+            "maxPriorityFeePerGas": priority_fee,
+            "maxFeePerGas": 2*base_fee + priority_fee,
+        }
+
+    def presign_exit(self, idx, pair, bot):
+        # sign the sell with the next nonce now, so that a pending rug only costs one send_raw_transaction
+        signer = self.accounts[idx].w3_account.address
+        try:
+            nonce = self.w3.eth.get_transaction_count(signer)
+            deadline = int(time.time()) + HOLD_MAX_DURATION_SECONDS + EXIT_DEADLINE_MARGIN_SECONDS
+            fees = self.exit_fees()
+            tx = bot.functions.sell(Web3.to_checksum_address(pair.token), signer, deadline).build_transaction({
+                "from": signer,
+                "nonce": nonce,
+                "gas": self.gas_limit,
+                **fees,
+            })
+            signed = self.w3.eth.account.sign_transaction(tx, self.accounts[idx].private_key)
+
+            with glb_lock:
+                self.presigned_exits[(signer.lower(), pair.address.lower())] = (signed.rawTransaction, deadline, fees["maxFeePerGas"], fees["maxPriorityFeePerGas"])
+            logging.info(f"EXECUTOR pre-signed exit of {pair.address} for {signer} nonce {nonce}")
+        except Exception as e:
+            logging.error(f"EXECUTOR pre-sign exit of {pair.address} for {signer} failed with error {e}")
+
+    def is_presigned_exit_fresh(self, deadline, max_fee_per_gas, max_priority_fee_per_gas):
+        # a stale tx would be accepted by the node, then revert past its deadline or stay pending below the base fee
+        # while holding the nonce
+        head = self.w3.eth.get_block('latest')
+        if head['timestamp'] + EXIT_DEADLINE_MIN_REMAINING_SECONDS > deadline:
+            logging.warning(f"EXECUTOR pre-signed exit deadline {deadline} is stale at head timestamp {head['timestamp']}")
+            return False
+        next_base_fee = calculate_next_block_base_fee(head['baseFeePerGas'], head['gasUsed'], head['gasLimit'])
+        if max_fee_per_gas - max_priority_fee_per_gas < next_base_fee:
+            logging.warning(f"EXECUTOR pre-signed exit max fee {max_fee_per_gas} is stale at next base fee {next_base_fee}")
+            return False
+        return True
+
     @timer_decorator
-    def execute(self, idx, lead_block, is_buy, pair, amount_in, amount_out_min, deadline, bot=None, position:Position=None):
+    def execute(self, idx, lead_block, is_buy, pair, amount_in, amount_out_min, deadline, bot=None, position:Position=None, is_urgent=False, trace:Trace=None):
         def prepare_tx_bot(signer, bot, nonce):
             tx = None            
             if is_buy:
@@ -73,43 +125,72 @@ class BuySellExecutor(BaseExecutor):
                     "from": signer,
                     "nonce": nonce,
                     "gas": self.gas_limit,
+                    **(self.exit_fees() if is_urgent else {}),
                 })
 
             return tx
+
+        def send_presigned_exit(signer):
+            with glb_lock:
+                presigned = self.presigned_exits.pop((signer.lower(), pair.address.lower()), None)
+
+            if presigned is not None and is_urgent:
+                try:
+                    raw_tx, exit_deadline, max_fee_per_gas, max_priority_fee_per_gas = presigned
+                    if not self.is_presigned_exit_fresh(exit_deadline, max_fee_per_gas, max_priority_fee_per_gas):
+                        # re-signed with the current nonce, fees and deadline by the fallback
+                        return None
+                    mark(TraceStage.SIGNED)
+                    return self.w3.eth.send_raw_transaction(raw_tx)
+                except Exception as e:
+                    # nonce already used or fees outdated, fallback to a freshly signed tx
+                    logging.error(f"EXECUTOR pre-signed exit of {pair.address} rejected with error {e}")
+            return None
+
+        def mark(stage):
+            if trace is not None:
+                trace.mark(stage)
         
         signer = self.accounts[idx].w3_account.address
         priv_key = self.accounts[idx].private_key
         if bot is None:
-            bot = self.w3.eth.contract(address=Web3.to_checksum_address(self.accounts[idx].bot.address),abi=self.bot_abi)
+            bot = self.registry.contract(self.w3, self.accounts[idx].bot.address, self.bot_abi)
         else:
-            bot = self.w3.eth.contract(address=Web3.to_checksum_address(bot),abi=self.bot_abi)
+            bot = self.registry.contract(self.w3, bot, self.bot_abi)
 
         try:
             logging.warning(f"EXECUTOR Signer {signer} AmountIn {amount_in} AmountOutMin {amount_out_min} Deadline {deadline} IsBuy {is_buy}")
 
-            # get nonce onchain
-            nonce = self.w3.eth.get_transaction_count(signer)
+            tx_hash = None
+            if not is_buy:
+                tx_hash = send_presigned_exit(signer)
 
-            tx = prepare_tx_bot(signer, bot, nonce)
-            
-            if tx is None:
-                raise Exception(f"create tx failed")
-            
-            # send raw tx
-            signed = self.w3.eth.account.sign_transaction(tx, priv_key)
-            tx_hash = self.w3.eth.send_raw_transaction(signed.rawTransaction)
+            if tx_hash is None:
+                # get nonce onchain
+                nonce = self.w3.eth.get_transaction_count(signer)
+
+                tx = prepare_tx_bot(signer, bot, nonce)
+
+                if tx is None:
+                    raise Exception(f"create tx failed")
+
+                # send raw tx
+                signed = self.w3.eth.account.sign_transaction(tx, priv_key)
+                mark(TraceStage.SIGNED)
+                tx_hash = self.w3.eth.send_raw_transaction(signed.rawTransaction)
+            mark(TraceStage.BROADCAST)
             logging.debug(f"created tx hash {Web3.to_hex(tx_hash)}")
 
             tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            mark(TraceStage.MINED)
 
-            logging.debug(f"tx receipt {tx_receipt}")
+            logging.debug("tx receipt %s", tx_receipt)
             logging.debug(f"{amount_in} tx hash {Web3.to_hex(tx_hash)} in block #{tx_receipt['blockNumber']} with status {tx_receipt['status']}")
 
             # send acknowledgement
             amount_out = 0
             if tx_receipt['status'] == TxStatus.SUCCESS:
-                pair_contract = self.w3.eth.contract(address=Web3.to_checksum_address(pair.address), abi=self.pair_abi)
-                swap_logs = pair_contract.events.Swap().process_receipt(tx_receipt, errors=DISCARD)
+                swap_logs = [decode_swap_log(log) for log in tx_receipt['logs'] if log['address'].lower()==pair.address.lower() and log_topic(log)==SWAP_TOPIC]
                 logging.debug(f"swap logs {swap_logs[0]}")
 
                 swap_logs = swap_logs[0]
@@ -130,11 +211,15 @@ class BuySellExecutor(BaseExecutor):
                 signer=signer,
                 bot=bot.address,
                 position=position,
+                trace=trace,
             )
 
-            logging.warning(f"EXECUTOR Acknowledgement {ack}")
+            logging.warning("EXECUTOR Acknowledgement %s", ack)
             self.report_sender.put(ack)
 
+            if is_buy and ack.tx_status == TxStatus.SUCCESS:
+                self.presign_exit(idx, pair, bot)
+
         except Exception as e:
             logging.error(f"EXECUTOR order {pair} amountIn {amount_in} isBuy {is_buy} catch exception {e}")
             ack = ExecutionAck(
@@ -149,9 +234,10 @@ class BuySellExecutor(BaseExecutor):
                 signer=signer,
                 bot=bot.address,
                 position=position,
+                trace=trace,
             )
 
-            logging.warning(f"EXECUTOR failed execution ack {ack}")
+            logging.warning("EXECUTOR failed execution ack %s", ack)
             self.report_sender.put(ack)
 
         # update bot status
@@ -176,10 +262,10 @@ class BuySellExecutor(BaseExecutor):
             result = await self.bot_result_broker.coro_get()
 
             if result is not None and isinstance(result, Bot):
-                logging.debug(f"EXECUTOR bot created {result}")
+                logging.debug("EXECUTOR bot created %s", result)
                 for idx,acct in enumerate(self.accounts):
                     if (acct.bot is None or acct.bot.number_used >= BOT_MAX_NUMBER_USED or acct.bot.is_failed) and acct.w3_account.address.lower()==result.owner.lower():
-                        logging.warning(f"EXECUTOR created bot {result} for account #{idx} {acct.w3_account.address}")
+                        logging.warning("EXECUTOR created bot %s for account #%s %s", result, idx, acct.w3_account.address)
                         acct.bot = result
 
     async def handle_execution_order(self):
@@ -195,7 +281,9 @@ class BuySellExecutor(BaseExecutor):
                 with glb_lock:
                     counter += 1
 
-                logging.warning(f"EXECUTOR receive order #{counter} {execution_data}")
+                logging.warning("EXECUTOR receive order #%s %s", counter, execution_data)
+                if execution_data.trace is not None:
+                    execution_data.trace.mark(TraceStage.ORDER_RECEIVED)
                 deadline = execution_data.block_timestamp + self.deadline_delay if execution_data.block_timestamp > 0 else self.get_block_timestamp() + self.deadline_delay
                 
                 if execution_data.signer is None:
@@ -210,6 +298,7 @@ class BuySellExecutor(BaseExecutor):
                                                 execution_data.amount_in,
                                                 execution_data.amount_out_min, 
                                                 deadline,
+                                                trace=execution_data.trace,
                                                 )
                     else:
                         logging.warning(f"EXECUTOR order dropped due to account #{idx} {self.accounts[idx].w3_account.address} has no bot")
@@ -230,11 +319,16 @@ class BuySellExecutor(BaseExecutor):
                             deadline,
                             execution_data.bot,
                             execution_data.position,
+                            execution_data.is_urgent,
+                            execution_data.trace,
                         )
                     else:
                         logging.error(f"EXECUTOR not found signer for order {execution_data}")
+            elif execution_data is not None and isinstance(execution_data, ControlOrder):
+                # profiles every thread of this process, bot factory included
+                SamplingProfiler('execution').handle_control_order(execution_data)
             else:
-                logging.warning(f"EXECUTOR invalid order {execution_data}")
+                logging.warning("EXECUTOR invalid order %s", execution_data)
 
     async def run(self):
         if self.bot_db:
@@ -1,3 +1,6 @@
 from helpers.decorators import *
+from helpers.encoding import *
 from helpers.utils import *
-from helpers.constants import *
\ No newline at end of file
+from helpers.constants import *
+from helpers.inventory import *
+from helpers.metrics import start_metrics_server
\ No newline at end of file
@@ -5,4 +5,9 @@ DRY_RUN_MODE=3
 UNI_V2_ROUTER_ADDRESS="0x4752ba5DBc23f44D87826276BF6Fd6b1C372aD24"
 ADD_LIQUIDITY_METHOD_ID="0xf305d719"
 REMOVE_LIQUIDITY_METHOD_ID="0x02751cec"
+UNI_V2_PAIR_INIT_CODE_HASH="0x96e8ac4277198ff8b6f785478aa9a39f403cb768dd02cbee326c3e7da348845f"
 
+
+# UniswapV2 0.3% swap fee
+UNI_V2_FEE_NUMERATOR=997
+UNI_V2_FEE_DENOMINATOR=1000
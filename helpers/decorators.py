@@ -3,6 +3,8 @@ import logging
 import functools
 import time
 
+from helpers import metrics
+
 def rate_limiter(sleep_time):
     def decorator_rate_limiter(func):
       @functools.wraps(func)
@@ -21,22 +23,45 @@ def rate_limiter(sleep_time):
     return decorator_rate_limiter
 
 def timer_decorator(func):
+    # latency histogram per function, left as is when metrics are disabled
+    if not metrics.METRICS_ENABLED:
+        return func
+
+    histogram, errors = instrument(func)
+
+    @functools.wraps(func)
     def wrapper_function(*args, **kwargs):
-        start_time = time.perf_counter()
-        result = func(*args, **kwargs)
-        run_time = time.perf_counter() - start_time
-        logging.info(f"Finished {func.__name__}() in {run_time:.4f} secs")
-        return result
+        start_time = time.perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            histogram.observe_ns(time.perf_counter_ns() - start_time)
 
     return wrapper_function
 
 def async_timer_decorator(func):
+    if not metrics.METRICS_ENABLED:
+        return func
+
+    histogram, errors = instrument(func)
+
+    @functools.wraps(func)
     async def wrapper(*args, **kwargs):
-        start_time = time.perf_counter()
-        result = await func(*args, **kwargs)
-        run_time = time.perf_counter() - start_time
-        logging.info(f"Finished {func.__name__}() in {run_time:.4f} secs")
-        return result
+        start_time = time.perf_counter_ns()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            histogram.observe_ns(time.perf_counter_ns() - start_time)
     
     return wrapper
-   
\ No newline at end of file
+
+def instrument(func):
+    name = f"{func.__module__}.{func.__qualname__}"
+    return metrics.registry.histogram('function_latency_seconds', 'Latency of instrumented functions', function=name), \
+            metrics.registry.counter('function_errors_total', 'Exceptions raised by instrumented functions', function=name)
@@ -0,0 +1,78 @@
+from functools import lru_cache
+
+from eth_utils import keccak
+
+# byte-level calldata and storage-slot encoding for the simulation hot path
+
+ZERO_PADDING = b'\x00' * 12
+STORAGE_SLOT_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=None)
+def selector(signature: str) -> bytes:
+    return keccak(text=signature)[:4]
+
+def uint_word(num: int) -> bytes:
+    return num.to_bytes(32, 'big')
+
+@lru_cache(maxsize=STORAGE_SLOT_CACHE_SIZE)
+def address_word(address: str) -> bytes:
+    return ZERO_PADDING + bytes.fromhex(address[2:] if address.startswith('0x') else address)
+
+def encode_call(signature: str, *words: bytes) -> bytes:
+    return selector(signature) + b''.join(words)
+
+@lru_cache(maxsize=STORAGE_SLOT_CACHE_SIZE)
+def balance_slot(holder: str, index: int) -> bytes:
+    # keccak(holder . index), slot of balances[holder] for a mapping declared at `index`
+    return keccak(address_word(holder) + uint_word(index))
+
+@lru_cache(maxsize=STORAGE_SLOT_CACHE_SIZE)
+def allowance_slot(owner: str, spender: str, index: int) -> bytes:
+    # keccak(spender . keccak(owner . index)), slot of allowances[owner][spender]
+    return keccak(address_word(spender) + balance_slot(owner, index))
+
+def create2_address(deployer: str, salt: bytes, init_code_hash: bytes) -> str:
+    return '0x' + keccak(b'\xff' + bytes.fromhex(deployer[2:]) + salt + init_code_hash)[12:].hex()
+
+def word_to_address(word: int) -> str:
+    return '0x' + word.to_bytes(32, 'big')[12:].hex()
+
+if __name__ == '__main__':
+    # micro-benchmark against the previous hex-string based implementations
+    import timeit
+    import eth_utils
+    from web3 import Web3
+
+    HOLDER = '0x4752ba5DBc23f44D87826276BF6Fd6b1C372aD24'
+    SPENDER = '0x8909Dc15e40173Ff4699343b6eB8132c65e18eC6'
+    NUMBER = 200000
+
+    def legacy_calldata():
+        selector_hex = (Web3.keccak(text='sell(address,address,uint256)')[0:4]).hex()[2:]
+        encoded = hex(1722669970)[2:]
+        return bytes.fromhex(selector_hex + f'{"0" * 24}{HOLDER[2:]}' + f'{"0" * 24}{SPENDER[2:]}' + ("0" * (64 - len(encoded))) + encoded)
+
+    def legacy_balance_slot():
+        return Web3.keccak(hexstr=(eth_utils.remove_0x_prefix(HOLDER).rjust(64, '0') + eth_utils.remove_0x_prefix(hex(0)).rjust(64, '0')))
+
+    def legacy_allowance_slot():
+        return Web3.keccak(hexstr=(
+            eth_utils.remove_0x_prefix(SPENDER).rjust(64, "0")
+            + eth_utils.remove_0x_prefix(Web3.keccak(hexstr=(eth_utils.remove_0x_prefix(HOLDER).rjust(64, "0") + eth_utils.remove_0x_prefix(hex(1)).rjust(64,'0'))).hex())
+        ))
+
+    def fast_calldata():
+        return encode_call('sell(address,address,uint256)', address_word(HOLDER), address_word(SPENDER), uint_word(1722669970))
+
+    assert legacy_calldata() == fast_calldata()
+    assert bytes(legacy_balance_slot()) == balance_slot(HOLDER, 0)
+    assert bytes(legacy_allowance_slot()) == allowance_slot(HOLDER, SPENDER, 1)
+
+    for name, legacy, fast in [
+        ('calldata', legacy_calldata, fast_calldata),
+        ('balance_slot', legacy_balance_slot, lambda: balance_slot(HOLDER, 0)),
+        ('allowance_slot', legacy_allowance_slot, lambda: allowance_slot(HOLDER, SPENDER, 1)),
+    ]:
+        legacy_time = timeit.timeit(legacy, number=NUMBER)
+        fast_time = timeit.timeit(fast, number=NUMBER)
+        print(f"{name:<16} legacy {legacy_time/NUMBER*10**6:8.3f}us fast {fast_time/NUMBER*10**6:8.3f}us speedup x{legacy_time/fast_time:.1f}")
@@ -0,0 +1,46 @@
+import numpy as np
+
+# columnar view of the inventory, evaluate TP/SL/timeout of all positions in one vectorized pass
+class InventoryFrame:
+    def __init__(self, positions, pairs) -> None:
+        reserves = {pair.address: (pair.reserve_token, pair.reserve_eth) for pair in pairs}
+        size = len(positions)
+
+        self.amount = np.zeros(size, dtype=np.float64)
+        self.amount_in = np.full(size, np.nan, dtype=np.float64)
+        self.reserve_token = np.zeros(size, dtype=np.float64)
+        self.reserve_eth = np.zeros(size, dtype=np.float64)
+        self.start_time = np.zeros(size, dtype=np.float64)
+        self.has_reserves = np.zeros(size, dtype=bool)
+
+        for idx, position in enumerate(positions):
+            self.amount[idx] = float(position.amount)
+            if position.amount_in is not None:
+                self.amount_in[idx] = float(position.amount_in)
+            self.start_time[idx] = position.start_time
+
+            reserve = reserves.get(position.pair.address)
+            if reserve is not None:
+                self.reserve_token[idx] = float(reserve[0])
+                self.reserve_eth[idx] = float(reserve[1])
+                self.has_reserves[idx] = True
+
+    def __len__(self) -> int:
+        return len(self.amount)
+
+    def pnl_percentage(self, gas_cost) -> np.ndarray:
+        price = np.zeros(len(self), dtype=np.float64)
+        np.divide(self.reserve_eth, self.reserve_token, out=price, where=(self.reserve_token != 0) & (self.reserve_eth != 0))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (self.amount*price - self.amount_in - gas_cost) / self.amount_in * 100
+
+    def evaluate(self, block_timestamp, take_profit, stop_loss, hold_max_duration, gas_cost):
+        # positions without known reserves or investment have NaN pnl and only liquidate on timeout
+        pnl = self.pnl_percentage(gas_cost)
+
+        valid = self.has_reserves & ~np.isnan(pnl)
+        is_pnl_triggered = valid & ((pnl > take_profit) | (pnl < stop_loss))
+        is_timeout = (block_timestamp - self.start_time) > hold_max_duration
+
+        return pnl, np.flatnonzero(is_pnl_triggered | is_timeout), is_pnl_triggered
@@ -0,0 +1,196 @@
+import os
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_ENABLED=int(os.environ.get('METRICS_ENABLED', '1'))
+
+SUB_BUCKET_BITS = 3 # 8 sub-buckets per power of two, values are kept within 12.5%
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+MAX_EXPONENT = 40 # ~12 days in microseconds
+BUCKET_COUNT = (MAX_EXPONENT + 2)*SUB_BUCKET_COUNT
+EXPORT_MAX_BOUND = 1 << 27 # exported `le` ladder stops at ~134 seconds, slower calls only count in +Inf
+
+def bucket_index(value):
+    # HDR-style log-linear index: exponent of the value then its next SUB_BUCKET_BITS most significant bits
+    if value < SUB_BUCKET_COUNT:
+        return value
+    exponent = value.bit_length() - SUB_BUCKET_BITS - 1
+    return min((exponent + 1)*SUB_BUCKET_COUNT + ((value >> exponent) & (SUB_BUCKET_COUNT - 1)), BUCKET_COUNT - 1)
+
+def bucket_upper_bound(index):
+    if index < SUB_BUCKET_COUNT:
+        return index + 1
+    exponent = index//SUB_BUCKET_COUNT - 1
+    return ((SUB_BUCKET_COUNT + index % SUB_BUCKET_COUNT) + 1) << exponent
+
+def format_labels(labels):
+    return '{' + ','.join([f'{name}="{value}"' for name,value in labels]) + '}' if len(labels)>0 else ''
+
+class Counter:
+    # one shard per thread, a thread only ever increments its own shard so no lock is taken on the hot path
+    def __init__(self, name, labels) -> None:
+        self.name = name
+        self.labels = labels
+        self.shards = {}
+        self.lock = threading.Lock()
+
+    def shard(self):
+        shard = self.shards.get(threading.get_ident())
+        if shard is None:
+            with self.lock:
+                shard = self.shards.setdefault(threading.get_ident(), [0])
+        return shard
+
+    def inc(self, value=1):
+        self.shard()[0] += value
+
+    def value(self):
+        return sum([shard[0] for shard in list(self.shards.values())])
+
+    def render(self, const_labels=()):
+        return [f"{self.name}{format_labels(const_labels + self.labels)} {self.value()}"]
+
+class Histogram:
+    # latencies in microseconds into log-linear buckets, per thread shards of [buckets..., sum, count]
+    def __init__(self, name, labels) -> None:
+        self.name = name
+        self.labels = labels
+        self.shards = {}
+        self.lock = threading.Lock()
+
+    def shard(self):
+        shard = self.shards.get(threading.get_ident())
+        if shard is None:
+            with self.lock:
+                shard = self.shards.setdefault(threading.get_ident(), [0]*(BUCKET_COUNT + 2))
+        return shard
+
+    def observe_ns(self, elapsed_ns):
+        shard = self.shard()
+        shard[bucket_index(elapsed_ns//1000)] += 1
+        shard[BUCKET_COUNT] += elapsed_ns
+        shard[BUCKET_COUNT + 1] += 1
+
+    def observe(self, seconds):
+        self.observe_ns(int(seconds*10**9))
+
+    def merged(self):
+        merged = [0]*(BUCKET_COUNT + 2)
+        for shard in list(self.shards.values()):
+            for idx,value in enumerate(shard):
+                merged[idx] += value
+        return merged
+
+    def percentile(self, q):
+        merged = self.merged()
+        count = merged[BUCKET_COUNT + 1]
+        if count == 0:
+            return None
+        seen = 0
+        for idx in range(BUCKET_COUNT):
+            seen += merged[idx]
+            if seen >= q/100*count:
+                return bucket_upper_bound(idx)/10**6
+        return None
+
+    def render(self, const_labels=()):
+        # cumulative buckets at powers of two microseconds, which are exact bucket boundaries
+        labels = const_labels + self.labels
+        merged = self.merged()
+        lines = []
+        cumulative = 0
+        for idx in range(BUCKET_COUNT):
+            cumulative += merged[idx]
+            upper_bound = bucket_upper_bound(idx)
+            if upper_bound & (upper_bound - 1) == 0 and SUB_BUCKET_COUNT <= upper_bound <= EXPORT_MAX_BOUND:
+                lines.append(f"{self.name}_bucket{format_labels(labels + (('le', upper_bound/10**6),))} {cumulative}")
+        lines.append(f"{self.name}_bucket{format_labels(labels + (('le', '+Inf'),))} {merged[BUCKET_COUNT + 1]}")
+        lines.append(f"{self.name}_sum{format_labels(labels)} {merged[BUCKET_COUNT]/10**9}")
+        lines.append(f"{self.name}_count{format_labels(labels)} {merged[BUCKET_COUNT + 1]}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self, const_labels=()) -> None:
+        self.const_labels = const_labels
+        self.metrics = {}
+        self.helps = {}
+        self.types = {}
+        self.lock = threading.Lock()
+
+    def get(self, cls, type, name, help, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.setdefault(key, cls(name, key[1]))
+                self.helps[name] = help
+                self.types[name] = type
+        return metric
+
+    def counter(self, name, help='', **labels) -> Counter:
+        return self.get(Counter, 'counter', name, help, labels)
+
+    def histogram(self, name, help='', **labels) -> Histogram:
+        return self.get(Histogram, 'histogram', name, help, labels)
+
+    def set_const_labels(self, **labels):
+        # e.g. the process name, applied at render time so that metrics created at import time get it too
+        self.const_labels = tuple(sorted(labels.items()))
+
+    def render(self):
+        lines = []
+        by_name = {}
+        for (name, _), metric in list(self.metrics.items()):
+            by_name.setdefault(name, []).append(metric)
+
+        for name, metrics in sorted(by_name.items()):
+            lines.append(f"# HELP {name} {self.helps[name]}")
+            lines.append(f"# TYPE {name} {self.types[name]}")
+            for metric in metrics:
+                lines += metric.render(self.const_labels)
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port, host='0.0.0.0'):
+    # prometheus scrape endpoint at http://host:port/metrics, served from a daemon thread of the calling process
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.warning(f"METRICS serving on {host}:{port}/metrics")
+    return server
+
+if __name__ == "__main__":
+    import urllib.request
+
+    histogram = registry.histogram('function_latency_seconds', 'Latency of instrumented functions', function='demo')
+    for elapsed_us in [3, 40, 150, 900, 1200, 5000, 70000]:
+        histogram.observe(elapsed_us/10**6)
+    registry.counter('function_errors_total', 'Exceptions raised by instrumented functions', function='demo').inc()
+
+    server = start_metrics_server(9464, '127.0.0.1')
+    print(urllib.request.urlopen('http://127.0.0.1:9464/metrics').read().decode())
+    print(f"p50 {histogram.percentile(50)} p99 {histogram.percentile(99)}")
+    server.shutdown()
+
+    start_time = time.perf_counter()
+    for _ in range(10**5):
+        histogram.observe_ns(123456)
+    print(f"observe {(time.perf_counter() - start_time)*10**6/10**5:.3f} us/call")
@@ -8,6 +8,12 @@ import pytz
 from datetime import datetime
 import eth_utils
 
+from hexbytes import HexBytes
+from eth_utils import keccak
+
+from helpers.constants import UNI_V2_FEE_NUMERATOR, UNI_V2_FEE_DENOMINATOR
+from helpers.encoding import selector, uint_word, address_word, balance_slot, allowance_slot, create2_address
+
 def load_contract_bin(contract_path: str) -> bytes:
     with open(contract_path, 'r') as readfile:
         hexstring = readfile.readline()
@@ -26,11 +32,10 @@ def load_abi(abi_path: str):
     return json.load(open(abi_path, 'r'))
 
 def func_selector(signature: str) -> str:
-    return (Web3.keccak(text=signature)[0:4]).hex()[2:]
+    return selector(signature).hex()
 
 def encode_uint(num: int) -> str:
-    encoded = hex(num)[2:]
-    return ("0" * (64 - len(encoded))) + encoded
+    return uint_word(num).hex()
 
 def encode_address(address: str) -> str:
     return f'{"0" * 24}{address[2:]}'
@@ -58,6 +63,23 @@ def calculate_amount_out(reserveIn, reserveOut, amountIn):
 def calculate_amount_in(reserveIn, reserveOut, amountOut):
     return (reserveIn * reserveOut)/(reserveOut - amountOut) - reserveIn
 
+def get_amount_out(amount_in, reserve_in, reserve_out) -> int:
+    # integer math of UniswapV2Library.getAmountOut, amounts in wei
+    if amount_in<=0 or reserve_in<=0 or reserve_out<=0:
+        return 0
+
+    amount_in_with_fee = amount_in * UNI_V2_FEE_NUMERATOR
+    return (amount_in_with_fee * reserve_out) // (reserve_in * UNI_V2_FEE_DENOMINATOR + amount_in_with_fee)
+
+def get_amount_in(amount_out, reserve_in, reserve_out) -> int:
+    # integer math of UniswapV2Library.getAmountIn, amounts in wei
+    if amount_out<=0 or reserve_in<=0 or reserve_out<=amount_out:
+        return 0
+
+    numerator = reserve_in * amount_out * UNI_V2_FEE_DENOMINATOR
+    denominator = (reserve_out - amount_out) * UNI_V2_FEE_NUMERATOR
+    return numerator // denominator + 1
+
 def calculate_price(reserve_token, reserve_eth):
     if reserve_token != 0 and reserve_eth != 0:
         return Decimal(reserve_eth)/Decimal(reserve_token)
@@ -77,6 +99,12 @@ def calculate_next_block_base_fee(base_fee, gas_used, gas_limit):
 def sort_tokens(tokenA, tokenB):
     return (tokenA, tokenB) if Web3.to_int(hexstr=tokenA) < Web3.to_int(hexstr=tokenB) else (tokenB, tokenA)
 
+def calculate_pair_address(factory, token_a, token_b, init_code_hash):
+    # CREATE2 address of the UniswapV2 pair, salt is keccak(token0 . token1)
+    token0, token1 = sort_tokens(token_a, token_b)
+    salt = keccak(bytes.fromhex(token0[2:]) + bytes.fromhex(token1[2:]))
+    return Web3.to_checksum_address(create2_address(factory, salt, bytes.fromhex(init_code_hash[2:])))
+
 def convert_tz_aware(dt_obj):
     dt_obj.tzinfo = pytz.UTC
 
@@ -84,28 +112,10 @@ def shorten_address(address):
     return f"{address[0:5]}..{address[len(address)-4:]}"
 
 def calculate_balance_storage_index(address, index):
-    return Web3.keccak(
-        hexstr=(
-            eth_utils.remove_0x_prefix(address).rjust(64, '0')
-            +
-            eth_utils.remove_0x_prefix(hex(index)).rjust(64,'0')
-        )
-    )
+    return HexBytes(balance_slot(address, index))
 
 def calculate_allowance_storage_index(owner, spender, index):
-    return Web3.keccak(
-        hexstr=(
-            eth_utils.remove_0x_prefix(spender).rjust(64, "0")
-            + eth_utils.remove_0x_prefix(
-                Web3.keccak(
-                hexstr=(
-                    eth_utils.remove_0x_prefix(owner).rjust(64, "0")
-                    + 
-                    eth_utils.remove_0x_prefix(hex(index)).rjust(64,'0')
-                )
-            ).hex())   
-        )
-    )
+    return HexBytes(allowance_slot(owner, spender, index))
 
 def rpad_int(amount):
     return "0x" + eth_utils.remove_0x_prefix(hex(amount)).rjust(64,'0')
@@ -1,2 +1,4 @@
+from inspector.quoter import *
 from inspector.simulator import *
+from inspector.bytecode import *
 from inspector.pair_inspector import *
\ No newline at end of file
@@ -0,0 +1,190 @@
+from web3 import Web3
+
+OP_EQ = 0x14
+OP_PUSH1 = 0x60
+OP_PUSH4 = 0x63
+OP_PUSH20 = 0x73
+OP_PUSH32 = 0x7f
+OP_CALLCODE = 0xf2
+OP_DELEGATECALL = 0xf4
+OP_SELFDESTRUCT = 0xff
+ADDRESS_MASK = b'\x00'*20
+WORD_MASK = b'\x00'*32
+METADATA_MAX_LENGTH = 128 # solc appends a CBOR blob of ~50 bytes followed by its 2 bytes length
+MINIMAL_PROXY_PREFIX = bytes.fromhex('363d3d373d3d3d363d73') # EIP-1167
+SELECTOR_EQ_DISTANCE = 2 # solc dispatches with `PUSH4 selector EQ` or `PUSH4 selector DUP2 EQ`
+
+def selectors_of(*signatures):
+    return frozenset([bytes(Web3.keccak(text=signature)[:4]) for signature in signatures])
+
+# capabilities recognized by the selectors of the usual names in meme token templates
+OWNER_SELECTORS = selectors_of('owner()', 'transferOwnership(address)', 'renounceOwnership()')
+FEE_SETTER_SELECTORS = selectors_of('setFee(uint256)', 'setFees(uint256,uint256)', 'setTaxes(uint256,uint256)', 'setTax(uint256)',
+    'setBuyFee(uint256)', 'setSellFee(uint256)', 'setBuyTax(uint256)', 'setSellTax(uint256)', 'setTaxFeePercent(uint256)',
+    'setLiquidityFeePercent(uint256)', 'setMarketingFee(uint256)', 'updateFees(uint256,uint256)', 'setFees(uint256,uint256,uint256)',
+    'updateBuyFees(uint256,uint256,uint256)', 'updateSellFees(uint256,uint256,uint256)', 'setFee(uint256,uint256)')
+BLACKLIST_SELECTORS = selectors_of('blacklist(address)', 'blacklist(address,bool)', 'addBlacklist(address)', 'addToBlacklist(address)',
+    'setBlacklist(address,bool)', 'blacklistAddress(address,bool)', 'multiBlacklist(address[],bool)', 'addBots(address[])',
+    'setBots(address[])', 'setBot(address,bool)', 'addBot(address)', 'delBot(address)', 'isBlacklisted(address)', 'isBot(address)')
+TRADING_TOGGLE_SELECTORS = selectors_of('setTrading(bool)', 'setTradingEnabled(bool)', 'tradingStatus(bool)', 'setTradingOpen(bool)',
+    'pause()', 'unpause()', 'setSwapEnabled(bool)', 'enableTrading(bool)')
+MINT_SELECTORS = selectors_of('mint(address,uint256)', 'mint(uint256)', 'mintTo(address,uint256)', 'issue(uint256)')
+TX_LIMIT_SELECTORS = selectors_of('setMaxTxAmount(uint256)', 'setMaxTxPercent(uint256)', 'setMaxWalletSize(uint256)', 'setMaxWallet(uint256)',
+    'updateMaxTxnAmount(uint256)', 'updateMaxWalletAmount(uint256)', 'setMaxWalletAmount(uint256)', 'setMaxTx(uint256)')
+
+# weights of the risk score, owner-only capabilities able to trap a holder after the buy weigh the most
+RISK_WEIGHTS = {
+    'fee_setter': 1,
+    'blacklist': 2,
+    'trading_toggle': 2,
+    'mint': 3,
+    'tx_limit': 1,
+    'delegatecall': 3,
+    'selfdestruct': 3,
+}
+
+def iterate_opcodes(code):
+    # (offset, opcode, operand), operands of PUSH1..PUSH32 are skipped so that data is never read as opcodes
+    idx = 0
+    while idx < len(code):
+        opcode = code[idx]
+        size = opcode - OP_PUSH1 + 1 if OP_PUSH1 <= opcode <= OP_PUSH32 else 0
+        yield idx, opcode, code[idx + 1:idx + 1 + size]
+        idx += 1 + size
+
+def strip_metadata(code):
+    if len(code) < 2:
+        return code
+    length = int.from_bytes(code[-2:], 'big')
+    if 0 < length <= METADATA_MAX_LENGTH and length + 2 <= len(code) and code[-length - 2] in range(0xa1, 0xa8):
+        return code[:-length - 2]
+    return code
+
+def is_embedded_address(operand):
+    # immutables are inlined as PUSH32, addresses are left padded with 12 zero bytes
+    return len(operand)==32 and operand[:12]==b'\x00'*12 and operand[12:]!=ADDRESS_MASK
+
+def normalize_bytecode(code):
+    # runtime code with the compiler metadata dropped and deploy-time addresses (owner, router, pair, fee wallet)
+    # masked, so that the clones of a template compiled with the same settings share one hash
+    code = strip_metadata(bytes(code))
+    normalized = bytearray()
+    for _, opcode, operand in iterate_opcodes(code):
+        normalized.append(opcode)
+        if opcode == OP_PUSH20 and len(operand)==20:
+            normalized += ADDRESS_MASK
+        elif opcode == OP_PUSH32 and is_embedded_address(operand):
+            normalized += WORD_MASK
+        else:
+            normalized += operand
+    return bytes(normalized)
+
+def is_template_cacheable(code):
+    # a verdict of a contract delegating its logic elsewhere says nothing about the logic. Minimal proxies are
+    # fine since the implementation address is part of their code and not masked.
+    code = bytes(code)
+    if len(code)==0:
+        return False
+    if code.startswith(MINIMAL_PROXY_PREFIX):
+        return True
+    return not any(opcode == OP_DELEGATECALL for _, opcode, _ in iterate_opcodes(code))
+
+class BytecodeFeatures:
+    # capabilities of a runtime code, what the owner may do later rather than what the current state does
+    def __init__(self, code_size=0, selectors=frozenset(), has_owner=False, fee_setter=False, blacklist=False, trading_toggle=False,
+                 mint=False, tx_limit=False, delegatecall=False, selfdestruct=False) -> None:
+        self.code_size = code_size
+        self.selectors = selectors
+        self.has_owner = has_owner
+        self.fee_setter = fee_setter
+        self.blacklist = blacklist
+        self.trading_toggle = trading_toggle
+        self.mint = mint
+        self.tx_limit = tx_limit
+        self.delegatecall = delegatecall
+        self.selfdestruct = selfdestruct
+
+    def risk_score(self):
+        return sum([weight for feature,weight in RISK_WEIGHTS.items() if getattr(self, feature)])
+
+    def to_vector(self):
+        return [self.code_size, len(self.selectors), int(self.has_owner)] + [int(getattr(self, feature)) for feature in RISK_WEIGHTS]
+
+    def to_dict(self):
+        return {
+            'code_size': self.code_size,
+            'selectors': len(self.selectors),
+            'has_owner': self.has_owner,
+            **{feature: getattr(self, feature) for feature in RISK_WEIGHTS},
+            'risk_score': self.risk_score(),
+        }
+
+    def __str__(self) -> str:
+        return f"BytecodeFeatures size {self.code_size} selectors {len(self.selectors)} owner {self.has_owner} risk {self.risk_score()} flags {[feature for feature in RISK_WEIGHTS if getattr(self, feature)]}"
+
+def scan_bytecode(code):
+    # (opcodes, selectors) in one pass; the dispatcher compares the calldata selector against each PUSH4 operand
+    opcodes = set()
+    selectors = set()
+    selector, selector_at = None, -SELECTOR_EQ_DISTANCE - 1
+    idx, count, size = 0, 0, len(code)
+    while idx < size:
+        opcode = code[idx]
+        if OP_PUSH1 <= opcode <= OP_PUSH32:
+            if opcode == OP_PUSH4:
+                selector, selector_at = code[idx + 1:idx + 5], count
+            idx += opcode - OP_PUSH1 + 2
+        else:
+            if opcode == OP_EQ and count - selector_at <= SELECTOR_EQ_DISTANCE:
+                selectors.add(selector)
+            opcodes.add(opcode)
+            idx += 1
+        count += 1
+    return opcodes, frozenset(selectors)
+
+def analyze_bytecode(code) -> BytecodeFeatures:
+    code = strip_metadata(bytes(code))
+    opcodes, selectors = scan_bytecode(code)
+
+    return BytecodeFeatures(
+        code_size=len(code),
+        selectors=selectors,
+        has_owner=len(selectors & OWNER_SELECTORS)>0,
+        fee_setter=len(selectors & FEE_SETTER_SELECTORS)>0,
+        blacklist=len(selectors & BLACKLIST_SELECTORS)>0,
+        trading_toggle=len(selectors & TRADING_TOGGLE_SELECTORS)>0,
+        mint=len(selectors & MINT_SELECTORS)>0,
+        tx_limit=len(selectors & TX_LIMIT_SELECTORS)>0,
+        delegatecall=OP_DELEGATECALL in opcodes or OP_CALLCODE in opcodes,
+        selfdestruct=OP_SELFDESTRUCT in opcodes,
+    )
+
+def bytecode_hash(code):
+    code = bytes(code)
+    if code.startswith(MINIMAL_PROXY_PREFIX):
+        return Web3.to_hex(Web3.keccak(code))
+    return Web3.to_hex(Web3.keccak(normalize_bytecode(code)))
+
+if __name__ == "__main__":
+    owner_a = bytes.fromhex('11'*20)
+    owner_b = bytes.fromhex('22'*20)
+    metadata_a = bytes.fromhex('a2646970667358221220') + b'\x01'*32 + bytes.fromhex('64736f6c63430008140033')
+    metadata_b = bytes.fromhex('a2646970667358221220') + b'\x02'*32 + bytes.fromhex('64736f6c63430008140033')
+
+    def template(owner, tax, metadata):
+        # PUSH20 owner, PUSH32 immutable router, PUSH1 tax, STOP, metadata
+        return bytes([OP_PUSH20]) + owner + bytes([OP_PUSH32]) + b'\x00'*12 + owner + bytes([OP_PUSH1, tax, 0x00]) + metadata + len(metadata).to_bytes(2, 'big')
+
+    print(f"clones share hash {bytecode_hash(template(owner_a, 5, metadata_a)) == bytecode_hash(template(owner_b, 5, metadata_b))}")
+    print(f"tax change splits hash {bytecode_hash(template(owner_a, 5, metadata_a)) != bytecode_hash(template(owner_a, 9, metadata_a))}")
+    print(f"delegating code cacheable {is_template_cacheable(bytes([OP_PUSH1, 0, OP_DELEGATECALL]))}")
+    print(f"minimal proxy cacheable {is_template_cacheable(MINIMAL_PROXY_PREFIX + owner_a + bytes.fromhex('5af43d82803e903d91602b57fd5bf3'))}")
+
+    import time
+    def dispatch(signature):
+        # DUP1 PUSH4 selector EQ PUSH2 0x0000 JUMPI
+        return bytes([0x80, OP_PUSH4]) + Web3.keccak(text=signature)[:4] + bytes([OP_EQ, 0x61, 0x00, 0x00, 0x57])
+    token = b''.join([dispatch(signature) for signature in ['transfer(address,uint256)', 'owner()', 'setBots(address[])', 'setTrading(bool)']]) + b'\x5b'*20000
+    start_time = time.perf_counter()
+    features = analyze_bytecode(token)
+    print(f"{features} in {(time.perf_counter() - start_time)*1000:.2f}ms")
@@ -5,7 +5,9 @@ import time
 import datetime
 from decimal import Decimal
 import requests
+import threading
 import concurrent.futures
+from collections import OrderedDict
 
 from web3 import Web3
 from uniswap_universal_router_decoder import FunctionRecipient, RouterCodec
@@ -14,15 +16,17 @@ import eth_abi
 import sys # for testing
 sys.path.append('..')
 
-from library import Singleton
+from library import Singleton, ContractRegistry, SWAP_TOPIC, decode_swap_log, SwapTracker, CreatorActivityIndex, MM_TX_AMOUNT_THRESHOLD
 from helpers.decorators import timer_decorator, async_timer_decorator
 from helpers.utils import load_contract_bin, encode_address, encode_uint, func_selector, \
                             decode_address, decode_pair_reserves, decode_int, load_router_contract, \
                             load_abi, calculate_next_block_base_fee, calculate_balance_storage_index, rpad_int, \
                             calculate_allowance_storage_index
 from helpers import constants
-from data import Pair, MaliciousPair, InspectionResult, SimulationResult
-from inspector import Simulator
+from data import Pair, MaliciousPair, InspectionResult, SimulationResult, PendingLiquidity, TemplateVerdict
+from inspector import Simulator, Quoter, SimulationError
+from inspector.pipeline import InspectionPipeline, InspectionStage
+from inspector.bytecode import bytecode_hash, is_template_cacheable, analyze_bytecode
 
 # django
 import django
@@ -30,15 +34,31 @@ from django.utils.timezone import make_aware
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "admin.settings")
 django.setup()
 import console.models
+from inspector.reputation import CreatorReputation
 
 STATUS_CODE_SUCCESS=200
+BASESCAN_API_URL=os.environ.get('BASESCAN_API_URL', 'https://api.basescan.org/api')
 PAGE_SIZE=100
-MM_TX_AMOUNT_THRESHOLD=0.001
 CREATOR_TX_HISTORY_PAGE_SIZE=500
 
 SIMULATION_AMOUNT=0.0001
 SLIPPAGE_MIN_THRESHOLD = 30 # in basis points
 SLIPPAGE_MAX_THRESHOLD = 100 # in basis points
+PRICE_IMPACT_MAX_THRESHOLD=float(os.environ.get('PRICE_IMPACT_MAX_THRESHOLD', '500')) # in basis points
+TRANSFER_TAX_MAX_THRESHOLD=float(os.environ.get('TRANSFER_TAX_MAX_THRESHOLD', '50')) # in basis points
+SIMULATION_LADDER_STEPS=int(os.environ.get('SIMULATION_LADDER_STEPS', '0'))
+MIN_BUY_AMOUNT=float(os.environ.get('MIN_BUY_AMOUNT', SIMULATION_AMOUNT))
+MAX_BUY_AMOUNT=float(os.environ.get('MAX_BUY_AMOUNT', SIMULATION_AMOUNT))
+SIMULATION_SELL_DELAYS=[int(delay) for delay in os.environ.get('SIMULATION_SELL_DELAYS', '').split(',') if len(delay.strip())>0] # in seconds
+INSPECTION_STAGE_WORKERS=20
+PRESTAGE_TTL_SECONDS=60
+CLUSTER_BLACKLIST_MIN_COUNT=int(os.environ.get('CLUSTER_BLACKLIST_MIN_COUNT', '1'))
+BYTECODE_VERDICT_MIN_OBSERVATIONS=int(os.environ.get('BYTECODE_VERDICT_MIN_OBSERVATIONS', '3'))
+BYTECODE_REJECTION_TTL_SECONDS=int(os.environ.get('BYTECODE_REJECTION_TTL_SECONDS', '21600'))
+BYTECODE_SAFE_TTL_SECONDS=int(os.environ.get('BYTECODE_SAFE_TTL_SECONDS', '3600'))
+BYTECODE_RISK_MAX_SCORE=int(os.environ.get('BYTECODE_RISK_MAX_SCORE', '4'))
+TOKEN_CODE_HASH_CACHE_SIZE=8192
+STAGE_STATS_LOG_INTERVAL=100 # batches
 
 RESERVE_ETH_MIN_THRESHOLD=float(os.environ.get('RESERVE_ETH_MIN_THRESHOLD'))
 RESERVE_ETH_MAX_THRESHOLD=float(os.environ.get('RESERVE_ETH_MAX_THRESHOLD'))
@@ -51,6 +71,98 @@ INSPECT_INTERVAL_SECONDS=int(os.environ.get('INSPECT_INTERVAL_SECONDS'))
 
 from enum import IntEnum
 
+def buy_ladder(min_amount, max_amount, steps):
+    # geometric sizes from min to max, each step a constant multiple of the previous one
+    if steps <= 0 or max_amount <= 0:
+        return []
+    if steps == 1 or min_amount <= 0 or min_amount >= max_amount:
+        return [max_amount]
+    return [round(min_amount*(max_amount/min_amount)**(idx/(steps - 1)), 6) for idx in range(steps)]
+
+BUY_LADDER=buy_ladder(MIN_BUY_AMOUNT, MAX_BUY_AMOUNT, SIMULATION_LADDER_STEPS)
+
+class TemplateVerdictCache:
+    # verdicts of token templates keyed by the hash of their normalized runtime code, backed by the bytecode_template
+    # table. A verdict is trusted once observed on `min_observations` tokens in a row, a conflicting observation
+    # (e.g. a template whose trading is toggled by its owner) starts the count over. Rejections are trusted for
+    # `rejection_ttl` seconds and safe verdicts for `safe_ttl` seconds since their last full inspection, then the
+    # next clone is fully inspected again.
+    def __init__(self, min_observations=BYTECODE_VERDICT_MIN_OBSERVATIONS, capacity=TOKEN_CODE_HASH_CACHE_SIZE, rejection_ttl=BYTECODE_REJECTION_TTL_SECONDS, safe_ttl=BYTECODE_SAFE_TTL_SECONDS) -> None:
+        self.min_observations = min_observations
+        self.rejection_ttl = rejection_ttl
+        self.safe_ttl = safe_ttl
+        self.capacity = capacity
+        self.templates = {}
+        self.token_hashes = OrderedDict()
+        self.features = OrderedDict()
+        self.lock = threading.Lock()
+
+    def remember(self, cache, key, value):
+        with self.lock:
+            cache[key] = value
+            if len(cache) > self.capacity:
+                cache.popitem(last=False)
+
+    def inspect_code(self, w3, token, code=None):
+        # (code hash, static features) of the token, the hash is None for code whose verdict cannot be cached
+        # (e.g. proxies) and the analysis runs once per distinct code
+        token = token.lower()
+        with self.lock:
+            if token in self.token_hashes:
+                self.token_hashes.move_to_end(token)
+                return self.token_hashes[token]
+
+        if code is None:
+            code = w3.eth.get_code(Web3.to_checksum_address(token))
+        digest = bytecode_hash(code)
+
+        features = self.features.get(digest)
+        if features is None:
+            features = analyze_bytecode(code)
+            self.remember(self.features, digest, features)
+
+        inspected = (digest if is_template_cacheable(code) else None, features)
+        self.remember(self.token_hashes, token, inspected)
+        return inspected
+
+    def get(self, code_hash) -> console.models.BytecodeTemplate:
+        if code_hash not in self.templates:
+            template = console.models.BytecodeTemplate.objects.filter(code_hash=code_hash, is_deleted=0).first()
+            with self.lock:
+                self.templates.setdefault(code_hash, template)
+        return self.templates[code_hash]
+
+    def lookup(self, code_hash) -> console.models.BytecodeTemplate:
+        if code_hash is None:
+            return None
+        template = self.get(code_hash)
+        if template is None or template.verdict == TemplateVerdict.UNKNOWN or template.observations < self.min_observations:
+            return None
+        ttl = self.safe_ttl if template.verdict == TemplateVerdict.SAFE else self.rejection_ttl
+        if template.updated_at is None or template.updated_at < make_aware(datetime.datetime.now() - datetime.timedelta(seconds=ttl)):
+            return None
+        return template
+
+    def observe(self, code_hash, token, verdict, tax=0, contract_verified=False):
+        template = self.get(code_hash)
+        with self.lock:
+            if template is None:
+                template = console.models.BytecodeTemplate(code_hash=code_hash, sample_token=token.lower(), verdict=verdict, observations=0, tax=0)
+                self.templates[code_hash] = template
+
+            if template.verdict != verdict:
+                logging.warning(f"INSPECTOR template {code_hash} verdict {TemplateVerdict(template.verdict).name} conflicts with {TemplateVerdict(verdict).name} of {token}")
+                template.verdict = verdict
+                template.observations = 0
+                template.tax = 0
+
+            template.observations += 1
+            template.tax = max(template.tax or 0, float(tax))
+            template.contract_verified = contract_verified
+            template.save()
+
+        logging.info(f"INSPECTOR template {code_hash} observed {TemplateVerdict(verdict).name} #{template.observations} on {token}")
+
 class PairInspector(metaclass=Singleton):
     def __init__(self,http_url,
                  api_keys,
@@ -75,28 +187,124 @@ class PairInspector(metaclass=Singleton):
         self.weth_abi = weth_abi
         self.bot_abi = bot_abi
         self.counter = 0
+        self.quoter = Quoter()
+        self.pipeline = InspectionPipeline(max_workers=INSPECTION_STAGE_WORKERS)
+        self.batches = 0
+        self.templates = TemplateVerdictCache()
+        self.swap_tracker = SwapTracker()
+        self.creator_activity = CreatorActivityIndex()
+        self.reputation = CreatorReputation(self.w3, self.select_api_key)
+
+        # inspections pre-staged from pending addLiquidityETH, keyed by token
+        self.prestaged = {}
+        self.prestage_lock = threading.Lock()
+
+    def simulator(self) -> Simulator:
+        return Simulator(
+            http_url=self.http_url,
+            signer=self.signer,
+            router_address=self.router,
+            weth=self.weth,
+            bot=self.bot,
+            pair_abi=self.pair_abi,
+            weth_abi=self.weth_abi,
+            bot_abi=self.bot_abi,
+        )
+
+    def get_prestaged(self, pair: Pair) -> InspectionResult:
+        prestaged = self.prestaged.get(pair.token.lower())
+        if prestaged is not None and time.time() - prestaged[0] <= PRESTAGE_TTL_SECONDS:
+            return prestaged[1]
+        return None
+
+    def simulate_pair(self, pair: Pair, block_identifier='latest') -> SimulationResult:
+        if len(BUY_LADDER)>0:
+            return self.simulator().inspect_ladder(pair, SIMULATION_AMOUNT, BUY_LADDER, block_identifier)
+        return self.simulator().inspect_pair(pair, SIMULATION_AMOUNT, block_identifier=block_identifier)
+
+    def select_buy_amount(self, pair: Pair, ladder):
+        # the largest size with all the smaller sizes within the thresholds, a reverted size caps the ladder (max tx amount)
+        amount = None
+        for step in sorted(ladder, key=lambda step: step.amount_in):
+            self.quoter.evaluate_step(pair, step)
+            if step.amount_out is None or step.price_impact is None or step.price_impact > PRICE_IMPACT_MAX_THRESHOLD or step.tax is None or step.tax > TRANSFER_TAX_MAX_THRESHOLD:
+                break
+            amount = step.amount_in
+        return amount
+
+    @timer_decorator
+    def prestage_pair(self, pending: PendingLiquidity) -> InspectionResult:
+        pair = pending.pair
+        result = InspectionResult(
+            pair=pair,
+            from_block=0,
+            to_block=0,
+        )
+
+        code = self.w3.eth.get_code(Web3.to_checksum_address(pair.token))
+        if len(code)==0:
+            logging.warning(f"INSPECTOR pre-stage {pair.token} has no code")
+            return result
+
+        if pair.creator is not None:
+            self.reputation.resolve(pair.creator)
+
+        result.contract_verified=self.is_contract_verified(pair)
+        if result.contract_verified:
+            # the node may or may not include the addLiquidity tx in its pending state, failures are not cached
+            try:
+                result.simulation_result=self.simulate_pair(pair, block_identifier='pending')
+            except SimulationError as e:
+                logging.error(f"INSPECTOR pre-stage simulation of {pair.token} error {e}")
+
+        with self.prestage_lock:
+            now = time.time()
+            self.prestaged = {token: prestaged for token,prestaged in self.prestaged.items() if now - prestaged[0] <= PRESTAGE_TTL_SECONDS}
+            self.prestaged[pair.token.lower()] = (now, result, code)
+
+        logging.warning(f"INSPECTOR pre-staged {pair.token} verified {result.contract_verified} simulation {result.simulation_result}")
+        return result
+
+    @timer_decorator
+    def inspect_template(self, pair: Pair):
+        # a single eth_getCode, none at all when the pending addLiquidity pre-staged the token
+        prestaged = self.prestaged.get(pair.token.lower())
+        code_hash, features = self.templates.inspect_code(self.w3, pair.token, prestaged[2] if prestaged is not None else None)
+        return code_hash, features, self.templates.lookup(code_hash)
 
     @timer_decorator
     def is_contract_verified(self, pair: Pair) -> False:
+        # None when Basescan gives no definite answer (e.g. rate limited), it must not be taken for unverified
         if pair.contract_verified:
             return True
+
+        prestaged = self.get_prestaged(pair)
+        if prestaged is not None and prestaged.contract_verified:
+            return True
         
-        r=requests.get(f"https://api.basescan.org/api?module=contract&action=getsourcecode&address={pair.token}&apikey={self.select_api_key()}")
+        r=requests.get(f"{BASESCAN_API_URL}?module=contract&action=getsourcecode&address={pair.token}&apikey={self.select_api_key()}")
         if r.status_code==STATUS_CODE_SUCCESS:
             res=r.json()
             if int(res['status'])==1 and len(res['result'][0].get('Library',''))==0:
                 if CONTRACT_VERIFIED_REQUIRED==1:
                     return True if len(res['result'][0].get('SourceCode',''))>0 and len(res['result'][0].get('ContractName'))>0 else False
                 return True
-                
-        return False
+            if int(res['status'])==1:
+                return False
+
+        return None
         
     @timer_decorator
     def is_creator_call_contract(self, pair, from_block, to_block) -> 0:
-        r=requests.get(f"https://api.basescan.org/api?module=account&action=txlist&address={pair.token}&startblock={from_block}&endblock={to_block}&page=1&offset={PAGE_SIZE}&sort=asc&apikey={self.select_api_key()}")
+        # indexed by the block watcher from the block bodies, Basescan only answers for tokens it does not cover
+        count = self.creator_activity.count_calls(pair.token, from_block, to_block)
+        if count is not None:
+            return count
+
+        r=requests.get(f"{BASESCAN_API_URL}?module=account&action=txlist&address={pair.token}&startblock={from_block}&endblock={to_block}&page=1&offset={PAGE_SIZE}&sort=asc&apikey={self.select_api_key()}")
         if r.status_code==STATUS_CODE_SUCCESS:
             res=r.json()
-            if int(res['status'])==1 and len(res['result'])>0:
+            if int(res['status'])==1 and len(res['result'])>0 and pair.creator is not None:
                 txs = [tx for tx in res['result'] if tx['from'].lower()==pair.creator.lower() and tx['to'].lower()==pair.token.lower()]
                 return len(txs)
             
@@ -108,28 +316,45 @@ class PairInspector(metaclass=Singleton):
             
     @timer_decorator
     def number_tx_mm(self, pair, from_block, to_block) -> 0:
-        contract=self.w3.eth.contract(address=Web3.to_checksum_address(pair.address),abi=self.pair_abi)
-        logs = contract.events.Swap().get_logs(
-                fromBlock = from_block,
-                toBlock = to_block,
-            )
-        if logs != ():
-            txs=[log for log in logs if (Web3.from_wei(log['args']['amount0In'], 'ether')>MM_TX_AMOUNT_THRESHOLD and pair.token_index==1) or (Web3.from_wei(log['args']['amount1In'], 'ether')>MM_TX_AMOUNT_THRESHOLD and pair.token_index==0)]
+        # counted by the block watcher as swaps are pushed, the logs are only scanned for pairs it does not track
+        count = self.swap_tracker.count_mm(pair.address, from_block, to_block)
+        if count is not None:
+            return count
+
+        logs = [decode_swap_log(log) for log in self.w3.eth.get_logs({
+                'address': Web3.to_checksum_address(pair.address),
+                'topics': [Web3.to_hex(SWAP_TOPIC)],
+                'fromBlock': from_block,
+                'toBlock': to_block,
+            })]
+        if len(logs)>0:
+            txs=[log for log in logs if (log['args']['amount0In']>MM_TX_AMOUNT_THRESHOLD and pair.token_index==1) or (log['args']['amount1In']>MM_TX_AMOUNT_THRESHOLD and pair.token_index==0)]
             return len(txs)
         
         return 0
         
     @timer_decorator
     def is_malicious(self, pair, block_number, is_initial=False) -> MaliciousPair:
+        # no creator when the liquidity was not added in the block of the pair creation
+        if pair.creator is None:
+            logging.warning(f"INSPECTOR pair {pair.address} has no known creator, skip the creator checks")
+            return MaliciousPair.UNMALICIOUS
+
         blacklist = console.models.BlackList.objects.filter(address=pair.creator.lower()).filter(frozen_at__gte=make_aware(datetime.datetime.now()-datetime.timedelta(seconds=ROGUE_CREATOR_FROZEN_SECONDS))).filter(created_at__gte=make_aware(datetime.datetime.now() - datetime.timedelta(days=90))).first()
         if blacklist is not None:
             logging.warning(f"INSPECTOR pair {pair.address} is blacklisted due to rogue creator")
             return MaliciousPair.CREATOR_BLACKLISTED
+
+        # fresh wallets of a blacklisted creator, known once the funding of the creator was walked in the background
+        tainted = self.reputation.tainted(pair.creator)
+        if tainted >= CLUSTER_BLACKLIST_MIN_COUNT:
+            logging.warning(f"INSPECTOR pair {pair.address} creator shares funding with {tainted} blacklisted wallets {self.reputation.summary(pair.creator)}")
+            return MaliciousPair.CREATOR_CLUSTER_TAINTED
         
         return MaliciousPair.UNMALICIOUS
     
     @timer_decorator
-    def inspect_pair(self, pair: Pair, block_number, is_initial=False) -> InspectionResult:
+    def inspect_pair(self, pair: Pair, block_number, is_initial=False, buy_amount=None) -> InspectionResult:
         from_block=pair.last_inspected_block if pair.last_inspected_block>0 else block_number
 
         result = InspectionResult(
@@ -144,56 +369,182 @@ class PairInspector(metaclass=Singleton):
         if is_initial and not result.reserve_inrange:
             return result        
 
-        result.is_malicious=self.is_malicious(pair, block_number, is_initial)
-        if result.is_malicious != MaliciousPair.UNMALICIOUS:
-            return result
+        template_state = {'code_hash': None, 'template': None}
+        observed = {}
 
-        result.contract_verified=self.is_contract_verified(pair)
-        if not result.contract_verified:
+        def verdict_quote(quote):
+            result.quote=quote
+            if quote is None:
+                logging.warning(f"INSPECTOR pair {pair.address} rejected due to empty reserves")
+                return False
+            if quote.price_impact > PRICE_IMPACT_MAX_THRESHOLD:
+                logging.warning(f"INSPECTOR pair {pair.address} rejected due to high price impact {round(quote.price_impact,2)}")
+                return False
+            return True
+
+        def verdict_malicious(value):
+            result.is_malicious=value
+            return value == MaliciousPair.UNMALICIOUS
+
+        def verdict_template(value):
+            template_state['code_hash'], result.bytecode_features, template = value
+            template_state['template'] = template
+            # owner capabilities the simulation cannot see at the current state, e.g. trading closed after the buy
+            if result.bytecode_features.risk_score() > BYTECODE_RISK_MAX_SCORE:
+                logging.warning(f"INSPECTOR pair {pair.address} rejected due to bytecode risk {result.bytecode_features}")
+                return False
+            if template is None or template.verdict == TemplateVerdict.SAFE:
+                return True
+            logging.warning(f"INSPECTOR pair {pair.address} rejected due to template {template.code_hash} verdict {TemplateVerdict(template.verdict).name}")
+            return False
+
+        def verdict_verified(value):
+            result.contract_verified=value
+            observed['contract_verified']=value
+            if value is None:
+                logging.warning(f"INSPECTOR pair {pair.address} rejected due to verification unavailable")
+            return value is True
+
+        def verdict_creator_call(value):
+            result.is_creator_call_contract=value
+            return value==0
+
+        def verdict_number_tx_mm(value):
+            result.number_tx_mm=value
+            stats = self.swap_tracker.stats(pair.address)
+            result.swap_stats = stats.to_dict() if stats is not None else None
+            return True
+
+        def verdict_simulation(simulation_result):
+            if simulation_result is None:
+                observed['verdict']=TemplateVerdict.HONEYPOT
+                return False
+
+            tax = self.quoter.estimate_tax(pair, simulation_result)
+            if tax is not None:
+                simulation_result.tax = tax
+            observed['tax']=simulation_result.tax
+
+            if simulation_result.tax > TRANSFER_TAX_MAX_THRESHOLD:
+                logging.warning(f"INSPECTOR simulation result rejected due to transfer tax {round(simulation_result.tax,2)}")
+                observed['verdict']=TemplateVerdict.HIGH_TAX
+                return False
+            if simulation_result.slippage <= SLIPPAGE_MIN_THRESHOLD or simulation_result.slippage >= SLIPPAGE_MAX_THRESHOLD:
+                logging.warning(f"INSPECTOR simulation result rejected due to high slippage {simulation_result.slippage}")
+                return False
+            if simulation_result.ladder is not None:
+                simulation_result.max_buy_amount = self.select_buy_amount(pair, simulation_result.ladder)
+                if simulation_result.max_buy_amount is None:
+                    logging.warning(f"INSPECTOR simulation result rejected due to no buy size within thresholds {[str(step) for step in simulation_result.ladder]}")
+                    return False
+
+            result.simulation_result=simulation_result
+            observed['simulated']=True
+            return True
+
+        def verdict_delayed_sells(delayed_sells):
+            # trading restrictions kicking in after the buy; the sell in the block of the buy is the reference, some
+            # tokens forbid it (anti-sandwich) which does not matter for a position held for a while
+            result.delayed_sells=delayed_sells
+            (_, reference), delayed = delayed_sells[0], delayed_sells[1:]
+            for delay,amount_out in delayed:
+                if amount_out is None:
+                    logging.warning(f"INSPECTOR pair {pair.address} rejected due to sell reverted {delay}s after the buy")
+                    observed['verdict']=TemplateVerdict.HONEYPOT
+                    return False
+                if reference is None:
+                    continue
+                tax = (Decimal(reference) - Decimal(amount_out))/Decimal(SIMULATION_AMOUNT)*Decimal(10000)
+                if tax > TRANSFER_TAX_MAX_THRESHOLD:
+                    logging.warning(f"INSPECTOR pair {pair.address} rejected due to transfer tax {round(tax,2)} {delay}s after the buy")
+                    observed['verdict']=TemplateVerdict.HIGH_TAX
+                    observed['tax']=tax
+                    return False
+            observed['delayed_sells']=True
+            return True
+
+        def observe_template():
+            # verdicts depending on the template only, slippage depends on the reserves and is not recorded
+            verdict = observed.get('verdict')
+            if template_state['template'] is not None:
+                # a clone of a trusted safe template is recorded only when its own simulation rejects it (tax or
+                # trading set by the constructor), the safe verdict ages from its last full inspection
+                if verdict is not None:
+                    self.pipeline.executor.submit(self.templates.observe, template_state['code_hash'], pair.token, verdict, observed.get('tax', 0), template_state['template'].contract_verified)
+                return
+            if verdict is None and observed.get('contract_verified') is False:
+                verdict = TemplateVerdict.UNVERIFIED
+            if verdict is None and observed.get('simulated') and observed.get('contract_verified') and (len(SIMULATION_SELL_DELAYS)==0 or observed.get('delayed_sells')):
+                verdict = TemplateVerdict.SAFE
+            if verdict is not None:
+                self.pipeline.executor.submit(self.templates.observe, template_state['code_hash'], pair.token, verdict, observed.get('tax', 0), observed.get('contract_verified', False))
+
+        def simulate():
+            if is_initial:
+                prestaged = self.get_prestaged(pair)
+                if prestaged is not None and prestaged.simulation_result is not None:
+                    logging.info(f"INSPECTOR use pre-staged simulation of {pair.token}")
+                    prestaged.simulation_result.pair = pair
+                    return prestaged.simulation_result
+
+            return self.simulate_pair(pair)
+
+        # ordered by cost, cheapest first; the off-chain quote rejects pairs before any RPC call
+        sequential_stages = [
+            InspectionStage('quote', lambda: self.quoter.quote(pair, buy_amount if buy_amount is not None else SIMULATION_AMOUNT), verdict_quote),
+            InspectionStage('blacklist', lambda: self.is_malicious(pair, block_number, is_initial), verdict_malicious),
+            InspectionStage('template', lambda: self.inspect_template(pair), verdict_template),
+        ]
+        if not self.pipeline.run(result, sequential_stages, []):
+            result.simulation_result=None
             return result
-        
+
+        # a trusted safe template stands for the verification and the delayed sells of the token, its storage is set
+        # by the constructor so the token is still bought and sold once
+        template = template_state['template']
+        sequential_stages = []
+        concurrent_stages = []
+        if template is not None:
+            result.contract_verified=template.contract_verified
+        else:
+            concurrent_stages.append(InspectionStage('verification', lambda: self.is_contract_verified(pair), verdict_verified))
         if not is_initial:
-            result.is_creator_call_contract=self.is_creator_call_contract(pair,from_block,block_number)
-            if result.is_creator_call_contract>0:
-                return result
-        
-            result.number_tx_mm=self.number_tx_mm(pair,from_block,block_number)
+            concurrent_stages += [
+                InspectionStage('creator_call', lambda: self.is_creator_call_contract(pair,from_block,block_number), verdict_creator_call),
+                InspectionStage('number_tx_mm', lambda: self.number_tx_mm(pair,from_block,block_number), verdict_number_tx_mm),
+            ]
+        concurrent_stages.append(InspectionStage('simulation', simulate, verdict_simulation))
+        if template is None and len(SIMULATION_SELL_DELAYS)>0:
+            concurrent_stages.append(InspectionStage('delayed_sells', lambda: self.simulator().inspect_delayed_sells(pair.token, SIMULATION_AMOUNT, SIMULATION_SELL_DELAYS), verdict_delayed_sells))
 
-        simulator = Simulator(
-            http_url=self.http_url,
-            signer=self.signer,
-            router_address=self.router,
-            weth=self.weth,
-            bot=self.bot,
-            pair_abi=self.pair_abi,
-            weth_abi=self.weth_abi,
-            bot_abi=self.bot_abi,
-        )
+        if not self.pipeline.run(result, sequential_stages, concurrent_stages):
+            result.simulation_result=None
 
-        simulation_result = simulator.inspect_pair(pair, SIMULATION_AMOUNT)
-        if simulation_result is not None:
-            if simulation_result.slippage > SLIPPAGE_MIN_THRESHOLD and simulation_result.slippage < SLIPPAGE_MAX_THRESHOLD:
-                result.simulation_result=simulation_result
-            else:
-                logging.warning(f"INSPECTOR simulation result rejected due to high slippage {simulation_result.slippage}")
+        if template_state['code_hash'] is not None:
+            observe_template()
 
         return result
     
     @timer_decorator
-    def inspect_batch(self, pairs, block_number, is_initial=False):
+    def inspect_batch(self, pairs, block_number, is_initial=False, buy_amount=None):
         results = []
 
         with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            future_to_pair = {executor.submit(self.inspect_pair,pair,block_number,is_initial): pair.address for pair in pairs}
+            future_to_pair = {executor.submit(self.inspect_pair,pair,block_number,is_initial,buy_amount): pair.address for pair in pairs}
             for future in concurrent.futures.as_completed(future_to_pair):
                 pair = future_to_pair[future]
                 try:
                     result = future.result()
-                    logging.info(f"INSPECTOR inspect pair {pair} {result}")
+                    logging.info("INSPECTOR inspect pair %s %s", pair, result)
                     results.append(result)
                 except Exception as e:
                     logging.error(f"INSPECTOR inspect pair {pair} error {e}")
 
+        self.batches += 1
+        if self.batches % STAGE_STATS_LOG_INTERVAL == 0:
+            for stats in list(self.pipeline.stats.values()):
+                logging.info(f"INSPECTOR {stats}")
+
         return results
         
 if __name__=="__main__":
@@ -0,0 +1,114 @@
+import logging
+import time
+import threading
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers import metrics
+
+class InspectionStage:
+    # run() does the (remote) work and returns a value, verdict(value) applies it to the inspection result
+    # and returns False to reject the pair. verdict is only called from the coordinating thread.
+    def __init__(self, name, run, verdict) -> None:
+        self.name = name
+        self.run = run
+        self.verdict = verdict
+
+class StageStats:
+    def __init__(self, name) -> None:
+        self.name = name
+        self.count = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.total_time = 0
+        self.max_time = 0
+
+    def avg_time(self):
+        return self.total_time/self.count if self.count>0 else 0
+
+    def __str__(self) -> str:
+        return f"Stage {self.name} count {self.count} rejected {self.rejected} cancelled {self.cancelled} failed {self.failed} avg {self.avg_time():.4f}s max {self.max_time:.4f}s"
+
+class InspectionPipeline:
+    def __init__(self, max_workers=10) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def get_stats(self, name) -> StageStats:
+        if name not in self.stats:
+            with self.lock:
+                self.stats.setdefault(name, StageStats(name))
+        return self.stats[name]
+
+    def record(self, name, latency=0, rejected=False, cancelled=False, failed=False):
+        stats = self.get_stats(name)
+        with self.lock:
+            if cancelled:
+                stats.cancelled += 1
+                metrics.registry.counter('inspection_stage_total', 'Inspection stage outcomes', stage=name, outcome='cancelled').inc()
+                return
+
+            stats.count += 1
+            stats.total_time += latency
+            stats.max_time = max(stats.max_time, latency)
+            if rejected:
+                stats.rejected += 1
+            if failed:
+                stats.failed += 1
+
+        outcome = 'failed' if failed else 'rejected' if rejected else 'accepted'
+        metrics.registry.counter('inspection_stage_total', 'Inspection stage outcomes', stage=name, outcome=outcome).inc()
+        if not failed:
+            metrics.registry.histogram('inspection_stage_latency_seconds', 'Latency of inspection stages', stage=name).observe(latency)
+
+    def timed_run(self, stage: InspectionStage):
+        start_time = time.perf_counter()
+        value = stage.run()
+        return value, time.perf_counter() - start_time
+
+    def run(self, result, sequential_stages, concurrent_stages) -> bool:
+        # cheap stages run inline one by one, the first rejection stops the pipeline
+        for stage in sequential_stages:
+            try:
+                value, latency = self.timed_run(stage)
+            except Exception as e:
+                logging.error(f"INSPECTOR stage {stage.name} of {result.pair.address} error {e}")
+                self.record(stage.name, failed=True)
+                return False
+
+            result.stage_latency[stage.name] = latency
+            accepted = stage.verdict(value)
+            self.record(stage.name, latency, rejected=not accepted)
+            if not accepted:
+                return False
+
+        if len(concurrent_stages)==0:
+            return True
+
+        # independent expensive stages, submitted cheapest first; the first rejection cancels
+        # the pending ones and discards the values of those still in flight
+        future_to_stage = {self.executor.submit(self.timed_run, stage): stage for stage in concurrent_stages}
+        accepted = True
+        for future in concurrent.futures.as_completed(future_to_stage):
+            stage = future_to_stage[future]
+            try:
+                value, latency = future.result()
+                result.stage_latency[stage.name] = latency
+                accepted = stage.verdict(value)
+                self.record(stage.name, latency, rejected=not accepted)
+            except Exception as e:
+                logging.error(f"INSPECTOR stage {stage.name} of {result.pair.address} error {e}")
+                self.record(stage.name, failed=True)
+                accepted = False
+
+            if not accepted:
+                for pending, pending_stage in future_to_stage.items():
+                    # a stage already running cannot be cancelled, its value is discarded when it completes
+                    if pending is not future and pending.cancel():
+                        self.record(pending_stage.name, cancelled=True)
+                logging.warning(f"INSPECTOR pair {result.pair.address} rejected at stage {stage.name}")
+                break
+
+        return accepted
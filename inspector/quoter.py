@@ -0,0 +1,70 @@
+import logging
+from decimal import Decimal
+
+from web3 import Web3
+
+import sys # for testing
+sys.path.append('..')
+
+from helpers.utils import get_amount_out
+from data import Pair, Quote, SimulationResult, LadderStep
+
+class Quoter:
+    # off-chain constant-product quotes, exact to the router integer math given the pair reserves
+
+    def quote(self, pair: Pair, amount) -> Quote:
+        reserve_eth = Web3.to_wei(pair.reserve_eth, 'ether')
+        reserve_token = Web3.to_wei(pair.reserve_token, 'ether')
+        amount_in = Web3.to_wei(amount, 'ether')
+
+        if reserve_eth==0 or reserve_token==0 or amount_in==0:
+            return None
+
+        # buy token with eth, then sell all bought token back against the post-buy reserves
+        amount_token = get_amount_out(amount_in, reserve_eth, reserve_token)
+        amount_out = get_amount_out(amount_token, reserve_token - amount_token, reserve_eth + amount_in)
+
+        # execution price deviation from mid price, fee excluded, in basis points
+        price_impact = Decimal(amount_in) / Decimal(reserve_eth + amount_in) * Decimal(10000)
+
+        return Quote(
+            pair=pair,
+            amount_in=amount,
+            amount_token=Web3.from_wei(amount_token, 'ether'),
+            amount_out=Web3.from_wei(amount_out, 'ether'),
+            price_impact=price_impact,
+        )
+
+    def estimate_tax(self, pair: Pair, simulation_result: SimulationResult):
+        # round-trip loss of the simulation exceeding the theoretical loss (fees + impact), in basis points
+        quote = self.quote(pair, simulation_result.amount_in)
+        if quote is None:
+            return None
+
+        tax = (Decimal(quote.amount_out) - Decimal(simulation_result.amount_out)) / Decimal(simulation_result.amount_in) * Decimal(10000)
+        logging.debug(f"QUOTER {pair.address} theoretical amountOut {quote.amount_out} simulated {simulation_result.amount_out} tax {tax}")
+
+        return max(tax, Decimal(0))
+
+    def evaluate_step(self, pair: Pair, step: LadderStep) -> LadderStep:
+        # price impact and round-trip tax of a ladder step. The buy and the sell are both simulated from the pre-buy
+        # state, so each is compared to its own theoretical amount there, otherwise the impact would count as tax.
+        reserve_eth = Web3.to_wei(pair.reserve_eth, 'ether')
+        reserve_token = Web3.to_wei(pair.reserve_token, 'ether')
+        amount_in = Web3.to_wei(step.amount_in, 'ether')
+        if reserve_eth==0 or reserve_token==0 or amount_in==0:
+            return step
+
+        step.price_impact = Decimal(amount_in) / Decimal(reserve_eth + amount_in) * Decimal(10000)
+        if step.amount_out is None:
+            return step
+
+        amount_token = Web3.to_wei(step.amount_token, 'ether')
+        expected_token = get_amount_out(amount_in, reserve_eth, reserve_token)
+        expected_out = get_amount_out(amount_token, reserve_token, reserve_eth)
+        if expected_token==0 or expected_out==0:
+            return step
+
+        kept = Decimal(amount_token) / Decimal(expected_token) * Decimal(Web3.to_wei(step.amount_out, 'ether')) / Decimal(expected_out)
+        step.tax = max((Decimal(1) - kept) * Decimal(10000), Decimal(0))
+        return step
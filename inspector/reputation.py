@@ -0,0 +1,226 @@
+import os
+import logging
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from web3 import Web3
+
+import sys # for testing
+sys.path.append('..')
+
+from library import Singleton
+
+import django
+from django.utils.timezone import make_aware
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "admin.settings")
+django.setup()
+import console.models
+
+BASESCAN_API_URL=os.environ.get('BASESCAN_API_URL', 'https://api.basescan.org/api')
+FUNDING_MAX_HOPS=int(os.environ.get('FUNDING_MAX_HOPS', '3'))
+FUNDING_HUB_MIN_NONCE=int(os.environ.get('FUNDING_HUB_MIN_NONCE', '2000'))
+FUNDING_HUB_ADDRESSES=[address.strip().lower() for address in os.environ.get('FUNDING_HUB_ADDRESSES', '').split(',') if len(address.strip())>0]
+REPUTATION_REFRESH_SECONDS=int(os.environ.get('REPUTATION_REFRESH_SECONDS', '60'))
+REPUTATION_BLACKLIST_DAYS=90
+FUNDING_TX_PAGE_SIZE=20
+FUNDING_WORKERS=3
+
+class FundingGraph:
+    # union-find over wallet -> funder edges with the number of blacklisted wallets per cluster, a lookup is a
+    # near constant time root search thanks to path compression
+    def __init__(self) -> None:
+        self.parents = {}
+        self.sizes = {}
+        self.bad_counts = {}
+        self.bad = set()
+
+    def find(self, address):
+        root = address
+        while self.parents.get(root, root) != root:
+            root = self.parents[root]
+        while address != root:
+            self.parents[address], address = root, self.parents[address]
+        return root
+
+    def union(self, address, funder):
+        root_a, root_b = self.find(address), self.find(funder)
+        if root_a == root_b:
+            return
+        if self.sizes.get(root_a, 1) < self.sizes.get(root_b, 1):
+            root_a, root_b = root_b, root_a
+        self.parents[root_b] = root_a
+        self.sizes[root_a] = self.sizes.get(root_a, 1) + self.sizes.pop(root_b, 1)
+        self.bad_counts[root_a] = self.bad_counts.get(root_a, 0) + self.bad_counts.pop(root_b, 0)
+
+    def mark_bad(self, address):
+        if address in self.bad:
+            return
+        self.bad.add(address)
+        root = self.find(address)
+        self.bad_counts[root] = self.bad_counts.get(root, 0) + 1
+
+    def cluster_size(self, address):
+        return self.sizes.get(self.find(address), 1)
+
+    def bad_in_cluster(self, address):
+        # blacklisted wallets sharing a funder with the address, the address itself excluded
+        return self.bad_counts.get(self.find(address), 0) - (1 if address in self.bad else 0)
+
+class CreatorReputation(metaclass=Singleton):
+    # creators are tainted by the outcomes of the wallets funded from the same source. The first funding transfer
+    # of a wallet is walked up to `max_hops` back in the background, stopping at hubs (exchanges, bridges) which
+    # fund unrelated wallets; edges are persisted in the wallet_funding table and outcomes come from the blacklist.
+    def __init__(self, w3, select_api_key, max_hops=FUNDING_MAX_HOPS) -> None:
+        self.w3 = w3
+        self.select_api_key = select_api_key
+        self.max_hops = max_hops
+
+        self.graph = FundingGraph()
+        self.funders = {} # address -> funder, None when unknown or a hub
+        self.hubs = set(FUNDING_HUB_ADDRESSES)
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=FUNDING_WORKERS)
+
+        self.refreshed_at = None
+        self.refreshing = False
+        self.executor.submit(self.bootstrap)
+
+    def bootstrap(self):
+        edges = console.models.WalletFunding.objects.filter(is_deleted=0).values_list('address', 'funder', 'funder_is_hub')
+        with self.lock:
+            for address, funder, funder_is_hub in edges:
+                self.funders[address] = None if funder_is_hub else funder
+                if funder is not None and funder_is_hub:
+                    self.hubs.add(funder)
+                elif funder is not None:
+                    self.graph.union(address, funder)
+        logging.warning(f"REPUTATION loaded {len(self.funders)} funding edges")
+        self.refresh()
+
+    def refresh(self):
+        # blacklisted creators since the last refresh, marked on their clusters
+        since = self.refreshed_at if self.refreshed_at is not None else datetime.datetime.now() - datetime.timedelta(days=REPUTATION_BLACKLIST_DAYS)
+        refreshed_at = datetime.datetime.now()
+        try:
+            addresses = console.models.BlackList.objects.filter(is_deleted=0, updated_at__gte=make_aware(since)).values_list('address', flat=True)
+            with self.lock:
+                for address in addresses:
+                    if address is not None:
+                        self.graph.mark_bad(address.lower())
+            self.refreshed_at = refreshed_at
+        except Exception as e:
+            logging.error(f"REPUTATION refresh blacklist error {e}")
+        finally:
+            self.refreshing = False
+
+    def schedule_refresh(self):
+        if self.refreshed_at is None or self.refreshing or (datetime.datetime.now() - self.refreshed_at).total_seconds() < REPUTATION_REFRESH_SECONDS:
+            return
+        self.refreshing = True
+        self.executor.submit(self.refresh)
+
+    def first_funding(self, address):
+        # (funder, block) of the first transfer of ETH to the address, external or internal (e.g. a disperse
+        # contract, then the sender of the transaction funds the address)
+        candidates = []
+        for action in ['txlist', 'txlistinternal']:
+            r = requests.get(f"{BASESCAN_API_URL}?module=account&action={action}&address={address}&startblock=0&endblock=99999999&page=1&offset={FUNDING_TX_PAGE_SIZE}&sort=asc&apikey={self.select_api_key()}")
+            if r.status_code != 200:
+                continue
+            res = r.json()
+            if int(res['status'])!=1:
+                continue
+            for tx in res['result']:
+                if tx['to'].lower() == address and int(tx['value']) > 0 and tx.get('isError', '0') == '0':
+                    candidates.append((int(tx['blockNumber']), action, tx))
+                    break
+
+        if len(candidates)==0:
+            return None, None
+
+        block_number, action, tx = min(candidates, key=lambda candidate: candidate[0])
+        funder = tx['from'].lower() if action == 'txlist' else self.w3.eth.get_transaction(tx['hash'])['from'].lower()
+        return funder, block_number
+
+    def is_hub(self, address):
+        if address in self.hubs:
+            return True
+        if self.w3.eth.get_transaction_count(Web3.to_checksum_address(address)) >= FUNDING_HUB_MIN_NONCE:
+            with self.lock:
+                self.hubs.add(address)
+            return True
+        return False
+
+    def walk(self, address):
+        origin = address
+        try:
+            for _ in range(self.max_hops):
+                if address in self.funders:
+                    # known from here on, possibly from another walk
+                    break
+
+                funder, block_number = self.first_funding(address)
+                funder_is_hub = funder is not None and self.is_hub(funder)
+                console.models.WalletFunding.objects.update_or_create(address=address, defaults={
+                    'funder': funder,
+                    'funded_block': block_number,
+                    'funder_is_hub': funder_is_hub,
+                })
+
+                with self.lock:
+                    self.funders[address] = None if funder_is_hub else funder
+                    if funder is not None and not funder_is_hub:
+                        self.graph.union(address, funder)
+
+                logging.info(f"REPUTATION {address} funded by {funder} at #{block_number}{' (hub)' if funder_is_hub else ''}")
+                if funder is None or funder_is_hub:
+                    break
+                address = funder
+        except Exception as e:
+            logging.error(f"REPUTATION walk funding of {address} error {e}")
+        finally:
+            # a failed walk is retried on the next lookup
+            with self.lock:
+                self.pending.discard(origin)
+
+    def resolve(self, address):
+        # walks are deduplicated, an address is walked once per process
+        address = address.lower()
+        with self.lock:
+            if address in self.funders or address in self.pending:
+                return
+            self.pending.add(address)
+        self.executor.submit(self.walk, address)
+
+    def tainted(self, address):
+        # blacklisted wallets in the funding cluster of the address, from the in-memory index only
+        if address is None:
+            return 0
+        address = address.lower()
+        self.schedule_refresh()
+        self.resolve(address)
+        with self.lock:
+            return self.graph.bad_in_cluster(address)
+
+    def summary(self, address):
+        address = address.lower()
+        with self.lock:
+            return {
+                'cluster_size': self.graph.cluster_size(address),
+                'bad_in_cluster': self.graph.bad_in_cluster(address),
+                'funder': self.funders.get(address),
+            }
+
+if __name__ == "__main__":
+    graph = FundingGraph()
+    # rugger funds 3 fresh wallets, an unrelated wallet is funded by an exchange which is not linked
+    for wallet in ['0xa', '0xb', '0xc']:
+        graph.union(wallet, '0xrugger')
+    graph.union('0xrugger', '0xorigin')
+    graph.mark_bad('0xa')
+    graph.mark_bad('0xb')
+
+    print(f"0xc tainted by {graph.bad_in_cluster('0xc')}, 0xa by {graph.bad_in_cluster('0xa')}, cluster size {graph.cluster_size('0xc')}, 0xd by {graph.bad_in_cluster('0xd')}")
@@ -3,22 +3,38 @@ import os
 import logging
 import time
 from decimal import Decimal
+import requests
 
 from web3 import Web3
+from web3.exceptions import ContractLogicError
 from uniswap_universal_router_decoder import FunctionRecipient, RouterCodec
 import eth_abi
+from eth_abi.exceptions import DecodingError
+from pyrevm import EVM, Env, BlockEnv
 
 import sys # for testing
 sys.path.append('..')
 
-from library import Singleton
+from library import Singleton, ContractRegistry
 from helpers.decorators import timer_decorator, async_timer_decorator
 from helpers.utils import load_contract_bin, encode_address, encode_uint, func_selector, \
                             decode_address, decode_pair_reserves, decode_int, load_router_contract, \
                             load_abi, calculate_next_block_base_fee, calculate_balance_storage_index, rpad_int, \
                             calculate_allowance_storage_index
+from helpers.encoding import encode_call, address_word, uint_word
 
-from data import SimulationResult, Pair
+from data import SimulationResult, LadderStep, Pair
+
+BATCH_CALL_TIMEOUT_SECONDS=10
+BLOCK_TIME_SECONDS=2 # Base
+RPC_REVERT_CODE=3
+
+class SimulationError(Exception):
+    # the simulation could not run (transport, rate limit, node error), unlike a revert it says nothing about the token
+    pass
+
+def is_revert(error):
+    return error.get('code') == RPC_REVERT_CODE or 'revert' in str(error.get('message', '')).lower()
 
 class Simulator:
     @timer_decorator
@@ -40,10 +56,11 @@ class Simulator:
         self.router_address = router_address
         self.weth = weth
 
-        self.w3 = Web3(Web3.HTTPProvider(http_url))
+        self.registry = ContractRegistry()
+        self.w3 = self.registry.web3(http_url)
         self.pair_abi = pair_abi
-        self.weth_contract = self.w3.eth.contract(address=weth, abi=weth_abi)
-        self.bot = self.w3.eth.contract(address=bot, abi=bot_abi)
+        self.weth_contract = self.registry.contract(self.w3, weth, weth_abi)
+        self.bot = self.registry.contract(self.w3, bot, bot_abi)
 
     @timer_decorator
     def inspect_token_by_transfer(self, token, amount):
@@ -85,9 +102,7 @@ class Simulator:
             result = self.w3.eth.call({
                 'from': self.signer,
                 'to': self.bot.address,
-                'data': bytes.fromhex(
-                    func_selector('inspect_transfer(address,uint256)') + encode_address(token) + encode_uint(Web3.to_wei(amount, 'ether'))
-                )
+                'data': encode_call('inspect_transfer(address,uint256)', address_word(token), uint_word(Web3.to_wei(amount, 'ether'))),
             }, 'latest', {
                 token: {
                     'stateDiff': {
@@ -108,17 +123,15 @@ class Simulator:
             return None
         
     @timer_decorator
-    def inspect_token_by_swap(self, token, amount):
+    def inspect_token_by_swap(self, token, amount, block_identifier='latest'):
         try:
             # buy
             result = self.w3.eth.call({
                 'from': self.signer,
                 'to': self.bot.address,
                 'value': Web3.to_wei(amount, 'ether'),
-                'data': bytes.fromhex(
-                    func_selector('buy(address,uint256)') + encode_address(token) + encode_uint(int(time.time()) + 1000)
-                )
-            }, 'latest', {
+                'data': encode_call('buy(address,uint256)', address_word(token), uint_word(int(time.time()) + 1000)),
+            }, block_identifier, {
                 self.signer: {
                     'balance': hex(10**18)
                 }
@@ -137,10 +150,8 @@ class Simulator:
             result = self.w3.eth.call({
                 'from': self.signer,
                 'to': self.bot.address,
-                'data': bytes.fromhex(
-                    func_selector('sell(address,address,uint256)') + encode_address(token) + encode_address(self.signer) + encode_uint(int(time.time()) + 1000)
-                )
-            }, 'latest', {
+                'data': encode_call('sell(address,address,uint256)', address_word(token), address_word(self.signer), uint_word(int(time.time()) + 1000)),
+            }, block_identifier, {
                 token: {
                     'stateDiff': {
                         storage_index.hex(): hex(resultBuy[0][1]),
@@ -160,15 +171,180 @@ class Simulator:
             amount_token = Web3.from_wei(resultBuy[0][1], 'ether')
             
             return (amount, amount_out, slippage, amount_token)
-        except Exception as e:
-            logging.error(f"SIMULATOR inspect {token} failed with error {e}")
+        except (ContractLogicError, AssertionError, DecodingError) as e:
+            logging.error(f"SIMULATOR inspect {token} reverted {e}")
             return None
+        except Exception as e:
+            raise SimulationError(f"inspect {token} failed with error {e}") from e
         
-    def inspect_pair(self, pair: Pair, amount, swap=True) -> None:
+    def batch_request(self, calls):
+        # [(method, params)] sent as one JSON-RPC batch, the results in order, None for the reverted calls. Any other
+        # error raises SimulationError, a partial answer cannot be told apart from a honeypot.
+        payload = [{
+            'jsonrpc': '2.0',
+            'id': idx,
+            'method': method,
+            'params': params,
+        } for idx,(method,params) in enumerate(calls)]
+
+        try:
+            r = requests.post(self.http_url, json=payload, timeout=BATCH_CALL_TIMEOUT_SECONDS)
+            body = r.json()
+        except Exception as e:
+            raise SimulationError(f"batch request failed with error {e}") from e
+        if not isinstance(body, list):
+            raise SimulationError(f"batch request rejected {body}")
+
+        responses = {response.get('id'): response for response in body}
+        results = []
+        for idx in range(len(calls)):
+            response = responses.get(idx)
+            if response is None:
+                raise SimulationError(f"batch request missing response #{idx}")
+            if 'error' in response:
+                if not is_revert(response['error']):
+                    raise SimulationError(f"batch request #{idx} failed with error {response['error']}")
+                results.append(None)
+            else:
+                results.append(response['result'])
+        return results
+
+    def decode_amounts(self, result, amount_in):
+        # amounts returned by the bot buy/sell, None when reverted or not consuming `amount_in`
+        if result is None:
+            return None
+        amounts = eth_abi.decode(['uint[]'], bytes.fromhex(result[2:]))[0]
+        if len(amounts) == 2 and amounts[0] == amount_in:
+            return amounts[1]
+        return None
+
+    def sell_call(self, token, amount_token, block_identifier, deadline):
+        return ('eth_call', [{
+            'from': self.signer,
+            'to': self.bot.address,
+            'data': Web3.to_hex(encode_call('sell(address,address,uint256)', address_word(token), address_word(self.signer), uint_word(deadline))),
+        }, block_identifier, {
+            token: {
+                'stateDiff': {
+                    Web3.to_hex(calculate_balance_storage_index(self.bot.address, 0)): hex(amount_token),
+                }
+            }
+        }])
+
+    @timer_decorator
+    def inspect_token_by_ladder(self, token, amounts, block_identifier='latest'):
+        # buys of all the sizes from the same state in one batch, then the sells of the bought amounts in another one,
+        # so a ladder costs the 2 round trips of a single size. (amount_in, amount_token, amount_out) per size.
+        block_identifier = hex(block_identifier) if isinstance(block_identifier, int) else block_identifier
+        deadline = int(time.time()) + 1000
+        amounts_wei = [Web3.to_wei(amount, 'ether') for amount in amounts]
+
+        calls = [('eth_call', [{
+            'from': self.signer,
+            'to': self.bot.address,
+            'value': hex(amount_wei),
+            'data': Web3.to_hex(encode_call('buy(address,uint256)', address_word(token), uint_word(deadline))),
+        }, block_identifier, {
+            self.signer: {
+                'balance': hex(max(amounts_wei) + 10**18)
+            }
+        }]) for amount_wei in amounts_wei]
+
+        results = self.batch_request(calls)
+        amounts_token = [self.decode_amounts(result, amount_wei) for amount_wei,result in zip(amounts_wei, results)]
+        logging.debug("SIMULATOR ladder buy results %s", amounts_token)
+
+        # indexed by position, two sizes may buy the same amount of tokens
+        bought = [idx for idx,amount_token in enumerate(amounts_token) if amount_token is not None]
+        results = self.batch_request([self.sell_call(token, amounts_token[idx], block_identifier, deadline) for idx in bought]) if len(bought)>0 else []
+        sold = {idx: self.decode_amounts(result, amounts_token[idx]) for idx,result in zip(bought, results)}
+        logging.debug("SIMULATOR ladder sell results %s", sold)
+
+        return [(amount,
+                 Web3.from_wei(amount_token, 'ether') if amount_token is not None else None,
+                 Web3.from_wei(sold[idx], 'ether') if sold.get(idx) is not None else None)
+                for idx,(amount,amount_token) in enumerate(zip(amounts, amounts_token))]
+
+    def inspect_ladder(self, pair: Pair, amount, ladder, block_identifier='latest') -> SimulationResult:
+        # the simulation of `amount` as by inspect_pair, with the steps of the ladder attached; None when `amount`
+        # reverts, SimulationError when the simulation could not run
+        try:
+            results = self.inspect_token_by_ladder(pair.token, [amount] + list(ladder), block_identifier)
+        except DecodingError as e:
+            logging.error(f"SIMULATOR inspect ladder of {pair.token} reverted {e}")
+            return None
+        except SimulationError:
+            raise
+        except Exception as e:
+            raise SimulationError(f"inspect ladder of {pair.token} failed with error {e}") from e
+
+        _, amount_token, amount_out = results[0]
+        if amount_out is None:
+            logging.error(f"SIMULATOR inspect {pair.token} reverted")
+            return None
+
+        return SimulationResult(
+            pair=pair,
+            amount_in=amount,
+            amount_out=amount_out,
+            slippage=(Decimal(amount) - Decimal(amount_out))/Decimal(amount)*Decimal(10000),
+            amount_token=amount_token,
+            ladder=[LadderStep(amount_in=amount_in, amount_token=amount_token, amount_out=amount_out) for amount_in,amount_token,amount_out in results[1:]] if len(ladder)>0 else None,
+        )
+
+    def fork_call(self, evm, calldata, value=None):
+        # the returned data as hex, None when reverted; the state changes stay in the fork
+        try:
+            return Web3.to_hex(evm.message_call(self.signer, self.bot.address, calldata=calldata, value=value))
+        except RuntimeError as e:
+            if str(e).startswith(('Revert', 'Halt')):
+                return None
+            raise SimulationError(f"fork call failed with error {e}") from e
+
+    @timer_decorator
+    def inspect_delayed_sells(self, token, amount, sell_delays, block_identifier='latest'):
+        # buys on a local fork of the block, then sells from the bought state at each delay with the block time and
+        # number advanced, so that restrictions keyed on the holder (first buy time, cooldown) see the buy. The sell
+        # in the block of the buy comes first as the reference. [(delay, amount_out)], amount_out None when reverted
+        try:
+            header = self.w3.eth.get_block(block_identifier)
+            number, timestamp = header['number'], header['timestamp']
+            evm = EVM(
+                fork_url=self.http_url,
+                fork_block='pending' if block_identifier == 'pending' else str(number),
+                env=Env(block=BlockEnv(number=number, timestamp=timestamp)),
+            )
+
+            amount_wei = Web3.to_wei(amount, 'ether')
+            evm.set_balance(self.signer, amount_wei + 10**18)
+            amount_token = self.decode_amounts(self.fork_call(evm, encode_call('buy(address,uint256)', address_word(token), uint_word(timestamp + 1000)), amount_wei), amount_wei)
+            if amount_token is None:
+                # the immediate simulation of the same state bought, the fork disagrees
+                raise SimulationError(f"buy of {token} reverted on the fork of #{number}")
+
+            delayed = []
+            for delay in [0] + sorted(sell_delays):
+                checkpoint = evm.snapshot()
+                evm.set_block_env(BlockEnv(number=number + delay // BLOCK_TIME_SECONDS, timestamp=timestamp + delay))
+                result = self.fork_call(evm, encode_call('sell(address,address,uint256)', address_word(token), address_word(self.signer), uint_word(timestamp + delay + 1000)))
+                amount_out = self.decode_amounts(result, amount_token)
+                delayed.append((delay, Web3.from_wei(amount_out, 'ether') if amount_out is not None else None))
+                evm.revert(checkpoint)
+            logging.debug("SIMULATOR delayed sells of %s %s", token, delayed)
+            return delayed
+        except SimulationError:
+            raise
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except BaseException as e:
+            # the fork database panics instead of raising when the node cannot be reached
+            raise SimulationError(f"delayed sells of {token} failed with error {e}") from e
+
+    def inspect_pair(self, pair: Pair, amount, swap=True, block_identifier='latest') -> None:
         if swap is False:
             result = self.inspect_token_by_transfer(pair.token, amount)
         else:
-            result = self.inspect_token_by_swap(pair.token, amount)
+            result = self.inspect_token_by_swap(pair.token, amount, block_identifier)
 
         if result is not None:  
             return SimulationResult(
@@ -212,3 +388,16 @@ if __name__ == '__main__':
     ), 0.001, swap=True)
 
     logging.info(f"Simulation result {result}")
+
+    result=simulator.inspect_ladder(Pair(
+        address='0xd7ed0bce6b99acc642e905f0572a18069b7f262d',
+        token='0xad78cf32fa8b521a7ffac5e0d8705c4b9ee0f38a',
+        token_index=1,
+        reserve_token=0,
+        reserve_eth=0
+    ), 0.001, [0.01, 0.02, 0.05])
+
+    logging.info(f"Ladder simulation result {result} steps {[str(step) for step in result.ladder] if result is not None else None}")
+
+    delayed_sells=simulator.inspect_delayed_sells('0xad78cf32fa8b521a7ffac5e0d8705c4b9ee0f38a', 0.001, [30, 3600])
+    logging.info(f"Delayed sells {delayed_sells}")
@@ -1 +1,9 @@
-from library.singleton import Singleton
\ No newline at end of file
+from library.singleton import Singleton
+from library.contract_registry import *
+from library.log_ingestor import *
+from library.cassette import *
+from library.tracer import *
+from library.profiler import *
+from library.async_logging import *
+from library.swap_tracker import *
+from library.creator_activity import *
\ No newline at end of file
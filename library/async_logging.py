@@ -0,0 +1,118 @@
+import os
+import sys
+import json
+import atexit
+import queue
+import logging
+import logging.handlers
+from datetime import datetime
+
+SUBSYSTEM_MAX_LENGTH = 16
+
+def record_subsystem(record):
+    # bot modules log on the root logger with an uppercase prefix (WATCHER, INSPECTOR, ...), other libraries by name
+    if record.name != 'root':
+        return record.name.split('.')[0]
+    if isinstance(record.msg, str):
+        prefix = record.msg.split(' ', 1)[0]
+        if prefix.isupper() and len(prefix) <= SUBSYSTEM_MAX_LENGTH:
+            return prefix
+    return 'root'
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    # enqueues the record as is, the message is formatted by the writer thread instead of the caller
+    def prepare(self, record):
+        return record
+
+class SamplingFilter(logging.Filter):
+    # keeps one record in 1/rate per subsystem below WARNING, counter based so that it is deterministic
+    def __init__(self, rates) -> None:
+        super().__init__()
+        self.periods = {subsystem: max(1, round(1/rate)) if rate > 0 else 0 for subsystem,rate in rates.items()}
+        self.counters = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or len(self.periods)==0:
+            return True
+
+        subsystem = record_subsystem(record)
+        period = self.periods.get(subsystem)
+        if period is None:
+            return True
+        if period == 0:
+            return False
+
+        counter = self.counters.get(subsystem, 0)
+        self.counters[subsystem] = counter + 1
+        return counter % period == 0
+
+class JsonLineFormatter(logging.Formatter):
+    def format(self, record):
+        line = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='microseconds'),
+            'level': record.levelname,
+            'process': record.processName,
+            'thread': record.threadName,
+            'subsystem': record_subsystem(record),
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            line['exc'] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
+
+def parse_sampling(spec):
+    # WATCHER=0.1,INSPECTOR=0.5
+    rates = {}
+    for item in [item for item in (spec or '').split(',') if '=' in item]:
+        subsystem, rate = item.split('=', 1)
+        rates[subsystem.strip()] = float(rate)
+    return rates
+
+def setup_async_logging(level, process_name, log_dir=None, sampling=None, max_bytes=100*2**20, backup_count=5):
+    # root handlers are replaced with a queue, a listener thread writes to stderr and, with a directory, to rotated
+    # json lines of this process. Called again in a forked child since the listener thread does not survive fork.
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    handlers = [logging.StreamHandler(sys.stderr)]
+    handlers[0].setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    if log_dir is not None:
+        os.makedirs(log_dir, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(f"{log_dir}/{process_name}.jsonl", maxBytes=max_bytes, backupCount=backup_count)
+        file_handler.setFormatter(JsonLineFormatter())
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(parse_sampling(sampling)))
+
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # drain what is still queued on a normal exit
+    atexit.register(listener.stop)
+    return listener
+
+if __name__ == "__main__":
+    import time
+
+    listener = setup_async_logging(logging.DEBUG, 'demo', '/tmp/logs', 'WATCHER=0.1')
+
+    class Slow:
+        def __str__(self) -> str:
+            time.sleep(0.001)
+            return 'Slow'
+
+    start_time = time.perf_counter()
+    for idx in range(1000):
+        logging.info("WATCHER block #%s %s", idx, Slow())
+    logging.warning("INSPECTOR never sampled %s", Slow())
+    print(f"caller side {(time.perf_counter() - start_time)*1000:.1f}ms for 1001 records")
+
+    listener.stop()
+    with open('/tmp/logs/demo.jsonl') as f:
+        lines = f.readlines()
+    print(f"{len(lines)} lines written, last {lines[-1].strip()}")
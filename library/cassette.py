@@ -0,0 +1,315 @@
+import os
+import gzip
+import json
+import time
+import asyncio
+import logging
+import hashlib
+import argparse
+from collections import deque
+
+import aiohttp
+from aiohttp import web
+
+RPC_CHANNEL = 'rpc'
+SCAN_CHANNEL = 'scan'
+SUBSCRIPTION_CHANNEL = 'sub'
+NOT_RECORDED_ERROR = {'code': -32000, 'message': 'not recorded'}
+SCAN_IGNORED_PARAMS = ['apikey']
+SUBSCRIBE_WAIT_SECONDS = 1 # for the subscription of the next notification, e.g. a filter replaced after a head
+
+def read_message(message):
+    # web3 sends its requests as binary frames
+    if message.type == aiohttp.WSMsgType.TEXT:
+        return message.data
+    if message.type == aiohttp.WSMsgType.BINARY:
+        return message.data.decode()
+    return None
+
+def rpc_key(request):
+    return f"{request['method']}:{json.dumps(request.get('params', []), sort_keys=True, separators=(',', ':'))}"
+
+def fallback_key(method, params):
+    # calls to another contract must not get each other's data
+    if method == 'eth_call' and len(params)>0 and isinstance(params[0], dict):
+        return f"{method}:{str(params[0].get('to')).lower()}"
+    return method
+
+def scan_key(path, query):
+    return f"{path}?{'&'.join(f'{name}={value}' for name,value in sorted(query.items()) if name not in SCAN_IGNORED_PARAMS)}"
+
+class Cassette:
+    # append-only gzip'ed json lines, one request/response pair or pushed notification per line:
+    # c=channel, k=request key, m=method, r=response, t=latency in seconds, at=seconds since recording started
+    def __init__(self, path) -> None:
+        self.path = path
+        self.file = None
+        self.started_at = time.time()
+        self.written = 0
+
+    def append(self, channel, key, response, latency=0, method=None):
+        if self.file is None:
+            self.file = gzip.open(self.path, 'at')
+        self.file.write(json.dumps({'c': channel, 'k': key, 'm': method, 'r': response, 't': round(latency, 6), 'at': round(time.time() - self.started_at, 6)}, separators=(',', ':')) + '\n')
+        self.written += 1
+
+        # a sync flush per record so that a killed recording stays readable
+        self.file.flush()
+
+    def load(self):
+        records = []
+        try:
+            with gzip.open(self.path, 'rt') as f:
+                for line in f:
+                    records.append(json.loads(line))
+        except (EOFError, json.JSONDecodeError):
+            # truncated tail of an interrupted recording
+            pass
+        return records
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+class ReplayIndex:
+    # responses in recorded order per request key; the last response of a key is served again once exhausted, and
+    # unknown keys of a recorded method get that method's responses in order (e.g. calls carrying a fresh deadline),
+    # eth_call only those to the same contract. Notifications of all the subscriptions form a single timeline.
+    def __init__(self, records) -> None:
+        self.responses = {}
+        self.methods = {}
+        self.timeline = []
+
+        for record in records:
+            if record['c'] == SUBSCRIPTION_CHANNEL:
+                self.timeline.append((record['at'], record['k'], record['r']))
+            else:
+                self.responses.setdefault(record['k'], deque()).append((record['r'], record['t']))
+                if record['m'] is not None:
+                    params = json.loads(record['k'][len(record['m'])+1:])
+                    self.methods.setdefault(fallback_key(record['m'], params), deque()).append((record['r'], record['t']))
+        self.timeline.sort(key=lambda notification: notification[0])
+
+    def next(self, queues, key):
+        queue = queues.get(key)
+        if queue is None:
+            return None
+        return queue.popleft() if len(queue)>1 else queue[0]
+
+    def lookup(self, key, method=None):
+        found = self.next(self.responses, key)
+        if found is None and method is not None:
+            found = self.next(self.methods, method)
+        return found
+
+class CassetteServer:
+    # local stand-in for the JSON-RPC http/websocket endpoints and the Basescan api. In record mode every request is
+    # forwarded upstream and the pair is appended to the cassette, in replay mode the cassette answers, optionally
+    # after the recorded latency scaled by `latency_scale`.
+    def __init__(self, cassette: Cassette, mode, upstream_http=None, upstream_wss=None, upstream_scan=None, latency_scale=0) -> None:
+        self.cassette = cassette
+        self.mode = mode
+        self.upstream_http = upstream_http
+        self.upstream_wss = upstream_wss
+        self.upstream_scan = upstream_scan
+        self.latency_scale = latency_scale
+
+        self.session = None
+        self.index = ReplayIndex(cassette.load()) if mode == 'replay' else None
+        self.notified = set()
+        self.subscription_counter = 0
+
+    async def delay(self, latency):
+        if self.latency_scale > 0 and latency > 0:
+            await asyncio.sleep(latency*self.latency_scale)
+
+    async def forward_rpc(self, request):
+        start_time = time.perf_counter()
+        async with self.session.post(self.upstream_http, json=request) as response:
+            result = await response.json(content_type=None)
+        self.cassette.append(RPC_CHANNEL, rpc_key(request), result, time.perf_counter() - start_time, request['method'])
+        return result
+
+    async def replay_rpc(self, request):
+        found = self.index.lookup(rpc_key(request), fallback_key(request['method'], request.get('params', [])))
+        if found is None:
+            logging.error(f"CASSETTE {request['method']} not recorded")
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': NOT_RECORDED_ERROR}
+
+        response, latency = found
+        await self.delay(latency)
+        return {**response, 'id': request.get('id')}
+
+    async def handle_rpc_request(self, request):
+        if self.mode == 'record':
+            return await self.forward_rpc(request)
+        return await self.replay_rpc(request)
+
+    async def handle_http(self, request: web.Request):
+        payload = await request.json()
+        if isinstance(payload, list):
+            return web.json_response(await asyncio.gather(*[self.handle_rpc_request(item) for item in payload]))
+        return web.json_response(await self.handle_rpc_request(payload))
+
+    async def handle_scan(self, request: web.Request):
+        key = scan_key(request.path, request.query)
+
+        if self.mode == 'record':
+            start_time = time.perf_counter()
+            async with self.session.get(self.upstream_scan, params=request.query) as response:
+                body = await response.text()
+                status = response.status
+            self.cassette.append(SCAN_CHANNEL, key, {'status': status, 'body': body}, time.perf_counter() - start_time)
+            return web.Response(text=body, status=status, content_type='application/json')
+
+        found = self.index.lookup(key)
+        if found is None:
+            logging.error(f"CASSETTE {key} not recorded")
+            return web.json_response({'status': '0', 'message': 'NOTOK', 'result': 'not recorded'})
+
+        response, latency = found
+        await self.delay(latency)
+        return web.Response(text=response['body'], status=response['status'], content_type='application/json')
+
+    async def record_ws(self, client: web.WebSocketResponse):
+        subscriptions = {} # upstream subscription id -> key of the eth_subscribe params
+        pending = {} # request id -> (request, start time)
+
+        async with self.session.ws_connect(self.upstream_wss, max_msg_size=0) as upstream:
+            async def client_to_upstream():
+                async for message in client:
+                    data = read_message(message)
+                    if data is None:
+                        break
+                    request = json.loads(data)
+                    pending[request.get('id')] = (request, time.perf_counter())
+                    await upstream.send_str(data)
+                await upstream.close()
+
+            async def upstream_to_client():
+                async for message in upstream:
+                    data = read_message(message)
+                    if data is None:
+                        break
+                    response = json.loads(data)
+
+                    if response.get('method') == 'eth_subscription':
+                        key = subscriptions.get(response['params']['subscription'])
+                        result = response['params']['result']
+                        # the same head or log pushed on several connections is recorded once
+                        digest = hashlib.sha1(f"{key}{json.dumps(result, sort_keys=True)}".encode()).hexdigest()
+                        if key is not None and digest not in self.notified:
+                            self.notified.add(digest)
+                            self.cassette.append(SUBSCRIPTION_CHANNEL, key, result)
+                    elif response.get('id') in pending:
+                        request, start_time = pending.pop(response.get('id'))
+                        self.cassette.append(RPC_CHANNEL, rpc_key(request), response, time.perf_counter() - start_time, request['method'])
+                        if request['method'] == 'eth_subscribe' and 'result' in response:
+                            subscriptions[response['result']] = rpc_key(request)
+
+                    await client.send_str(data)
+
+            await asyncio.gather(client_to_upstream(), upstream_to_client())
+
+    async def stream_notifications(self, client: web.WebSocketResponse, subscribed, changed: asyncio.Condition):
+        # the recorded timeline in order, so heads and logs interleave as they were pushed whatever the pacing. A
+        # notification whose subscription is not there yet is waited for briefly, then skipped
+        previous_at = None
+        for at, key, result in self.index.timeline:
+            if previous_at is not None:
+                await self.delay(at - previous_at)
+            previous_at = at
+
+            if key not in subscribed:
+                async with changed:
+                    try:
+                        await asyncio.wait_for(changed.wait_for(lambda: key in subscribed), SUBSCRIBE_WAIT_SECONDS)
+                    except asyncio.TimeoutError:
+                        continue
+
+            if client.closed:
+                return
+            await client.send_str(json.dumps({'jsonrpc': '2.0', 'method': 'eth_subscription', 'params': {'subscription': subscribed[key], 'result': result}}))
+
+    async def replay_ws(self, client: web.WebSocketResponse):
+        subscribed = {} # key of the eth_subscribe params -> subscription id
+        changed = asyncio.Condition()
+        stream = None
+        async for message in client:
+            data = read_message(message)
+            if data is None:
+                break
+            request = json.loads(data)
+
+            if request['method'] == 'eth_subscribe':
+                self.subscription_counter += 1
+                subscription_id = hex(self.subscription_counter)
+                await client.send_str(json.dumps({'jsonrpc': '2.0', 'id': request.get('id'), 'result': subscription_id}))
+                async with changed:
+                    subscribed[rpc_key(request)] = subscription_id
+                    changed.notify_all()
+                if stream is None:
+                    stream = asyncio.create_task(self.stream_notifications(client, subscribed, changed))
+            elif request['method'] == 'eth_unsubscribe':
+                async with changed:
+                    for key in [key for key,subscription_id in subscribed.items() if subscription_id in request.get('params', [])]:
+                        subscribed.pop(key)
+                await client.send_str(json.dumps({'jsonrpc': '2.0', 'id': request.get('id'), 'result': True}))
+            else:
+                await client.send_str(json.dumps(await self.replay_rpc(request)))
+
+        if stream is not None:
+            stream.cancel()
+
+    async def handle_root(self, request: web.Request):
+        if request.headers.get('Upgrade', '').lower() != 'websocket':
+            return await self.handle_http(request)
+
+        client = web.WebSocketResponse(max_msg_size=0)
+        await client.prepare(request)
+        if self.mode == 'record':
+            await self.record_ws(client)
+        else:
+            await self.replay_ws(client)
+        return client
+
+    async def on_startup(self, app):
+        self.session = aiohttp.ClientSession()
+
+    async def on_cleanup(self, app):
+        await self.session.close()
+        self.cassette.close()
+        logging.warning(f"CASSETTE closed with {self.cassette.written} new records")
+
+    def build_app(self):
+        app = web.Application(client_max_size=0)
+        app.router.add_route('*', '/', self.handle_root)
+        app.router.add_get('/api', self.handle_scan)
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+    def run(self, host, port):
+        logging.warning(f"CASSETTE {self.mode} {self.cassette.path} on {host}:{port}, point HTTPS_URL to http://{host}:{port}, WSS_URL to ws://{host}:{port} and BASESCAN_API_URL to http://{host}:{port}/api")
+        web.run_app(self.build_app(), host=host, port=port, print=None)
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="record or replay the RPC and Basescan traffic of the bot")
+    parser.add_argument('mode', choices=['record', 'replay'])
+    parser.add_argument('--cassette', required=True)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8545)
+    parser.add_argument('--latency-scale', type=float, default=0, help="replay with the recorded latencies times this factor, 0 answers at once")
+    args = parser.parse_args()
+
+    CassetteServer(Cassette(args.cassette),
+                   args.mode,
+                   upstream_http=os.environ.get('HTTPS_URL'),
+                   upstream_wss=os.environ.get('WSS_URL', '').split(',')[0],
+                   upstream_scan=os.environ.get('BASESCAN_API_URL', 'https://api.basescan.org/api'),
+                   latency_scale=args.latency_scale,
+                   ).run(args.host, args.port)
@@ -0,0 +1,141 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from web3 import Web3
+
+from library.singleton import Singleton
+
+CONTRACT_CACHE_SIZE = 1024
+
+SYNC_TOPIC = Web3.keccak(text="Sync(uint112,uint112)")
+SWAP_TOPIC = Web3.keccak(text="Swap(address,uint256,uint256,uint256,uint256,address)")
+PAIR_CREATED_TOPIC = Web3.keccak(text="PairCreated(address,address,address,uint256)")
+TRANSFER_TOPIC = Web3.keccak(text="Transfer(address,address,uint256)")
+MINT_TOPIC = Web3.keccak(text="Mint(address,uint256,uint256)")
+BURN_TOPIC = Web3.keccak(text="Burn(address,uint256,uint256,address)")
+
+class ContractRegistry(metaclass=Singleton):
+    # contract factories are built once per (provider, ABI) and address-bound contracts are kept
+    # in a LRU so hot addresses are never rebuilt
+    def __init__(self, capacity=CONTRACT_CACHE_SIZE) -> None:
+        self.capacity = capacity
+        self.providers = {}
+        self.factories = {}
+        self.contracts = OrderedDict()
+        self.lock = threading.Lock()
+
+    def web3(self, http_url) -> Web3:
+        # one provider per endpoint, so that factories and contracts are shared by short-lived components
+        w3 = self.providers.get(http_url)
+        if w3 is None:
+            with self.lock:
+                w3 = self.providers.setdefault(http_url, Web3(Web3.HTTPProvider(http_url)))
+        return w3
+
+    def factory(self, w3, abi):
+        key = (id(w3), id(abi))
+        factory = self.factories.get(key)
+        if factory is None:
+            with self.lock:
+                factory = self.factories.setdefault(key, w3.eth.contract(abi=abi))
+        return factory
+
+    def contract(self, w3, address, abi):
+        address = to_checksum_address(address)
+        key = (id(w3), id(abi), address)
+
+        with self.lock:
+            contract = self.contracts.get(key)
+            if contract is not None:
+                self.contracts.move_to_end(key)
+                return contract
+
+        contract = self.factory(w3, abi)(address=address)
+
+        with self.lock:
+            self.contracts[key] = contract
+            if len(self.contracts) > self.capacity:
+                self.contracts.popitem(last=False)
+
+        return contract
+
+@lru_cache(maxsize=8192)
+def to_checksum_address(address):
+    return Web3.to_checksum_address(address)
+
+def to_bytes(value) -> bytes:
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    return bytes.fromhex(value[2:] if value.startswith('0x') else value)
+
+def decode_topic_address(topic):
+    return to_checksum_address('0x' + to_bytes(topic)[12:].hex())
+
+def decode_words(data):
+    data = to_bytes(data)
+    return [int.from_bytes(data[idx:idx+32], 'big') for idx in range(0, len(data), 32)]
+
+def build_decoded_log(log, args):
+    # same shape as web3 decoded event logs, so call sites can keep using log['args']
+    return {
+        'args': args,
+        'address': to_checksum_address(log['address']),
+        'blockNumber': Web3.to_int(hexstr=log['blockNumber']) if isinstance(log['blockNumber'], str) else log['blockNumber'],
+        'transactionHash': log['transactionHash'],
+        'logIndex': Web3.to_int(hexstr=log['logIndex']) if isinstance(log['logIndex'], str) else log['logIndex'],
+    }
+
+def log_topic(log) -> bytes:
+    return to_bytes(log['topics'][0]) if len(log['topics'])>0 else b''
+
+def decode_sync_log(log):
+    reserve0, reserve1 = decode_words(log['data'])[:2]
+    return build_decoded_log(log, {
+        'reserve0': reserve0,
+        'reserve1': reserve1,
+    })
+
+def decode_swap_log(log):
+    amount0_in, amount1_in, amount0_out, amount1_out = decode_words(log['data'])[:4]
+    return build_decoded_log(log, {
+        'sender': decode_topic_address(log['topics'][1]),
+        'amount0In': amount0_in,
+        'amount1In': amount1_in,
+        'amount0Out': amount0_out,
+        'amount1Out': amount1_out,
+        'to': decode_topic_address(log['topics'][2]),
+    })
+
+def decode_pair_created_log(log):
+    words = decode_words(log['data'])
+    return build_decoded_log(log, {
+        'token0': decode_topic_address(log['topics'][1]),
+        'token1': decode_topic_address(log['topics'][2]),
+        'pair': to_checksum_address('0x' + words[0].to_bytes(32, 'big')[12:].hex()),
+        '': words[1],
+    })
+
+def decode_transfer_log(log):
+    return build_decoded_log(log, {
+        'from': decode_topic_address(log['topics'][1]),
+        'to': decode_topic_address(log['topics'][2]),
+        'value': decode_words(log['data'])[0],
+    })
+
+def decode_mint_log(log):
+    amount0, amount1 = decode_words(log['data'])[:2]
+    return build_decoded_log(log, {
+        'sender': decode_topic_address(log['topics'][1]),
+        'amount0': amount0,
+        'amount1': amount1,
+    })
+
+def decode_burn_log(log):
+    amount0, amount1 = decode_words(log['data'])[:2]
+    return build_decoded_log(log, {
+        'sender': decode_topic_address(log['topics'][1]),
+        'amount0': amount0,
+        'amount1': amount1,
+        'to': decode_topic_address(log['topics'][2]),
+    })
@@ -0,0 +1,105 @@
+import os
+import bisect
+import logging
+import threading
+
+import sys # for testing
+sys.path.append('..')
+
+from library.singleton import Singleton
+
+CREATOR_TRACKING_SECONDS=int(os.environ.get('CREATOR_TRACKING_SECONDS', os.environ.get('SWAP_TRACKING_SECONDS', '1800')))
+INDEX_WAIT_SECONDS=1 # the body of the block being inspected is fetched while it is inspected
+
+class CreatorActivity:
+    # blocks of the transactions sent by the creator to its token, complete from `from_block` to `indexed_to`
+    def __init__(self, token, creator, from_block, created_at) -> None:
+        self.token = token.lower()
+        self.creator = creator.lower()
+        self.from_block = from_block
+        self.created_at = created_at
+        self.indexed_to = from_block - 1
+        self.call_blocks = []
+
+    def count_calls(self, from_block, to_block):
+        return bisect.bisect_right(self.call_blocks, to_block) - bisect.bisect_left(self.call_blocks, from_block)
+
+    def __str__(self) -> str:
+        return f"CreatorActivity token {self.token} creator {self.creator} fromBlock {self.from_block} indexedTo {self.indexed_to} calls {len(self.call_blocks)}"
+
+class CreatorActivityIndex(metaclass=Singleton):
+    # creator to token transactions of recently created pairs, indexed by the block watcher from the full block
+    # bodies and read by the inspector instead of the Basescan txlist. Each token is indexed in order from its
+    # creation block, the watcher resumes from `next_block()` so a block it could not fetch is retried, a range
+    # not indexed in time falls back to Basescan.
+    def __init__(self, tracking_seconds=CREATOR_TRACKING_SECONDS) -> None:
+        self.tracking_seconds = tracking_seconds
+        self.tokens = {}
+        self.lock = threading.Lock()
+        self.indexed = threading.Condition(self.lock)
+
+    def watch(self, token, creator, from_block, created_at):
+        if creator is None:
+            return
+        with self.lock:
+            self.tokens.setdefault(token.lower(), CreatorActivity(token, creator, from_block, created_at))
+
+    def is_empty(self):
+        return len(self.tokens)==0
+
+    def next_block(self):
+        # first block some token is missing, None when nothing is tracked
+        with self.lock:
+            return min([activity.indexed_to + 1 for activity in self.tokens.values()], default=None)
+
+    def expire(self, timestamp):
+        with self.lock:
+            expired = [token for token,activity in self.tokens.items() if timestamp - activity.created_at > self.tracking_seconds]
+            for token in expired:
+                self.tokens.pop(token)
+        if len(expired)>0:
+            logging.info(f"TRACKER stop tracking creator activity of {len(expired)} tokens, {len(self.tokens)} left")
+
+    def index_block(self, block_number, transactions):
+        # raw transactions of the block, addresses as lowercase hex
+        with self.lock:
+            for tx in transactions:
+                activity = self.tokens.get(tx.get('to') or '')
+                if activity is not None and activity.indexed_to == block_number - 1 and tx['from'] == activity.creator:
+                    activity.call_blocks.append(block_number)
+
+            for activity in self.tokens.values():
+                if activity.indexed_to == block_number - 1:
+                    activity.indexed_to = block_number
+            self.indexed.notify_all()
+
+    def count_calls(self, token, from_block, to_block, timeout=INDEX_WAIT_SECONDS):
+        # None when the range is not covered in time, the caller falls back to the block explorer
+        with self.lock:
+            activity = self.tokens.get(token.lower())
+            if activity is None or from_block < activity.from_block:
+                return None
+            if not self.indexed.wait_for(lambda: activity.indexed_to >= to_block, timeout):
+                return None
+            return activity.count_calls(from_block, to_block)
+
+if __name__ == "__main__":
+    index = CreatorActivityIndex()
+    index.watch('0xToken', '0xCreator', 100, 0)
+
+    for block_number in range(100, 110):
+        index.index_block(block_number, [
+            {'from': '0xcreator', 'to': '0xtoken'} if block_number % 3 == 0 else {'from': '0xsniper', 'to': '0xtoken'},
+            {'from': '0xcreator', 'to': None}, # contract creation
+        ])
+
+    print(f"calls #100-#109 {index.count_calls('0xToken', 100, 109)} #105-#109 {index.count_calls('0xToken', 105, 109)} not indexed yet {index.count_calls('0xToken', 100, 110, 0.1)}")
+
+    threading.Timer(0.2, lambda: index.index_block(110, [{'from': '0xcreator', 'to': '0xtoken'}])).start()
+    print(f"waited for #110 {index.count_calls('0xToken', 100, 110)}")
+
+    index.index_block(112, []) # block 111 not fetched yet
+    print(f"after a gap {index.count_calls('0xToken', 100, 112, 0.1)}, still {index.count_calls('0xToken', 100, 110)} up to #110, resume from #{index.next_block()}")
+    for block_number in range(index.next_block(), 114):
+        index.index_block(block_number, [{'from': '0xcreator', 'to': '0xtoken'}])
+    print(f"caught up {index.count_calls('0xToken', 100, 113)}")
@@ -0,0 +1,81 @@
+import logging
+import time
+from collections import deque
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_RANGE_RETRIES = 5
+RETRY_SLEEP_SECONDS = 1
+
+class LogIngestor:
+    # walks a block range with eth_getLogs-sized chunks on a bounded worker pool. A failed chunk (result
+    # limit, range limit, timeout) is split in halves and the chunk size shrinks; sparse chunks grow it.
+    # Results are handed to consume() in block order so that the caller can checkpoint a contiguous prefix.
+    def __init__(self, max_workers=8, chunk_size=2000, min_chunk_size=1, max_chunk_size=100000, target_size=5000) -> None:
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.target_size = target_size
+
+        self.fetched = 0
+        self.failed = 0
+
+    def adapt(self, span, size):
+        if size < self.target_size//2:
+            self.chunk_size = min(self.max_chunk_size, max(self.chunk_size, span*2))
+        elif size > self.target_size:
+            self.chunk_size = max(self.min_chunk_size, span//2)
+
+    def run(self, from_block, to_block, fetch, consume):
+        cursor = from_block
+        consumed = from_block - 1
+        retries = deque()
+        completed = {}
+        future_to_range = {}
+        start_time = time.time()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while cursor <= to_block or len(retries)>0 or len(future_to_range)>0:
+                # keep the pool busy but bound the number of ranges held in memory
+                while len(future_to_range) < self.max_workers*2 and (len(retries)>0 or cursor <= to_block):
+                    if len(retries)>0:
+                        start, end, attempt = retries.popleft()
+                    else:
+                        start, end, attempt = cursor, min(cursor + self.chunk_size - 1, to_block), 0
+                        cursor = end + 1
+                    future_to_range[executor.submit(fetch, start, end)] = (start, end, attempt)
+
+                done, _ = concurrent.futures.wait(future_to_range, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    start, end, attempt = future_to_range.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self.failed += 1
+                        logging.warning(f"INGESTOR range #{start}-#{end} failed with error {e}")
+                        if end > start:
+                            middle = (start + end)//2
+                            self.chunk_size = max(self.min_chunk_size, middle - start + 1)
+                            retries.extendleft([(middle + 1, end, 0), (start, middle, 0)])
+                        elif attempt < MAX_RANGE_RETRIES:
+                            time.sleep(RETRY_SLEEP_SECONDS)
+                            retries.appendleft((start, end, attempt + 1))
+                        else:
+                            raise Exception(f"range #{start}-#{end} failed after {MAX_RANGE_RETRIES} retries")
+                        continue
+
+                    self.fetched += len(result)
+                    self.adapt(end - start + 1, len(result))
+                    completed[start] = (end, result)
+
+                # hand over the contiguous prefix only
+                while consumed + 1 in completed:
+                    end, result = completed.pop(consumed + 1)
+                    consume(consumed + 1, end, result)
+                    consumed = end
+
+                    elapsed = time.time() - start_time
+                    logging.info(f"INGESTOR block #{consumed}/{to_block} fetched {self.fetched} ({self.fetched/elapsed if elapsed>0 else 0:.0f}/s) chunk size {self.chunk_size} failed {self.failed}")
+
+        return self.fetched
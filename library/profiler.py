@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import logging
+import threading
+from datetime import datetime
+
+sys.path.append('..') # for testing
+
+from library.singleton import Singleton
+from data import ControlOrder, ControlOrderType
+
+DEFAULT_SAMPLE_INTERVAL_SECONDS = 0.01
+MAX_STACK_DEPTH = 128
+
+class SamplingProfiler(metaclass=Singleton):
+    # samples the stacks of every thread of the process from a daemon thread, started and stopped at runtime.
+    # Stacks are folded as `thread;module:function;... count`, the input of flamegraph.pl, speedscope or inferno
+    def __init__(self, process_name) -> None:
+        self.process_name = process_name
+        self.stacks = {}
+        self.samples = 0
+        self.thread = None
+        self.stopping = threading.Event()
+        self.started_at = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, interval=DEFAULT_SAMPLE_INTERVAL_SECONDS):
+        if self.is_running():
+            logging.warning(f"PROFILER {self.process_name} already running")
+            return
+
+        self.stacks = {}
+        self.samples = 0
+        self.started_at = time.time()
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.sample_loop, args=(interval,), name='sampling-profiler', daemon=True)
+        self.thread.start()
+        logging.warning(f"PROFILER {self.process_name} started sampling every {interval*1000:.1f}ms")
+
+    def sample_loop(self, interval):
+        own_ident = threading.get_ident()
+        while not self.stopping.wait(interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                    frame = frame.f_back
+
+                key = ';'.join([names.get(ident, str(ident))] + stack[::-1])
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def stop(self, output_dir='profiles'):
+        if not self.is_running():
+            logging.warning(f"PROFILER {self.process_name} is not running")
+            return None
+
+        self.stopping.set()
+        self.thread.join()
+        self.thread = None
+
+        os.makedirs(output_dir, exist_ok=True)
+        path = f"{output_dir}/profile_{self.process_name}_{os.getpid()}_{datetime.fromtimestamp(self.started_at).strftime('%Y%m%d_%H%M%S')}.folded"
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+        logging.warning(f"PROFILER {self.process_name} stopped after {self.samples} samples over {time.time() - self.started_at:.1f}s, dumped to {path}")
+        return path
+
+    def handle_control_order(self, order: ControlOrder):
+        if order.type==ControlOrderType.PROFILER_START:
+            self.start(order.data if order.data is not None else DEFAULT_SAMPLE_INTERVAL_SECONDS)
+        elif order.type==ControlOrderType.PROFILER_STOP:
+            self.stop(order.data if order.data is not None else 'profiles')
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    def busy():
+        return sum([i*i for i in range(10**5)])
+
+    def worker():
+        for _ in range(50):
+            busy()
+            time.sleep(0.005)
+
+    profiler = SamplingProfiler('demo')
+    profiler.start(0.002)
+    threads = [threading.Thread(target=worker, name=f"worker-{idx}") for idx in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    path = profiler.stop('/tmp')
+
+    with open(path) as f:
+        for line in sorted(f.readlines(), key=lambda line: -int(line.split()[-1]))[:5]:
+            print(line.strip())
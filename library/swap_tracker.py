@@ -0,0 +1,168 @@
+import os
+import bisect
+import logging
+import threading
+
+from web3 import Web3
+
+import sys # for testing
+sys.path.append('..')
+
+from library.singleton import Singleton
+
+MM_TX_AMOUNT_THRESHOLD=Web3.to_wei(0.001, 'ether') # market-making buys, in wei
+SWAP_TRACKING_SECONDS=int(os.environ.get('SWAP_TRACKING_SECONDS', '1800'))
+
+class PairSwapStats:
+    # swaps of a pair since `from_block`, in any order: a range seeded late lands after the logs of later blocks
+    def __init__(self, address, token_index, from_block, created_at) -> None:
+        self.address = address
+        self.token_index = token_index
+        self.from_block = from_block
+        self.created_at = created_at
+        self.last_position = (from_block, -1)
+        self.positions = set()
+        # covered up to `seeded_to` by eth_getLogs and from `live_from` by a confirmed subscription, the blocks in
+        # between are a gap until seeded again
+        self.seeded_to = from_block - 1
+        self.live_from = None
+
+        self.mm_blocks = []
+        self.swaps = 0
+        self.buys = 0
+        self.sells = 0
+        self.traders = set()
+        self.buy_volume = 0 # wei
+        self.sell_volume = 0 # wei
+
+    def apply(self, log) -> bool:
+        position = (log['blockNumber'], log['logIndex'])
+        if position in self.positions or position[0] < self.from_block:
+            return False
+        self.positions.add(position)
+        self.last_position = max(self.last_position, position)
+
+        # token_index 1 means WETH is token0
+        args = log['args']
+        eth_in = args['amount0In'] if self.token_index==1 else args['amount1In']
+        eth_out = args['amount0Out'] if self.token_index==1 else args['amount1Out']
+
+        self.swaps += 1
+        self.traders.add(args['to'].lower())
+        if eth_in > 0:
+            self.buys += 1
+            self.buy_volume += eth_in
+            if eth_in > MM_TX_AMOUNT_THRESHOLD:
+                bisect.insort(self.mm_blocks, log['blockNumber'])
+        if eth_out > 0:
+            self.sells += 1
+            self.sell_volume += eth_out
+        return True
+
+    def covers(self, from_block, to_block):
+        if from_block < self.from_block:
+            return False
+        if to_block <= self.seeded_to:
+            return True
+        return self.live_from is not None and (from_block >= self.live_from or self.seeded_to >= self.live_from - 1)
+
+    def count_mm(self, from_block, to_block):
+        if from_block <= self.from_block and to_block >= self.last_position[0]:
+            return len(self.mm_blocks)
+        return bisect.bisect_right(self.mm_blocks, to_block) - bisect.bisect_left(self.mm_blocks, from_block)
+
+    def to_dict(self):
+        return {
+            'from_block': self.from_block,
+            'last_block': self.last_position[0],
+            'swaps': self.swaps,
+            'mm_swaps': len(self.mm_blocks),
+            'buys': self.buys,
+            'sells': self.sells,
+            'traders': len(self.traders),
+            'buy_volume': Web3.from_wei(self.buy_volume, 'ether'),
+            'sell_volume': Web3.from_wei(self.sell_volume, 'ether'),
+        }
+
+    def __str__(self) -> str:
+        return f"PairSwapStats {self.address} fromBlock {self.from_block} swaps {self.swaps} mm {len(self.mm_blocks)} traders {len(self.traders)} buyVolume {Web3.from_wei(self.buy_volume, 'ether')} sellVolume {Web3.from_wei(self.sell_volume, 'ether')}"
+
+class SwapTracker(metaclass=Singleton):
+    # swap statistics of recently created pairs, fed by the block watcher from its Swap logs subscription and read
+    # by the inspector instead of rescanning the logs since the pair creation
+    def __init__(self, tracking_seconds=SWAP_TRACKING_SECONDS) -> None:
+        self.tracking_seconds = tracking_seconds
+        self.pairs = {}
+        self.lock = threading.Lock()
+
+    def track(self, address, token_index, from_block, created_at):
+        with self.lock:
+            self.pairs.setdefault(address.lower(), PairSwapStats(address, token_index, from_block, created_at))
+
+    def addresses(self):
+        with self.lock:
+            return [stats.address for stats in self.pairs.values()]
+
+    def expire(self, timestamp):
+        with self.lock:
+            expired = [key for key,stats in self.pairs.items() if timestamp - stats.created_at > self.tracking_seconds]
+            for key in expired:
+                self.pairs.pop(key)
+        if len(expired)>0:
+            logging.info(f"TRACKER stop tracking swaps of {len(expired)} pairs, {len(self.pairs)} left")
+
+    def apply(self, log):
+        # decoded Swap log, the same log pushed by several providers is applied once
+        with self.lock:
+            stats = self.pairs.get(log['address'].lower())
+            if stats is not None:
+                stats.apply(log)
+
+    def stats(self, address) -> PairSwapStats:
+        return self.pairs.get(address.lower())
+
+    def mark_seeded(self, addresses, to_block):
+        with self.lock:
+            for address in addresses:
+                stats = self.pairs.get(address.lower())
+                if stats is not None:
+                    stats.seeded_to = max(stats.seeded_to, to_block)
+
+    def mark_live(self, addresses, from_block):
+        # the first subscription confirmed for the pairs, by any provider
+        with self.lock:
+            for address in addresses:
+                stats = self.pairs.get(address.lower())
+                if stats is not None and stats.live_from is None:
+                    stats.live_from = from_block
+
+    def unseeded(self, to_block):
+        # (address, first block to fetch) of the pairs not covered up to `to_block`
+        with self.lock:
+            ends = [(stats, min(to_block, stats.live_from - 1) if stats.live_from is not None else to_block) for stats in self.pairs.values()]
+            return [(stats.address, stats.seeded_to + 1) for stats,end in ends if stats.seeded_to < end]
+
+    def count_mm(self, address, from_block, to_block):
+        # None when the range is not covered, the caller falls back to the logs
+        with self.lock:
+            stats = self.pairs.get(address.lower())
+            if stats is None or not stats.covers(from_block, to_block):
+                return None
+            return stats.count_mm(from_block, to_block)
+
+if __name__ == "__main__":
+    tracker = SwapTracker()
+    tracker.track('0xPair', 0, 100, 0)
+    tracker.mark_live(['0xPair'], 100)
+
+    def swap(block_number, log_index, amount1_in, amount1_out):
+        return {'address': '0xpair', 'blockNumber': block_number, 'logIndex': log_index,
+                'args': {'amount0In': 0, 'amount1In': amount1_in, 'amount0Out': 0, 'amount1Out': amount1_out, 'to': f"0x{log_index:040x}"}}
+
+    for block_number in range(100, 110):
+        tracker.apply(swap(block_number, 0, Web3.to_wei(0.01, 'ether'), 0))
+        tracker.apply(swap(block_number, 0, Web3.to_wei(0.01, 'ether'), 0)) # pushed by a second provider
+        tracker.apply(swap(block_number, 1, 0, Web3.to_wei(0.002, 'ether')))
+
+    print(tracker.stats('0xPair'))
+    print(f"mm since creation {tracker.count_mm('0xPair', 100, 109)} in #105-#107 {tracker.count_mm('0xPair', 105, 107)} before tracking {tracker.count_mm('0xPair', 90, 109)}")
@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+
+import numpy as np
+
+import sys # for testing
+sys.path.append('..')
+
+from library.singleton import Singleton
+from data import Trace, TraceStage
+
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000]
+SUMMARY_LOG_INTERVAL = 100 # traces
+
+class LatencyHistogram:
+    # fixed log-spaced buckets in milliseconds, the last one catches everything slower
+    def __init__(self) -> None:
+        self.counts = np.zeros(len(LATENCY_BUCKETS_MS) + 1, dtype=np.int64)
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, latency_ms):
+        self.counts[np.searchsorted(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        self.total += latency_ms
+        self.max = max(self.max, latency_ms)
+
+    def count(self):
+        return int(self.counts.sum())
+
+    def percentile(self, q):
+        # upper bound of the bucket holding the q-th percentile
+        count = self.count()
+        if count == 0:
+            return None
+        idx = int(np.searchsorted(np.cumsum(self.counts), q/100*count))
+        return LATENCY_BUCKETS_MS[idx] if idx < len(LATENCY_BUCKETS_MS) else self.max
+
+    def to_dict(self):
+        count = self.count()
+        return {
+            'count': count,
+            'avg': self.total/count if count>0 else None,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+            'buckets': dict(zip([str(bucket) for bucket in LATENCY_BUCKETS_MS] + ['inf'], self.counts.tolist())),
+        }
+
+class Tracer(metaclass=Singleton):
+    # latency histograms from the first stage of a trace to each later stage, per kind of trace (block, buy, sell).
+    # With an export directory every finished trace is appended to trace_<session>.jsonl and the histograms are
+    # rewritten to trace_<session>_summary.json
+    def __init__(self, export_dir=None) -> None:
+        self.export_dir = export_dir
+        self.session = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.histograms = {}
+        self.recorded = 0
+        self.lock = threading.Lock()
+
+        if self.export_dir is not None:
+            os.makedirs(self.export_dir, exist_ok=True)
+            logging.warning(f"TRACER export session {self.session} to {self.export_dir}")
+
+    def record(self, trace: Trace, kind):
+        if trace is None or len(trace.stages)==0:
+            return
+
+        with self.lock:
+            for stage in trace.stages:
+                self.histograms.setdefault(kind, {}).setdefault(stage, LatencyHistogram()).add(trace.elapsed(stage)*1000)
+            self.recorded += 1
+            recorded = self.recorded
+
+        if kind != 'block':
+            logging.warning(f"TRACER {kind} {trace}")
+
+        if self.export_dir is not None:
+            with open(f"{self.export_dir}/trace_{self.session}.jsonl", 'a') as f:
+                f.write(json.dumps({'kind': kind, **trace.to_dict()}) + '\n')
+
+        if recorded % SUMMARY_LOG_INTERVAL == 0:
+            self.log_summary()
+            self.export_summary()
+
+    def summary(self):
+        with self.lock:
+            return {kind: {stage.name: histogram.to_dict() for stage,histogram in sorted(histograms.items())} for kind,histograms in self.histograms.items()}
+
+    def log_summary(self):
+        for kind, stages in self.summary().items():
+            logging.info(f"TRACER {kind} " + ' '.join([f"{stage} p50 {histogram['p50']}ms p99 {histogram['p99']}ms" for stage,histogram in stages.items()]))
+
+    def export_summary(self):
+        if self.export_dir is not None:
+            with open(f"{self.export_dir}/trace_{self.session}_summary.json", 'w') as f:
+                json.dump(self.summary(), f, indent=2)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    tracer = Tracer()
+    for block_number in range(200):
+        received_at = time.time()
+        trace = Trace(block_number).mark(TraceStage.HEADER_RECEIVED, received_at).mark(TraceStage.LOGS_FETCHED, received_at + 0.05)
+        tracer.record(trace, 'block')
+
+        order_trace = trace.fork('0xPair').mark(TraceStage.INSPECTED, received_at + 0.4).mark(TraceStage.ORDER_QUEUED, received_at + 0.41)
+        order_trace.mark(TraceStage.SIGNED, received_at + 0.45).mark(TraceStage.BROADCAST, received_at + 0.5).mark(TraceStage.MINED, received_at + 2.5)
+        tracer.record(order_trace, 'buy')
+
+    print(json.dumps(tracer.summary()['buy']['BROADCAST'], indent=2))
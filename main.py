@@ -18,27 +18,26 @@ from typing import List
 from dotenv import load_dotenv
 load_dotenv()
 #logging.basicConfig(level=logging.INFO)
-logging.basicConfig(level=int(os.environ.get('LOG_LEVEL')))
+from library.async_logging import setup_async_logging
+LOG_DIR=os.environ.get('LOG_DIR')
+LOG_SAMPLING=os.environ.get('LOG_SAMPLING')
+setup_async_logging(int(os.environ.get('LOG_LEVEL')), 'main', LOG_DIR, LOG_SAMPLING)
 
-from watcher import BlockWatcher
+from watcher import BlockWatcher, MempoolWatcher
 from inspector import Simulator, PairInspector
 from executor import BuySellExecutor
 from reporter import Reporter
+from strategy import Strategy, StrategyConfig, InspectionRecorder
 from helpers import load_abi, timer_decorator, calculate_price, calculate_next_block_base_fee, \
-                        constants, calculate_expect_pnl, get_hour_in_vntz
+                        constants, calculate_expect_pnl, get_hour_in_vntz, metrics, start_metrics_server
 
 from data import ExecutionOrder, SimulationResult, ExecutionAck, Position, TxStatus, \
                     ReportData, ReportDataType, BlockData, Pair, MaliciousPair, InspectionResult, \
-                    ControlOrder, ControlOrderType
+                    ControlOrder, ControlOrderType, PendingLiquidity, PendingThreat, Trace, TraceStage
+from library import Tracer, SamplingProfiler
 
 # global variables
-glb_fullfilled = 0
-glb_liquidated = False
-glb_watchlist = []
-glb_inventory = []
-glb_daily_pnl = (datetime.now(), 0)
-glb_auto_run = True
-glb_lock = threading.Lock()
+glb_strategy = None
 
 # load config
 ERC20_ABI = load_abi(f"{os.path.dirname(__file__)}/contracts/abis/ERC20.abi.json")
@@ -59,34 +58,22 @@ SIMULATION_AMOUNT = 0.001
 SLIPPAGE_MIN_THRESHOLD = 30 # in basis points
 SLIPPAGE_MAX_THRESHOLD = 100 # in basis points
 
-# watchlist config
-MAX_INSPECT_ATTEMPTS=int(os.environ.get('MAX_INSPECT_ATTEMPTS'))
-INSPECT_INTERVAL_SECONDS=int(os.environ.get('INSPECT_INTERVAL_SECONDS'))
-WATCHLIST_CAPACITY = 100
-NUMBER_TX_MM_THRESHOLD=int(os.environ.get('NUMBER_TX_MM_THRESHOLD'))
-
-# buy/sell tx config
-INVENTORY_CAPACITY=int(os.environ.get('INVENTORY_CAPACITY'))
-BUY_AMOUNT=float(os.environ.get('BUY_AMOUNT'))
-AMOUNT_CHANGE_STEP=float(os.environ.get('AMOUNT_CHANGE_STEP'))
-MIN_BUY_AMOUNT=float(os.environ.get('MIN_BUY_AMOUNT'))
-MAX_BUY_AMOUNT=float(os.environ.get('MAX_BUY_AMOUNT'))
-MIN_EXPECTED_PNL=float(os.environ.get('MIN_EXPECTED_PNL'))
-RISK_REWARD_RATIO=float(os.environ.get('RISK_REWARD_RATIO'))
-
 DEADLINE_DELAY_SECONDS = 30
 GAS_LIMIT = 250*10**3
 MAX_FEE_PER_GAS = 10**9
 MAX_PRIORITY_FEE_PER_GAS = 10**9
-GAS_COST=float(os.environ.get('GAS_COST_GWEI'))*10**-9
-
-# liquidation conditions
-TAKE_PROFIT_PERCENTAGE=float(os.environ.get('TAKE_PROFIT_PERCENTAGE'))
-STOP_LOSS_PERCENTAGE=float(os.environ.get('STOP_LOSS_PERCENTAGE'))
-HOLD_MAX_DURATION_SECONDS=int(os.environ.get('HOLD_MAX_DURATION_SECONDS'))
-HARD_STOP_PNL_THRESHOLD=int(os.environ.get('HARD_STOP_PNL_THRESHOLD'))
 
-async def watching_process(watching_broker, watching_notifier):
+# inspection results are appended here when set, for the backtester to replay
+INSPECTION_RECORD_PATH=os.environ.get('INSPECTION_RECORD_PATH')
+# per session latency traces and histograms are exported here when set
+TRACE_EXPORT_DIR=os.environ.get('TRACE_EXPORT_DIR')
+# prometheus scrape endpoint of the main process, the execution process serves on the next port
+METRICS_PORT=int(os.environ.get('METRICS_PORT', '0'))
+# sampling profiler toggled with SIGUSR1 (start) and SIGUSR2 (stop) on the main process
+PROFILE_SAMPLE_INTERVAL_SECONDS=float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', '10'))/1000
+PROFILE_OUTPUT_DIR=os.environ.get('PROFILE_OUTPUT_DIR', 'profiles')
+
+async def watching_process(watching_broker, watching_notifier, pending_broker):
     block_watcher = BlockWatcher(os.environ.get('HTTPS_URL'),
                                 os.environ.get('WSS_URL'), 
                                 watching_broker, 
@@ -96,46 +83,55 @@ async def watching_process(watching_broker, watching_notifier):
                                 os.environ.get('WETH_ADDRESS'),
                                 PAIR_ABI,
                                 )
-    await block_watcher.main()
+
+    mempool_watcher = MempoolWatcher(os.environ.get('WSS_URL').split(',')[0],
+                                    pending_broker,
+                                    os.environ.get('FACTORY_ADDRESS'),
+                                    os.environ.get('WETH_ADDRESS'),
+                                    os.environ.get('ROUTER_ADDRESS', constants.UNI_V2_ROUTER_ADDRESS),
+                                    os.environ.get('PAIR_INIT_CODE_HASH', constants.UNI_V2_PAIR_INIT_CODE_HASH),
+                                    block_watcher.inventory,
+                                    )
+
+    await asyncio.gather(block_watcher.main(), mempool_watcher.main())
+
+def log_prestage_error(future):
+    # nobody awaits the pre-stage, its errors would be dropped silently
+    if not future.cancelled() and future.exception() is not None:
+        logging.error(f"MAIN pre-stage error {future.exception()}")
+
+async def handle_pending(pending_broker, execution_broker):
+    loop = asyncio.get_running_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=5)
+
+    while True:
+        pending = await pending_broker.coro_get()
+        if RUN_MODE==constants.WATCHING_ONLY_MODE:
+            continue
+
+        if pending is not None and isinstance(pending, PendingLiquidity):
+            # fire and forget, the decision is made when the PairCreated log lands
+            future = loop.run_in_executor(executor, get_inspector().prestage_pair, pending)
+            future.add_done_callback(log_prestage_error)
+
+        elif pending is not None and isinstance(pending, PendingThreat):
+            order = glb_strategy.on_threat(pending, time())
+            if order is not None:
+                order.trace = Trace(0, pending.pair.address).mark(TraceStage.PENDING_RECEIVED, pending.received_at).mark(TraceStage.ORDER_QUEUED)
+                execution_broker.put(order)
 
 async def strategy(watching_broker, execution_broker, report_broker, watching_notifier,):
-    global glb_fullfilled
-    global glb_liquidated
-    global glb_lock
-    global glb_inventory
-    global glb_watchlist
-    global glb_daily_pnl
-    global glb_auto_run
-    global BUY_AMOUNT
-
-    def calculate_pnl_percentage(position: Position, pair):
-        numerator = Decimal(position.amount)*calculate_price(pair.reserve_token, pair.reserve_eth) - Decimal(position.amount_in) - Decimal(GAS_COST)
-        denominator = Decimal(position.amount_in)
-        return (numerator / denominator) * Decimal(100)
-    
-    def send_exec_order(block_data, pair):
-        global glb_fullfilled
-
-        if glb_fullfilled < INVENTORY_CAPACITY:
-            with glb_lock:
-                glb_fullfilled += 1
-
-            # send execution order
-            logging.warning(f"MAIN send buy-order of {pair.address} amount {BUY_AMOUNT}")
-            execution_broker.put(ExecutionOrder(
-                block_number=block_data.block_number,
-                block_timestamp=block_data.block_timestamp,
-                pair=pair,
-                amount_in=BUY_AMOUNT,
-                amount_out_min=0,
-                is_buy=True,
-            ))
-        else:
-            logging.warning(f"MAIN inventory capacity {INVENTORY_CAPACITY} is full")
+    # blocks are decided in order on a single thread, inspection takes seconds and must not hold the event loop
+    # where pending threats are handled
+    loop = asyncio.get_running_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
 
     while True:
         block_data = await watching_broker.coro_get()
-        logging.info(f"MAIN received block {block_data}")
+        logging.info("MAIN received block %s", block_data)
+
+        trace = block_data.trace if block_data.trace is not None else Trace(block_data.block_number)
+        trace.mark(TraceStage.BLOCK_RECEIVED)
         
         # send block report
         if len(block_data.pairs) > 0:
@@ -144,142 +140,28 @@ async def strategy(watching_broker, execution_broker, report_broker, watching_no
                 data=block_data,
             ))
 
-        # hardstop based on pnl
-        logging.info(f"[{glb_daily_pnl[0].strftime('%Y-%m-%d %H:00:00')}] Realized PnL {round(glb_daily_pnl[1],6)} Expected PnL {round(calculate_expect_pnl(BUY_AMOUNT, MIN_BUY_AMOUNT, MIN_EXPECTED_PNL, RISK_REWARD_RATIO),6)}")
-
         if RUN_MODE==constants.WATCHING_ONLY_MODE:
             logging.info(f"I'm happy watching =))...")
+            Tracer().record(trace, 'block')
             continue
 
-        if len(glb_inventory)>0:
-            if not glb_liquidated:
-                for idx,position in enumerate(glb_inventory):
-                    is_liquidated = False
-                    for pair in block_data.inventory:
-                        if position.pair.address == pair.address:
-                            position.pnl = calculate_pnl_percentage(position, pair)
-                            logging.info(f"MAIN {position} update PnL {position.pnl}")
-                            
-                            if position.pnl > Decimal(TAKE_PROFIT_PERCENTAGE) or position.pnl < Decimal(STOP_LOSS_PERCENTAGE):
-                                logging.warning(f"MAIN {position} take profit or stop loss caused by pnl {position.pnl}")
-                                is_liquidated = True
-                                break
-
-                    if not is_liquidated and block_data.block_timestamp - position.start_time > HOLD_MAX_DURATION_SECONDS:
-                        logging.warning(f"MAIN {position} liquidation call caused by timeout {HOLD_MAX_DURATION_SECONDS}")
-                        is_liquidated = True
-
-                    if is_liquidated:
-                        with glb_lock:
-                            glb_liquidated = True
-                            glb_inventory.pop(idx)
-                        logging.warning(f"MAIN Remove {position} from inventory at index #{idx}")
-
-                        execution_broker.put(ExecutionOrder(
-                                    block_number=block_data.block_number,
-                                    block_timestamp=block_data.block_timestamp,
-                                    pair=position.pair,
-                                    amount_in=position.amount,
-                                    amount_out_min=0,
-                                    is_buy=False,
-                                    signer=position.signer,
-                                    bot=position.bot,
-                                    position=position,
-                                ))
-        
-        if glb_daily_pnl[1] < HARD_STOP_PNL_THRESHOLD and glb_auto_run:
-            with glb_lock:
-                glb_auto_run = False
-                logging.warning(f"MAIN stop auto run...")
+        # per pair spans forked from the block trace at inspection
+        pair_traces = {}
+        def traced_inspect(pairs, block_number, is_initial=False, buy_amount=None):
+            results = inspect(pairs, block_number, is_initial, buy_amount)
+            for result in results:
+                result.trace = trace.fork(result.pair.address).mark(TraceStage.INSPECTED)
+                pair_traces[result.pair.address] = result.trace
+            return results
 
-        if not glb_auto_run:
-            logging.info(f"MAIN auto-run is disabled")
-            continue
+        for order in await loop.run_in_executor(executor, glb_strategy.on_block, block_data, traced_inspect, time()):
+            order.trace = pair_traces.get(order.pair.address, trace.fork(order.pair.address)).mark(TraceStage.ORDER_QUEUED)
+            execution_broker.put(order)
 
-        if glb_daily_pnl[0].strftime('%Y-%m-%d %H') != datetime.now().strftime('%Y-%m-%d %H'):
-            with glb_lock:
-                glb_daily_pnl = (datetime.now(), 0)
-                logging.warning(f"MAIN reset hourly pnl at time {glb_daily_pnl[0].strftime('%Y-%m-%d %H:00:00')}")
-
-                if get_hour_in_vntz(datetime.now())==0:
-                    BUY_AMOUNT=float(os.environ.get('BUY_AMOUNT'))
-                    logging.warning(f"MAIN reset buy-amount to initial value {BUY_AMOUNT} at 0 a.m VNT")
-                
-
-        if len(glb_watchlist)>0:
-            logging.info(f"MAIN watching list {len(glb_watchlist)}")
-
-            inspection_batch=[]
-            for pair in glb_watchlist:
-                if (block_data.block_timestamp - pair.created_at) > pair.inspect_attempts*INSPECT_INTERVAL_SECONDS:
-                    logging.warning(f"MAIN pair {pair.address} inspect time #{pair.inspect_attempts + 1} elapsed")
-                    inspection_batch.append(pair)
-
-            if len(inspection_batch)>0:
-                results = inspect(inspection_batch, block_data.block_number)
-                logging.debug(f"MAIN watchlist simulation result length {len(results)}")
-
-                for result in results:
-                    if result.simulation_result is not None:
-                        for idx,pair in enumerate(glb_watchlist):
-                            if result.pair.address == pair.address:
-                                with glb_lock:
-                                    pair.inspect_attempts += 1
-                                    pair.number_tx_mm = result.number_tx_mm
-                                    # TODO: last_inspected_block is not updated and stay as initial value created_block_number
-                                    # in order to re-verify multiple times to gain reliability
-                                    #pair.last_inspected_block = block_data.block_number
-                                    
-                                logging.warning(f"MAIN update upon inspect attempts {pair}")
-
-                            if pair.inspect_attempts >= MAX_INSPECT_ATTEMPTS:
-                                with glb_lock:
-                                    glb_watchlist.pop(idx)
-                                logging.warning(f"MAIN remove pair {pair.address} from watching list at index #{idx} caused by reaching max attempts {MAX_INSPECT_ATTEMPTS}")
-
-                                if pair.number_tx_mm >= NUMBER_TX_MM_THRESHOLD:
-                                    send_exec_order(block_data, pair)
-                                else:
-                                    logging.warning(f"MAIN pair {pair.address} not qualified for order due to numberTxMM {pair.number_tx_mm} is not sufficient")
-
-                # remove simulation failed pair
-                failed_pairs = [pair.address for pair in inspection_batch if pair.address not in [result.simulation_result.pair.address for result in results if result.simulation_result is not None]]
-                for idx,pair in enumerate(glb_watchlist):
-                    if pair.address in failed_pairs:
-                        with glb_lock:
-                            glb_watchlist.pop(idx)
-
-                        logging.warning(f"MAIN remove pair {pair.address} from watchlist at index #{idx} due to inspection failed")
-
-        if  len(block_data.pairs)>0:
-            results = inspect(block_data.pairs, block_data.block_number, is_initial=True)
-            logging.debug(f"MAIN inspection results length {len(results)}")
-
-            if len(glb_watchlist)<WATCHLIST_CAPACITY:
-                for result in results:
-                    if result.simulation_result is not None:
-                        if MAX_INSPECT_ATTEMPTS > 1:
-                            with glb_lock:
-                                # append to watchlist
-                                pair=result.pair
-                                pair.inspect_attempts=1
-                                pair.last_inspected_block=block_data.block_number
-                                pair.contract_verified=result.contract_verified
-                                pair.number_tx_mm=result.number_tx_mm
-
-                                glb_watchlist.append(pair)
-
-                            logging.warning(f"MAIN add pair {pair.address} to watchlist length {len(glb_watchlist)}")
-                        else:
-                            # send order immediately
-                            send_exec_order(block_data, result.pair)
-            else:
-                logging.warning(f"MAIN watchlist is already full capacity {WATCHLIST_CAPACITY}")
+        Tracer().record(trace, 'block')
 
-@timer_decorator
-def inspect(pairs, block_number, is_initial=False) -> List[InspectionResult]:
-
-    inspector = PairInspector(
+def get_inspector() -> PairInspector:
+    return PairInspector(
         http_url=os.environ.get('HTTPS_URL'),
         api_keys=os.environ.get('BASESCAN_API_KEYS'),
         signer=Web3.to_checksum_address(os.environ.get('MANAGER_ADDRESS')),
@@ -291,11 +173,23 @@ def inspect(pairs, block_number, is_initial=False) -> List[InspectionResult]:
         bot_abi=BOT_ABI,
     )
 
-    return inspector.inspect_batch(pairs,block_number, is_initial)
+@timer_decorator
+def inspect(pairs, block_number, is_initial=False, buy_amount=None) -> List[InspectionResult]:
+    results = get_inspector().inspect_batch(pairs,block_number, is_initial, buy_amount)
+    if INSPECTION_RECORD_PATH is not None:
+        InspectionRecorder(INSPECTION_RECORD_PATH).record(results)
+    return results
 
 def execution_process(execution_broker, report_broker):
     # set process group the same as main process
     os.setpgid(0, os.getppid())
+
+    # the writer thread of the parent does not survive the fork
+    setup_async_logging(int(os.environ.get('LOG_LEVEL')), 'execution', LOG_DIR, LOG_SAMPLING)
+
+    metrics.registry.set_const_labels(process='execution')
+    if METRICS_PORT > 0:
+        start_metrics_server(METRICS_PORT + 1)
     
     executor = BuySellExecutor(
         http_url=os.environ.get('HTTPS_URL'),
@@ -324,9 +218,10 @@ def execution_process(execution_broker, report_broker):
     asyncio.run(executor.run())
 
 async def main():
-    global glb_inventory
-    global glb_lock
-    global glb_fullfilled
+    global glb_strategy
+
+    glb_strategy = Strategy(StrategyConfig.from_env(), time())
+    Tracer(TRACE_EXPORT_DIR)
 
     watching_broker = aioprocessing.AioQueue()
     watching_notifier = aioprocessing.AioQueue()
@@ -334,9 +229,14 @@ async def main():
     execution_report = aioprocessing.AioQueue()
     report_broker = aioprocessing.AioQueue()
     control_receiver = aioprocessing.AioQueue()
+    pending_broker = aioprocessing.AioQueue()
 
     # set process group
     os.setpgid(0, 0)
+
+    metrics.registry.set_const_labels(process='main')
+    if METRICS_PORT > 0:
+        start_metrics_server(METRICS_PORT)
     
     # EXECUTION process
     p2 = Process(target=execution_process, args=(execution_broker,execution_report,))
@@ -346,16 +246,9 @@ async def main():
     reporter = Reporter(report_broker, control_receiver)
 
     async def handle_execution_report():
-        global glb_inventory
-        global glb_lock
-        global glb_fullfilled
-        global glb_liquidated
-        global glb_daily_pnl
-        global BUY_AMOUNT
-
         while True:
             report = await execution_report.coro_get()
-            logging.info(f"MAIN receive execution report {report}")
+            logging.info("MAIN receive execution report %s", report)
 
             if report is not None and isinstance(report, ExecutionAck):
                 # send execution report
@@ -366,80 +259,33 @@ async def main():
 
                 watching_notifier.put(report)
 
-                if report.tx_status == TxStatus.SUCCESS:
-                    if report.is_buy:
-                        with glb_lock:
-                            glb_inventory.append(Position(
-                                pair=report.pair,
-                                amount=report.amount_out,
-                                buy_price=calculate_price(report.amount_out, report.amount_in),
-                                start_time=int(time()),
-                                signer=report.signer,
-                                bot=report.bot,
-                                amount_in=report.amount_in,
-                            ))
-                            logging.warning(f"MAIN append {report.pair.address} to inventory")
-                    else:
-                        with glb_lock:
-                            glb_fullfilled -= 1
-                            glb_liquidated = False
-
-                            if report.position is not None and report.position.amount_in is not None:
-                                pnl = (Decimal(report.amount_out)-Decimal(report.position.amount_in)-Decimal(GAS_COST))/Decimal(report.position.amount_in)*Decimal(100)
-                            else:
-                                pnl = (Decimal(report.amount_out)-Decimal(BUY_AMOUNT)-Decimal(GAS_COST))/Decimal(BUY_AMOUNT)*Decimal(100)
-                            
-                            glb_daily_pnl = (glb_daily_pnl[0], glb_daily_pnl[1] + pnl)
-
-                            # if PnL exceed threshold then increase the buy-amount and reset the PnL
-                            if glb_daily_pnl[1]>calculate_expect_pnl(BUY_AMOUNT,MIN_BUY_AMOUNT,MIN_EXPECTED_PNL,RISK_REWARD_RATIO) and BUY_AMOUNT+AMOUNT_CHANGE_STEP<=MAX_BUY_AMOUNT:
-                                BUY_AMOUNT+=AMOUNT_CHANGE_STEP
-                                glb_daily_pnl = (glb_daily_pnl[0], 0)
-                                logging.warning(f"MAIN increase buy-amount to {BUY_AMOUNT} caused by PnL exceed threshold {calculate_expect_pnl(BUY_AMOUNT,MIN_BUY_AMOUNT,MIN_EXPECTED_PNL,RISK_REWARD_RATIO)}, reset PnL")
-
-                            logging.warning(f"MAIN update PnL {glb_daily_pnl} upon liquidation successful")
-                else:
-                    logging.warning(f"MAIN execution failed, reset lock...")
-                    if report.is_buy:
-                        with glb_lock:
-                            glb_fullfilled -= 1
-                    else:
-                        with glb_lock:
-                            glb_fullfilled -= 1
-                            glb_liquidated = False
-
-                            pnl = (-Decimal(BUY_AMOUNT)-Decimal(GAS_COST))/Decimal(BUY_AMOUNT)*Decimal(100)
-                            glb_daily_pnl = (glb_daily_pnl[0], glb_daily_pnl[1] + pnl)
-                            logging.info(f"MAIN update PnL to value {round(glb_daily_pnl[1],6)} upon liquidation failed")
-
-                            # decrease the buy-amount to reduce risk exposure
-                            if glb_daily_pnl[1]<-100 and BUY_AMOUNT-AMOUNT_CHANGE_STEP>=MIN_BUY_AMOUNT:
-                                BUY_AMOUNT-=AMOUNT_CHANGE_STEP
-                                glb_daily_pnl = (glb_daily_pnl[0], 0)
-                                logging.warning(f"MAIN decrease buy-amount to {BUY_AMOUNT} caused by PnL fall below -100, reset PnL")
-
-                        report_broker.put(ReportData(
-                            type=ReportDataType.BLACKLIST_ADDED,
-                            data=[report.pair.creator]
-                        ))
-                        logging.warning(f"MAIN add {report.pair.creator} to blacklist")
+                glb_strategy.on_execution_ack(report, time())
 
-    async def handle_control_order():
-        global glb_lock
-        global glb_inventory
+                if report.trace is not None:
+                    Tracer().record(report.trace.mark(TraceStage.ACK_RECEIVED), 'buy' if report.is_buy else 'sell')
 
-        async def handle_pending_positions(positions):
-            with glb_lock:
-                for pos in positions: 
-                    glb_inventory.append(pos)
-                    logging.warning(f"MAIN append {pos} to inventory upon bootstrap process")
+                if report.tx_status != TxStatus.SUCCESS and not report.is_buy and report.pair.creator is not None:
+                    report_broker.put(ReportData(
+                        type=ReportDataType.BLACKLIST_ADDED,
+                        data=[report.pair.creator]
+                    ))
+                    logging.warning(f"MAIN add {report.pair.creator} to blacklist")
 
+    async def handle_control_order():
         while True:
             order = await control_receiver.coro_get()
 
             if order is not None and isinstance(order, ControlOrder):
                 if order.type==ControlOrderType.PENDING_POSITIONS:
-                    await handle_pending_positions(order.data)
+                    glb_strategy.add_positions(order.data)
+                elif order.type in [ControlOrderType.PROFILER_START, ControlOrderType.PROFILER_STOP]:
+                    SamplingProfiler('main').handle_control_order(order)
+                    # the execution process (with its bot factory) profiles itself
+                    execution_broker.put(order)
+
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGUSR1, lambda: control_receiver.put(ControlOrder(ControlOrderType.PROFILER_START, PROFILE_SAMPLE_INTERVAL_SECONDS)))
+    loop.add_signal_handler(signal.SIGUSR2, lambda: control_receiver.put(ControlOrder(ControlOrderType.PROFILER_STOP, PROFILE_OUTPUT_DIR)))
 
     # control_receiver.put(ReportData(
     #     type=ReportDataType.BLACKLIST_BOOTSTRAP,
@@ -461,7 +307,8 @@ async def main():
     #     )]
     # ))
 
-    await asyncio.gather(watching_process(watching_broker, watching_notifier),
+    await asyncio.gather(watching_process(watching_broker, watching_notifier, pending_broker),
+                        handle_pending(pending_broker, execution_broker),
                         strategy(watching_broker, execution_broker, report_broker, watching_notifier,),
                         handle_execution_report(),
                         reporter.run(),
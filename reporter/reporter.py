@@ -25,6 +25,7 @@ import console.models
 
 BUY_AMOUNT=float(os.environ.get('BUY_AMOUNT'))
 GAS_COST=float(os.environ.get('GAS_COST_GWEI'))*10**-9
+RUGGED_PNL_THRESHOLD=-95 # in percent, a position losing about all its investment was rugged
 
 class Reporter(metaclass=Singleton):
     def __init__(self, receiver, sender):
@@ -222,6 +223,11 @@ class Reporter(metaclass=Singleton):
 
                     await position.asave()
 
+                    # the creator is blacklisted along with the wallets sharing its funding, see CreatorReputation
+                    if position.pnl <= RUGGED_PNL_THRESHOLD and execution_ack.pair.creator is not None:
+                        logging.warning(f"REPORTER position #{position.id} rugged with pnl {round(position.pnl, 2)}%, blacklist creator {execution_ack.pair.creator}")
+                        await save_blacklist([execution_ack.pair.creator])
+
             position_tx = await PositionTransaction.objects.filter(position__id=position.id, transaction__id=tx.id).afirst()
             if position_tx is None:
                 position_tx = PositionTransaction(
@@ -0,0 +1,3 @@
+from strategy.strategy import *
+from strategy.backtester import *
+from strategy.sweep import *
\ No newline at end of file
@@ -0,0 +1,380 @@
+import logging
+import time
+import bisect
+import pickle
+from decimal import Decimal
+
+import numpy as np
+from web3 import Web3
+
+import sys # for testing
+sys.path.append('..')
+
+from helpers import get_amount_out
+from library import MM_TX_AMOUNT_THRESHOLD
+from data import Pair, BlockData, ExecutionAck, TxStatus, InspectionResult, SimulationResult
+from inspector.quoter import Quoter
+from strategy.strategy import Strategy, StrategyConfig
+
+BLOCK_TIME_SECONDS = 2
+SIMULATION_AMOUNT = 0.0001
+
+class BacktestDataset:
+    # recorded chain state, everything in raw uint: pairs by creation block, Sync reserves by block in log order,
+    # and per pair the blocks of the swaps buying more than the market-making threshold
+    def __init__(self, from_block, to_block, anchor_block, anchor_timestamp) -> None:
+        self.from_block = from_block
+        self.to_block = to_block
+        self.anchor_block = anchor_block
+        self.anchor_timestamp = anchor_timestamp
+
+        self.pairs = {}
+        self.syncs = {}
+        self.swaps = {}
+
+    def timestamp(self, block_number):
+        return self.anchor_timestamp + (block_number - self.anchor_block)*BLOCK_TIME_SECONDS
+
+    def add_pair(self, block_number, address, token, token_index):
+        self.pairs.setdefault(block_number, []).append((address, token, token_index))
+
+    def add_sync(self, block_number, address, reserve0, reserve1):
+        self.syncs.setdefault(block_number, []).append((address, reserve0, reserve1))
+
+    def add_swap(self, block_number, address, amount_eth_in):
+        if amount_eth_in > MM_TX_AMOUNT_THRESHOLD:
+            self.swaps.setdefault(address, []).append(block_number)
+
+    def pairs_at(self, block_number):
+        return self.pairs.get(block_number, [])
+
+    def syncs_at(self, block_number):
+        return self.syncs.get(block_number, [])
+
+    def count_swaps(self, address, from_block, to_block):
+        blocks = self.swaps.get(address, [])
+        return bisect.bisect_right(blocks, to_block) - bisect.bisect_left(blocks, from_block)
+
+    def save(self, directory):
+        # flat arrays sorted by block, reserves split into 64-bit limbs since they are up to 112 bits
+        addresses = sorted(set([address for pairs in self.pairs.values() for address,_,_ in pairs] +
+                               [address for syncs in self.syncs.values() for address,_,_ in syncs] +
+                               list(self.swaps.keys())))
+        indices = {address: idx for idx,address in enumerate(addresses)}
+
+        pairs = [(block_number, indices[address], token, token_index) for block_number in sorted(self.pairs) for address,token,token_index in self.pairs[block_number]]
+        syncs = [(block_number, indices[address], reserve0, reserve1) for block_number in sorted(self.syncs) for address,reserve0,reserve1 in self.syncs[block_number]]
+        swaps = sorted([(indices[address] << 32) | block_number for address,blocks in self.swaps.items() for block_number in blocks])
+
+        arrays = {
+            'meta': np.array([self.from_block, self.to_block, self.anchor_block, self.anchor_timestamp], dtype=np.int64),
+            'addresses': np.array(addresses, dtype='U42'),
+            'pair_blocks': np.array([pair[0] for pair in pairs], dtype=np.int64),
+            'pair_addresses': np.array([pair[1] for pair in pairs], dtype=np.int64),
+            'pair_tokens': np.array([pair[2] for pair in pairs], dtype='U42'),
+            'pair_token_indices': np.array([pair[3] for pair in pairs], dtype=np.int64),
+            'sync_blocks': np.array([sync[0] for sync in syncs], dtype=np.int64),
+            'sync_addresses': np.array([sync[1] for sync in syncs], dtype=np.int64),
+            'sync_reserves': np.array([[reserve >> 64 & (2**64 - 1), reserve & (2**64 - 1)] for sync in syncs for reserve in sync[2:]], dtype=np.uint64).reshape(-1, 4),
+            'swap_keys': np.array(swaps, dtype=np.int64),
+        }
+        for name, array in arrays.items():
+            np.save(f"{directory}/{name}.npy", array)
+
+class MappedDataset(BacktestDataset):
+    # read-only view over the arrays written by BacktestDataset.save, memory-mapped so that processes share the pages
+    def __init__(self, directory) -> None:
+        arrays = {name: np.load(f"{directory}/{name}.npy", mmap_mode='r') for name in ['meta', 'addresses', 'pair_blocks', 'pair_addresses', 'pair_tokens',
+                                                                                    'pair_token_indices', 'sync_blocks', 'sync_addresses', 'sync_reserves', 'swap_keys']}
+        super().__init__(*[int(value) for value in arrays['meta']])
+        self.arrays = arrays
+        self.indices = {str(address): idx for idx,address in enumerate(arrays['addresses'])}
+
+        # per block offsets into the event arrays, so that replaying a block is a plain slice
+        blocks = np.arange(self.from_block, self.to_block + 2)
+        self.pair_offsets = np.searchsorted(arrays['pair_blocks'], blocks).tolist()
+        self.sync_offsets = np.searchsorted(arrays['sync_blocks'], blocks).tolist()
+
+    def pairs_at(self, block_number):
+        start, end = self.pair_offsets[block_number - self.from_block], self.pair_offsets[block_number - self.from_block + 1]
+        return [(str(self.arrays['addresses'][self.arrays['pair_addresses'][idx]]), str(self.arrays['pair_tokens'][idx]), int(self.arrays['pair_token_indices'][idx])) for idx in range(start, end)]
+
+    def syncs_at(self, block_number):
+        start, end = self.sync_offsets[block_number - self.from_block], self.sync_offsets[block_number - self.from_block + 1]
+        syncs = []
+        for idx in range(start, end):
+            limbs = [int(limb) for limb in self.arrays['sync_reserves'][idx]]
+            syncs.append((str(self.arrays['addresses'][self.arrays['sync_addresses'][idx]]), limbs[0] << 64 | limbs[1], limbs[2] << 64 | limbs[3]))
+        return syncs
+
+    def count_swaps(self, address, from_block, to_block):
+        idx = self.indices.get(address)
+        if idx is None:
+            return 0
+        keys = self.arrays['swap_keys']
+        return int(np.searchsorted(keys, (idx << 32) | to_block, 'right') - np.searchsorted(keys, (idx << 32) | from_block, 'left'))
+
+class BacktestInspector:
+    # offline stand-in of PairInspector: recorded inspection results are replayed as they are, other pairs go through
+    # the same reserve range, price impact and round-trip slippage verdicts computed from the recorded reserves
+    def __init__(self, dataset: BacktestDataset, reserve_eth_min, reserve_eth_max, price_impact_max=500, slippage_min=30, slippage_max=100, recorded=None) -> None:
+        self.dataset = dataset
+        self.reserve_eth_min = reserve_eth_min
+        self.reserve_eth_max = reserve_eth_max
+        self.price_impact_max = price_impact_max
+        self.slippage_min = slippage_min
+        self.slippage_max = slippage_max
+        self.recorded = recorded if recorded is not None else {}
+        self.attempts = {}
+        self.quoter = Quoter()
+
+    def inspect_pair(self, pair: Pair, block_number, is_initial, buy_amount) -> InspectionResult:
+        recorded = self.recorded.get(pair.address.lower())
+        if recorded is not None:
+            attempt = self.attempts.get(pair.address, 0)
+            self.attempts[pair.address] = attempt + 1
+            result = recorded[min(attempt, len(recorded) - 1)]
+            result.pair = pair
+            if result.simulation_result is not None:
+                result.simulation_result.pair = pair
+            return result
+
+        from_block=pair.last_inspected_block if pair.last_inspected_block>0 else block_number
+        result = InspectionResult(
+            pair=pair,
+            from_block=from_block,
+            to_block=block_number,
+        )
+
+        result.reserve_inrange = self.reserve_eth_min <= pair.reserve_eth <= self.reserve_eth_max
+        if is_initial and not result.reserve_inrange:
+            return result
+
+        result.quote = self.quoter.quote(pair, buy_amount)
+        if result.quote is None or result.quote.price_impact > self.price_impact_max:
+            return result
+
+        if not is_initial:
+            result.number_tx_mm = self.dataset.count_swaps(pair.address, from_block, block_number)
+
+        simulation = self.quoter.quote(pair, SIMULATION_AMOUNT)
+        slippage = (Decimal(SIMULATION_AMOUNT) - Decimal(simulation.amount_out))/Decimal(SIMULATION_AMOUNT)*Decimal(10000)
+        if slippage <= self.slippage_min or slippage >= self.slippage_max:
+            return result
+
+        result.simulation_result = SimulationResult(
+            pair=pair,
+            amount_in=SIMULATION_AMOUNT,
+            amount_out=simulation.amount_out,
+            slippage=slippage,
+            amount_token=simulation.amount_token,
+        )
+        return result
+
+    def inspect(self, pairs, block_number, is_initial=False, buy_amount=None):
+        return [self.inspect_pair(pair, block_number, is_initial, buy_amount if buy_amount is not None else SIMULATION_AMOUNT) for pair in pairs]
+
+class BacktestPosition:
+    def __init__(self, pair, buy_block, buy_time, amount_in, amount_token) -> None:
+        self.pair = pair
+        self.buy_block = buy_block
+        self.buy_time = buy_time
+        self.amount_in = amount_in
+        self.amount_token = amount_token
+        self.sell_block = None
+        self.sell_time = None
+        self.amount_out = None
+        self.profit = None
+        self.pnl = None
+
+    def __str__(self) -> str:
+        return f"BacktestPosition {self.pair} buy #{self.buy_block} sell #{self.sell_block} amountIn {self.amount_in} amountOut {self.amount_out} pnl {self.pnl}"
+
+class BacktestResult:
+    def __init__(self) -> None:
+        self.positions = []
+        self.hourly = {}
+        self.blocks = 0
+        self.elapsed = 0
+
+    def close(self, position: BacktestPosition, gas_cost):
+        position.profit = Decimal(position.amount_out) - Decimal(position.amount_in) - Decimal(gas_cost)
+        position.pnl = position.profit/Decimal(position.amount_in)*Decimal(100)
+        self.positions.append(position)
+
+        hour = position.sell_time - position.sell_time % 3600
+        profit, pnl, count = self.hourly.get(hour, (Decimal(0), Decimal(0), 0))
+        self.hourly[hour] = (profit + position.profit, pnl + position.pnl, count + 1)
+
+    def total_profit(self):
+        return sum([hourly[0] for hourly in self.hourly.values()], Decimal(0))
+
+    def max_drawdown(self):
+        # deepest fall of the cumulative profit from its running peak, positions taken in closing order
+        peak, drawdown, profit = Decimal(0), Decimal(0), Decimal(0)
+        for position in self.positions:
+            profit += position.profit
+            peak = max(peak, profit)
+            drawdown = max(drawdown, peak - profit)
+        return drawdown
+
+    def win_rate(self):
+        return len([position for position in self.positions if position.pnl > 0])/len(self.positions) if len(self.positions)>0 else 0
+
+    def summary(self):
+        return {
+            'blocks': self.blocks,
+            'blocks_per_second': self.blocks/self.elapsed if self.elapsed>0 else 0,
+            'positions': len(self.positions),
+            'win_rate': self.win_rate(),
+            'total_profit': float(self.total_profit()),
+            'max_drawdown': float(self.max_drawdown()),
+            'total_pnl': float(sum([position.pnl for position in self.positions], Decimal(0))),
+        }
+
+class Backtester:
+    # replays the dataset block by block through Strategy, orders are filled by a constant-product executor against
+    # the recorded reserves `fill_delay_blocks` later, as a mined transaction would be. No wall clock, no randomness.
+    def __init__(self, dataset: BacktestDataset, config: StrategyConfig, inspector: BacktestInspector, fill_delay_blocks=1) -> None:
+        self.dataset = dataset
+        self.config = config
+        self.inspector = inspector
+        self.fill_delay_blocks = fill_delay_blocks
+
+        self.reserves = {}
+        self.tokens = {}
+        self.pending_orders = []
+        self.open_positions = {}
+
+    def build_pair(self, address) -> Pair:
+        token, token_index = self.tokens[address]
+        reserve0, reserve1 = self.reserves.get(address, (0, 0))
+        return Pair(
+            address=address,
+            token=token,
+            token_index=token_index,
+            reserve_token=Web3.from_wei(reserve0 if token_index==0 else reserve1, 'ether'),
+            reserve_eth=Web3.from_wei(reserve1 if token_index==0 else reserve0, 'ether'),
+        )
+
+    def fill(self, order, block_number) -> ExecutionAck:
+        reserve0, reserve1 = self.reserves.get(order.pair.address, (0, 0))
+        reserve_token, reserve_eth = (reserve0, reserve1) if order.pair.token_index==0 else (reserve1, reserve0)
+
+        amount_out = 0
+        tx_status = TxStatus.FAILED
+        if reserve_token > 0 and reserve_eth > 0:
+            if order.is_buy:
+                amount_out = Web3.from_wei(get_amount_out(Web3.to_wei(order.amount_in, 'ether'), reserve_eth, reserve_token), 'ether')
+            else:
+                amount_out = Web3.from_wei(get_amount_out(Web3.to_wei(order.amount_in, 'ether'), reserve_token, reserve_eth), 'ether')
+            tx_status = TxStatus.SUCCESS
+
+        return ExecutionAck(
+            lead_block=order.block_number,
+            block_number=block_number,
+            tx_hash='0x',
+            tx_status=tx_status,
+            pair=order.pair,
+            amount_in=order.amount_in,
+            amount_out=amount_out,
+            is_buy=order.is_buy,
+            position=order.position,
+        )
+
+    def record(self, ack: ExecutionAck, block_number, block_timestamp, result: BacktestResult):
+        if ack.is_buy:
+            if ack.tx_status == TxStatus.SUCCESS:
+                self.open_positions[ack.pair.address] = BacktestPosition(ack.pair.address, block_number, block_timestamp, ack.amount_in, ack.amount_out)
+            return
+
+        position = self.open_positions.pop(ack.pair.address, None)
+        if position is not None:
+            position.sell_block = block_number
+            position.sell_time = block_timestamp
+            position.amount_out = ack.amount_out if ack.tx_status == TxStatus.SUCCESS else 0
+            result.close(position, self.config.gas_cost)
+
+    def run(self) -> BacktestResult:
+        result = BacktestResult()
+        strategy = Strategy(self.config, self.dataset.timestamp(self.dataset.from_block))
+        start_time = time.perf_counter()
+
+        for block_number in range(self.dataset.from_block, self.dataset.to_block + 1):
+            block_timestamp = self.dataset.timestamp(block_number)
+
+            new_pairs = self.dataset.pairs_at(block_number)
+            for address, token, token_index in new_pairs:
+                self.tokens[address] = (token, token_index)
+            for address, reserve0, reserve1 in self.dataset.syncs_at(block_number):
+                self.reserves[address] = (reserve0, reserve1)
+
+            # orders sent `fill_delay_blocks` ago are mined in this block
+            while len(self.pending_orders)>0 and self.pending_orders[0][0] <= block_number:
+                _, order = self.pending_orders.pop(0)
+                ack = self.fill(order, block_number)
+                self.record(ack, block_number, block_timestamp, result)
+                strategy.on_execution_ack(ack, block_timestamp)
+
+            block_data = BlockData(
+                block_number,
+                block_timestamp,
+                0,
+                0,
+                0,
+                [self.build_pair(address) for address, _, _ in new_pairs],
+                [self.build_pair(position.pair.address) for position in strategy.inventory],
+            )
+            for pair in block_data.pairs:
+                pair.created_at = block_timestamp
+
+            for order in strategy.on_block(block_data, self.inspector.inspect, block_timestamp):
+                self.pending_orders.append((block_number + self.fill_delay_blocks, order))
+
+        result.blocks = self.dataset.to_block - self.dataset.from_block + 1
+        result.elapsed = time.perf_counter() - start_time
+        return result
+
+def load_recorded_inspections(path):
+    # pickled (pair address, InspectionResult) records appended by the live bot, grouped by pair in attempt order
+    recorded = {}
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                address, inspection = pickle.load(f)
+            except EOFError:
+                break
+            recorded.setdefault(address.lower(), []).append(inspection)
+    return recorded
+
+class InspectionRecorder:
+    def __init__(self, path) -> None:
+        self.path = path
+
+    def record(self, results):
+        with open(self.path, 'ab') as f:
+            for result in results:
+                pickle.dump((result.pair.address, result), f)
+
+if __name__ == '__main__':
+    # synthetic launch: a pair created at block 10 pumped then dumped, run with a throughput figure
+    logging.basicConfig(level=logging.ERROR)
+
+    WETH = Web3.to_wei(1, 'ether')
+    dataset = BacktestDataset(from_block=0, to_block=50000, anchor_block=0, anchor_timestamp=1722470400)
+    dataset.add_pair(10, '0xPair', '0xToken', 0)
+    dataset.add_sync(10, '0xPair', 10**9*WETH, 3*WETH)
+    for number in range(11, 400):
+        dataset.add_swap(number, '0xPair', WETH//100)
+        dataset.add_sync(number, '0xPair', (10**9 - number*10**6)*WETH, 3*WETH + number*WETH//100)
+
+    config = StrategyConfig(buy_amount=0.01, min_buy_amount=0.01, max_buy_amount=0.05, amount_change_step=0.01, min_expected_pnl=10,
+                            risk_reward_ratio=1, inventory_capacity=1, watchlist_capacity=100, max_inspect_attempts=2,
+                            inspect_interval_seconds=30, number_tx_mm_threshold=5, take_profit_percentage=20, stop_loss_percentage=-10,
+                            hold_max_duration_seconds=600, hard_stop_pnl_threshold=-300, gas_cost=0.00002)
+    inspector = BacktestInspector(dataset, reserve_eth_min=1, reserve_eth_max=10)
+
+    result = Backtester(dataset, config, inspector).run()
+    for position in result.positions:
+        print(position)
+    print(result.summary())
@@ -0,0 +1,334 @@
+import os
+import logging
+import threading
+from datetime import datetime
+from decimal import Decimal
+from typing import List
+
+import sys # for testing
+sys.path.append('..')
+
+from helpers import calculate_price, calculate_expect_pnl, get_hour_in_vntz, InventoryFrame
+from data import ExecutionOrder, ExecutionAck, Position, TxStatus, BlockData, PendingThreat, InspectionResult
+
+class StrategyConfig:
+    def __init__(self, buy_amount, min_buy_amount, max_buy_amount, amount_change_step, min_expected_pnl, risk_reward_ratio,
+                 inventory_capacity, watchlist_capacity, max_inspect_attempts, inspect_interval_seconds, number_tx_mm_threshold,
+                 take_profit_percentage, stop_loss_percentage, hold_max_duration_seconds, hard_stop_pnl_threshold, gas_cost) -> None:
+        self.buy_amount = buy_amount
+        self.min_buy_amount = min_buy_amount
+        self.max_buy_amount = max_buy_amount
+        self.amount_change_step = amount_change_step
+        self.min_expected_pnl = min_expected_pnl
+        self.risk_reward_ratio = risk_reward_ratio
+        self.inventory_capacity = inventory_capacity
+        self.watchlist_capacity = watchlist_capacity
+        self.max_inspect_attempts = max_inspect_attempts
+        self.inspect_interval_seconds = inspect_interval_seconds
+        self.number_tx_mm_threshold = number_tx_mm_threshold
+        self.take_profit_percentage = take_profit_percentage
+        self.stop_loss_percentage = stop_loss_percentage
+        self.hold_max_duration_seconds = hold_max_duration_seconds
+        self.hard_stop_pnl_threshold = hard_stop_pnl_threshold
+        self.gas_cost = gas_cost
+
+    @staticmethod
+    def from_env(**overrides):
+        config = StrategyConfig(
+            buy_amount=float(os.environ.get('BUY_AMOUNT')),
+            min_buy_amount=float(os.environ.get('MIN_BUY_AMOUNT')),
+            max_buy_amount=float(os.environ.get('MAX_BUY_AMOUNT')),
+            amount_change_step=float(os.environ.get('AMOUNT_CHANGE_STEP')),
+            min_expected_pnl=float(os.environ.get('MIN_EXPECTED_PNL')),
+            risk_reward_ratio=float(os.environ.get('RISK_REWARD_RATIO')),
+            inventory_capacity=int(os.environ.get('INVENTORY_CAPACITY')),
+            watchlist_capacity=100,
+            max_inspect_attempts=int(os.environ.get('MAX_INSPECT_ATTEMPTS')),
+            inspect_interval_seconds=int(os.environ.get('INSPECT_INTERVAL_SECONDS')),
+            number_tx_mm_threshold=int(os.environ.get('NUMBER_TX_MM_THRESHOLD')),
+            take_profit_percentage=float(os.environ.get('TAKE_PROFIT_PERCENTAGE')),
+            stop_loss_percentage=float(os.environ.get('STOP_LOSS_PERCENTAGE')),
+            hold_max_duration_seconds=int(os.environ.get('HOLD_MAX_DURATION_SECONDS')),
+            hard_stop_pnl_threshold=int(os.environ.get('HARD_STOP_PNL_THRESHOLD')),
+            gas_cost=float(os.environ.get('GAS_COST_GWEI'))*10**-9,
+        )
+        for name, value in overrides.items():
+            setattr(config, name, value)
+        return config
+
+    def __str__(self) -> str:
+        return f"StrategyConfig {self.__dict__}"
+
+class Strategy:
+    # the trading decisions, free of I/O: the caller feeds blocks, execution acks and pending threats together with
+    # the current time and forwards the returned orders, so the same logic runs live and in backtests
+    def __init__(self, config: StrategyConfig, now) -> None:
+        self.config = config
+        self.buy_amount = config.buy_amount
+
+        self.fullfilled = 0
+        self.liquidated = False
+        self.watchlist = []
+        self.inventory = []
+        self.hourly_pnl = (datetime.fromtimestamp(now), 0)
+        self.auto_run = True
+        self.lock = threading.Lock()
+
+    def expected_pnl(self):
+        return calculate_expect_pnl(self.buy_amount, self.config.min_buy_amount, self.config.min_expected_pnl, self.config.risk_reward_ratio)
+
+    def size_buy(self, simulation_result=None):
+        # the current buy-amount capped by the largest size of the pair's ladder simulation within the thresholds
+        max_buy_amount = getattr(simulation_result, 'max_buy_amount', None)
+        if max_buy_amount is None:
+            return self.buy_amount
+        return max(self.config.min_buy_amount, min(self.buy_amount, float(max_buy_amount)))
+
+    def buy_order(self, block_data: BlockData, pair, simulation_result=None) -> ExecutionOrder:
+        if self.fullfilled < self.config.inventory_capacity:
+            with self.lock:
+                self.fullfilled += 1
+
+            amount_in = self.size_buy(simulation_result)
+            logging.warning(f"STRATEGY send buy-order of {pair.address} amount {amount_in}")
+            return ExecutionOrder(
+                block_number=block_data.block_number,
+                block_timestamp=block_data.block_timestamp,
+                pair=pair,
+                amount_in=amount_in,
+                amount_out_min=0,
+                is_buy=True,
+            )
+
+        logging.warning(f"STRATEGY inventory capacity {self.config.inventory_capacity} is full")
+        return None
+
+    def sell_order(self, block_number, block_timestamp, position: Position, is_urgent=False) -> ExecutionOrder:
+        return ExecutionOrder(
+            block_number=block_number,
+            block_timestamp=block_timestamp,
+            pair=position.pair,
+            amount_in=position.amount,
+            amount_out_min=0,
+            is_buy=False,
+            signer=position.signer,
+            bot=position.bot,
+            position=position,
+            is_urgent=is_urgent,
+        )
+
+    def liquidate(self, block_data: BlockData) -> List[ExecutionOrder]:
+        orders = []
+        if len(self.inventory)==0 or self.liquidated:
+            return orders
+
+        # a snapshot, a pending threat may exit a position from another thread meanwhile
+        inventory = list(self.inventory)
+        inventory_frame = InventoryFrame(inventory, block_data.inventory)
+        pnls, liquidation_indices, is_pnl_triggered = inventory_frame.evaluate(block_data.block_timestamp,
+                                                                                self.config.take_profit_percentage,
+                                                                                self.config.stop_loss_percentage,
+                                                                                self.config.hold_max_duration_seconds,
+                                                                                self.config.gas_cost)
+
+        for idx,position in enumerate(inventory):
+            if inventory_frame.has_reserves[idx]:
+                position.pnl = pnls[idx]
+                logging.info("STRATEGY %s update PnL %s", position, position.pnl)
+
+        for idx in reversed(liquidation_indices.tolist()):
+            position = inventory[idx]
+            if not self.remove_position(position):
+                continue
+            if is_pnl_triggered[idx]:
+                logging.warning("STRATEGY %s take profit or stop loss caused by pnl %s", position, position.pnl)
+            else:
+                logging.warning("STRATEGY %s liquidation call caused by timeout %s", position, self.config.hold_max_duration_seconds)
+
+            logging.warning("STRATEGY Remove %s from inventory at index #%s", position, idx)
+
+            orders.append(self.sell_order(block_data.block_number, block_data.block_timestamp, position))
+
+        return orders
+
+    def remove_position(self, position) -> bool:
+        # False when the position was already exited
+        with self.lock:
+            for idx,held in enumerate(self.inventory):
+                if held is position:
+                    self.liquidated = True
+                    self.inventory.pop(idx)
+                    return True
+        return False
+
+    def on_block(self, block_data: BlockData, inspect, now) -> List[ExecutionOrder]:
+        # inspect(pairs, block_number, is_initial, buy_amount) -> List[InspectionResult]
+        logging.info(f"[{self.hourly_pnl[0].strftime('%Y-%m-%d %H:00:00')}] Realized PnL {round(self.hourly_pnl[1],6)} Expected PnL {round(self.expected_pnl(),6)}")
+
+        orders = self.liquidate(block_data)
+
+        if self.hourly_pnl[1] < self.config.hard_stop_pnl_threshold and self.auto_run:
+            with self.lock:
+                self.auto_run = False
+                logging.warning(f"STRATEGY stop auto run...")
+
+        if not self.auto_run:
+            logging.info(f"STRATEGY auto-run is disabled")
+            return orders
+
+        current_time = datetime.fromtimestamp(now)
+        if self.hourly_pnl[0].strftime('%Y-%m-%d %H') != current_time.strftime('%Y-%m-%d %H'):
+            with self.lock:
+                self.hourly_pnl = (current_time, 0)
+                logging.warning(f"STRATEGY reset hourly pnl at time {self.hourly_pnl[0].strftime('%Y-%m-%d %H:00:00')}")
+
+                if get_hour_in_vntz(current_time)==0:
+                    self.buy_amount=self.config.buy_amount
+                    logging.warning(f"STRATEGY reset buy-amount to initial value {self.buy_amount} at 0 a.m VNT")
+
+        if len(self.watchlist)>0:
+            logging.info(f"STRATEGY watching list {len(self.watchlist)}")
+
+            inspection_batch=[]
+            for pair in self.watchlist:
+                if (block_data.block_timestamp - pair.created_at) > pair.inspect_attempts*self.config.inspect_interval_seconds:
+                    logging.warning(f"STRATEGY pair {pair.address} inspect time #{pair.inspect_attempts + 1} elapsed")
+                    inspection_batch.append(pair)
+
+            if len(inspection_batch)>0:
+                results = inspect(inspection_batch, block_data.block_number, False, self.buy_amount)
+                logging.debug(f"STRATEGY watchlist simulation result length {len(results)}")
+
+                for result in results:
+                    if result.simulation_result is not None:
+                        for idx,pair in enumerate(self.watchlist):
+                            if result.pair.address == pair.address:
+                                with self.lock:
+                                    pair.inspect_attempts += 1
+                                    pair.number_tx_mm = result.number_tx_mm
+                                    # TODO: last_inspected_block is not updated and stay as initial value created_block_number
+                                    # in order to re-verify multiple times to gain reliability
+                                    #pair.last_inspected_block = block_data.block_number
+                                    
+                                logging.warning("STRATEGY update upon inspect attempts %s", pair)
+
+                            if pair.inspect_attempts >= self.config.max_inspect_attempts:
+                                with self.lock:
+                                    self.watchlist.pop(idx)
+                                logging.warning(f"STRATEGY remove pair {pair.address} from watching list at index #{idx} caused by reaching max attempts {self.config.max_inspect_attempts}")
+
+                                if pair.number_tx_mm >= self.config.number_tx_mm_threshold:
+                                    order = self.buy_order(block_data, pair, result.simulation_result)
+                                    if order is not None:
+                                        orders.append(order)
+                                else:
+                                    logging.warning(f"STRATEGY pair {pair.address} not qualified for order due to numberTxMM {pair.number_tx_mm} is not sufficient")
+
+                # remove simulation failed pair
+                failed_pairs = [pair.address for pair in inspection_batch if pair.address not in [result.simulation_result.pair.address for result in results if result.simulation_result is not None]]
+                for idx,pair in enumerate(self.watchlist):
+                    if pair.address in failed_pairs:
+                        with self.lock:
+                            self.watchlist.pop(idx)
+
+                        logging.warning(f"STRATEGY remove pair {pair.address} from watchlist at index #{idx} due to inspection failed")
+
+        if  len(block_data.pairs)>0:
+            results = inspect(block_data.pairs, block_data.block_number, True, self.buy_amount)
+            logging.debug(f"STRATEGY inspection results length {len(results)}")
+
+            if len(self.watchlist)<self.config.watchlist_capacity:
+                for result in results:
+                    if result.simulation_result is not None:
+                        if self.config.max_inspect_attempts > 1:
+                            with self.lock:
+                                # append to watchlist
+                                pair=result.pair
+                                pair.inspect_attempts=1
+                                pair.last_inspected_block=block_data.block_number
+                                pair.contract_verified=result.contract_verified
+                                pair.number_tx_mm=result.number_tx_mm
+
+                                self.watchlist.append(pair)
+
+                            logging.warning(f"STRATEGY add pair {pair.address} to watchlist length {len(self.watchlist)}")
+                        else:
+                            # send order immediately
+                            order = self.buy_order(block_data, result.pair, result.simulation_result)
+                            if order is not None:
+                                orders.append(order)
+            else:
+                logging.warning(f"STRATEGY watchlist is already full capacity {self.config.watchlist_capacity}")
+
+        return orders
+
+    def on_execution_ack(self, report: ExecutionAck, now) -> None:
+        gas_cost = Decimal(self.config.gas_cost)
+
+        if report.tx_status == TxStatus.SUCCESS:
+            if report.is_buy:
+                with self.lock:
+                    self.inventory.append(Position(
+                        pair=report.pair,
+                        amount=report.amount_out,
+                        buy_price=calculate_price(report.amount_out, report.amount_in),
+                        start_time=int(now),
+                        signer=report.signer,
+                        bot=report.bot,
+                        amount_in=report.amount_in,
+                    ))
+                    logging.warning(f"STRATEGY append {report.pair.address} to inventory")
+            else:
+                with self.lock:
+                    self.fullfilled -= 1
+                    self.liquidated = False
+
+                    if report.position is not None and report.position.amount_in is not None:
+                        pnl = (Decimal(report.amount_out)-Decimal(report.position.amount_in)-gas_cost)/Decimal(report.position.amount_in)*Decimal(100)
+                    else:
+                        pnl = (Decimal(report.amount_out)-Decimal(self.buy_amount)-gas_cost)/Decimal(self.buy_amount)*Decimal(100)
+                    
+                    self.hourly_pnl = (self.hourly_pnl[0], self.hourly_pnl[1] + pnl)
+
+                    # if PnL exceed threshold then increase the buy-amount and reset the PnL
+                    if self.hourly_pnl[1]>self.expected_pnl() and self.buy_amount+self.config.amount_change_step<=self.config.max_buy_amount:
+                        self.buy_amount+=self.config.amount_change_step
+                        self.hourly_pnl = (self.hourly_pnl[0], 0)
+                        logging.warning(f"STRATEGY increase buy-amount to {self.buy_amount} caused by PnL exceed threshold {self.expected_pnl()}, reset PnL")
+
+                    logging.warning(f"STRATEGY update PnL {self.hourly_pnl} upon liquidation successful")
+        else:
+            logging.warning(f"STRATEGY execution failed, reset lock...")
+            if report.is_buy:
+                with self.lock:
+                    self.fullfilled -= 1
+            else:
+                with self.lock:
+                    self.fullfilled -= 1
+                    self.liquidated = False
+
+                    pnl = (-Decimal(self.buy_amount)-gas_cost)/Decimal(self.buy_amount)*Decimal(100)
+                    self.hourly_pnl = (self.hourly_pnl[0], self.hourly_pnl[1] + pnl)
+                    logging.info(f"STRATEGY update PnL to value {round(self.hourly_pnl[1],6)} upon liquidation failed")
+
+                    # decrease the buy-amount to reduce risk exposure
+                    if self.hourly_pnl[1]<-100 and self.buy_amount-self.config.amount_change_step>=self.config.min_buy_amount:
+                        self.buy_amount-=self.config.amount_change_step
+                        self.hourly_pnl = (self.hourly_pnl[0], 0)
+                        logging.warning(f"STRATEGY decrease buy-amount to {self.buy_amount} caused by PnL fall below -100, reset PnL")
+
+    def on_threat(self, threat: PendingThreat, now) -> ExecutionOrder:
+        # exit in the same block as the rug instead of waiting for the next block TP/SL evaluation
+        # called from the pending handler while a block may be inspected on another thread
+        for position in list(self.inventory):
+            if position.pair.address.lower() == threat.pair.address.lower() and self.remove_position(position):
+                logging.warning("STRATEGY emergency liquidation of %s caused by %s", position, threat)
+
+                return self.sell_order(0, int(now), position, is_urgent=True)
+        return None
+
+    def add_positions(self, positions: List[Position]) -> None:
+        with self.lock:
+            for pos in positions: 
+                self.inventory.append(pos)
+                logging.warning(f"STRATEGY append {pos} to inventory upon bootstrap process")
@@ -0,0 +1,186 @@
+import logging
+import math
+import copy
+import itertools
+import concurrent.futures
+
+import numpy as np
+
+import sys # for testing
+sys.path.append('..')
+
+from strategy.strategy import StrategyConfig
+from strategy.backtester import MappedDataset, BacktestInspector, Backtester, load_recorded_inspections
+
+BAYES_INITIAL_TRIALS = 8
+BAYES_CANDIDATES = 2000
+BAYES_LENGTH_SCALE = 0.2
+BAYES_NOISE = 1e-6
+
+# worker state, loaded once per process by init_worker
+glb_dataset = None
+glb_config = None
+glb_inspector_kwargs = None
+glb_recorded = None
+
+class SweepParameter:
+    # either a [low, high] range for random and bayesian searches or explicit values for grid searches
+    def __init__(self, name, low=None, high=None, values=None, is_int=False) -> None:
+        self.name = name
+        self.low = low
+        self.high = high
+        self.values = values
+        self.is_int = is_int
+
+    @staticmethod
+    def parse(spec, config: StrategyConfig):
+        # name=low:high or name=v1,v2,v3, the type follows the config value
+        name, value = spec.split('=', 1)
+        if not hasattr(config, name):
+            raise ValueError(f"unknown strategy config {name}")
+        is_int = isinstance(getattr(config, name), int)
+        cast = int if is_int else float
+
+        if ':' in value:
+            low, high = value.split(':', 1)
+            return SweepParameter(name, low=cast(low), high=cast(high), is_int=is_int)
+        values = [cast(v) for v in value.split(',')]
+        return SweepParameter(name, low=min(values), high=max(values), values=values, is_int=is_int)
+
+    def grid(self, steps):
+        if self.values is not None:
+            return self.values
+        values = np.linspace(self.low, self.high, steps)
+        return sorted(set(int(round(v)) for v in values)) if self.is_int else [float(v) for v in values]
+
+    def from_unit(self, u):
+        value = self.low + u*(self.high - self.low)
+        return int(round(value)) if self.is_int else float(value)
+
+    def to_unit(self, value):
+        return (value - self.low)/(self.high - self.low) if self.high != self.low else 0.0
+
+    def __str__(self) -> str:
+        return f"SweepParameter {self.name} low {self.low} high {self.high} values {self.values}"
+
+class BayesianSearch:
+    # gaussian process with an RBF kernel over the unit cube, new points maximize the expected improvement
+    def __init__(self, parameters, rng) -> None:
+        self.parameters = parameters
+        self.rng = rng
+        self.xs = []
+        self.ys = []
+
+    def observe(self, params, y):
+        self.xs.append([parameter.to_unit(params[parameter.name]) for parameter in self.parameters])
+        self.ys.append(y)
+
+    def kernel(self, a, b):
+        distances = ((a[:, None, :] - b[None, :, :])**2).sum(axis=2)
+        return np.exp(-distances/(2*BAYES_LENGTH_SCALE**2))
+
+    def suggest(self, count):
+        candidates = self.rng.random((BAYES_CANDIDATES, len(self.parameters)))
+        if len(self.xs) < BAYES_INITIAL_TRIALS:
+            return [self.to_params(x) for x in candidates[:count]]
+
+        xs = np.array(self.xs)
+        ys = np.array(self.ys)
+        mean, std = ys.mean(), ys.std() if ys.std() > 0 else 1.0
+        ys = (ys - mean)/std
+
+        k_inv = np.linalg.inv(self.kernel(xs, xs) + BAYES_NOISE*np.eye(len(xs)))
+        k_star = self.kernel(candidates, xs)
+        mu = k_star @ k_inv @ ys
+        sigma = np.sqrt(np.clip(1 - np.einsum('ij,jk,ik->i', k_star, k_inv, k_star), 1e-12, None))
+
+        # expected improvement over the best observation, normal cdf/pdf through erf
+        z = (mu - ys.max())/sigma
+        cdf = 0.5*(1 + np.vectorize(math.erf)(z/np.sqrt(2)))
+        pdf = np.exp(-z**2/2)/np.sqrt(2*np.pi)
+        ei = (mu - ys.max())*cdf + sigma*pdf
+
+        return [self.to_params(candidates[idx]) for idx in np.argsort(-ei)[:count]]
+
+    def to_params(self, x):
+        return {parameter.name: parameter.from_unit(u) for parameter,u in zip(self.parameters, x)}
+
+def init_worker(directory, config, inspector_kwargs, recorded_path):
+    global glb_dataset, glb_config, glb_inspector_kwargs, glb_recorded
+
+    logging.basicConfig(level=logging.ERROR)
+    logging.getLogger().setLevel(logging.ERROR)
+
+    glb_dataset = MappedDataset(directory)
+    glb_config = config
+    glb_inspector_kwargs = inspector_kwargs
+    glb_recorded = load_recorded_inspections(recorded_path) if recorded_path is not None else None
+
+def run_trial(params, fill_delay_blocks):
+    config = copy.copy(glb_config)
+    for name, value in params.items():
+        setattr(config, name, value)
+
+    inspector = BacktestInspector(glb_dataset, recorded=copy.deepcopy(glb_recorded), **glb_inspector_kwargs)
+    result = Backtester(glb_dataset, config, inspector, fill_delay_blocks).run()
+    return params, result.summary()
+
+class ParameterSweep:
+    # fans backtests over a process pool, every worker maps the dataset arrays saved in `directory` instead of
+    # receiving a copy of them
+    def __init__(self, directory, config: StrategyConfig, parameters, inspector_kwargs, recorded_path=None, max_workers=4, fill_delay_blocks=1, objective='total_profit') -> None:
+        self.directory = directory
+        self.config = config
+        self.parameters = parameters
+        self.inspector_kwargs = inspector_kwargs
+        self.recorded_path = recorded_path
+        self.max_workers = max_workers
+        self.fill_delay_blocks = fill_delay_blocks
+        self.objective = objective
+
+    def evaluate(self, executor, candidates):
+        futures = [executor.submit(run_trial, params, self.fill_delay_blocks) for params in candidates]
+        trials = []
+        for future in concurrent.futures.as_completed(futures):
+            params, summary = future.result()
+            logging.warning(f"SWEEP {params} {self.objective} {summary[self.objective]}")
+            trials.append((params, summary))
+        return trials
+
+    def run(self, method='grid', trials=100, seed=0, grid_steps=5):
+        rng = np.random.default_rng(seed)
+        results = []
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers,
+                                                    initializer=init_worker,
+                                                    initargs=(self.directory, self.config, self.inspector_kwargs, self.recorded_path)) as executor:
+            if method == 'grid':
+                names = [parameter.name for parameter in self.parameters]
+                candidates = [dict(zip(names, values)) for values in itertools.product(*[parameter.grid(grid_steps) for parameter in self.parameters])]
+                results = self.evaluate(executor, candidates)
+
+            elif method == 'random':
+                candidates = [{parameter.name: parameter.from_unit(u) for parameter,u in zip(self.parameters, x)} for x in rng.random((trials, len(self.parameters)))]
+                results = self.evaluate(executor, candidates)
+
+            elif method == 'bayes':
+                search = BayesianSearch(self.parameters, rng)
+                while len(results) < trials:
+                    # one batch per round keeps every worker busy
+                    batch = self.evaluate(executor, search.suggest(min(self.max_workers, trials - len(results))))
+                    for params, summary in batch:
+                        search.observe(params, summary[self.objective])
+                    results += batch
+
+            else:
+                raise ValueError(f"unknown search method {method}")
+
+        return sorted(results, key=lambda trial: -trial[1][self.objective])
+
+def frontier(trials, objective='total_profit', risk='max_drawdown'):
+    # trials not dominated on (highest objective, lowest risk), by decreasing objective
+    pareto = []
+    for params, summary in sorted(trials, key=lambda trial: (-trial[1][objective], trial[1][risk])):
+        if len(pareto)==0 or summary[risk] < pareto[-1][1][risk]:
+            pareto.append((params, summary))
+    return pareto
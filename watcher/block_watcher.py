@@ -7,6 +7,9 @@ import asyncio
 import concurrent.futures
 from concurrent.futures import ThreadPoolExecutor
 import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
 import websockets
 
 from web3 import AsyncWeb3, Web3
@@ -16,18 +19,44 @@ from web3.middleware import async_geth_poa_middleware
 import sys # for testing
 sys.path.append('..')
 
-from library import Singleton
-from data import BlockData, Pair, ExecutionAck, FilterLogs, FilterLogsType, ReportData, ReportDataType, TxStatus
-from helpers import async_timer_decorator, load_abi, timer_decorator
+from library import Singleton, ContractRegistry, SYNC_TOPIC, SWAP_TOPIC, PAIR_CREATED_TOPIC, TRANSFER_TOPIC, \
+                    decode_sync_log, decode_swap_log, decode_pair_created_log, decode_transfer_log, log_topic, SwapTracker, \
+                    CreatorActivityIndex
+from data import BlockData, Pair, ExecutionAck, FilterLogs, FilterLogsType, ReportData, ReportDataType, TxStatus, Trace, TraceStage
+from helpers import async_timer_decorator, load_abi, timer_decorator, metrics
 
 ADDRESS_ZERO="0x0000000000000000000000000000000000000000"
+SEEN_HEADS_CAPACITY=64
+FLUSHED_PAIRS_CAPACITY=1024
+BACKFILL_CHUNK_SIZE=100 # blocks per eth_getLogs
+BACKFILL_WORKERS=5
+BACKFILL_MAX_BLOCKS=1800 # 1 hour on Base
+HEAD_STATS_LOG_INTERVAL=100 # blocks
+HTTP_HEAD_MAX_WAIT_SECONDS=float(os.environ.get('HTTP_HEAD_MAX_WAIT_SECONDS', '3'))
+HTTP_HEAD_POLL_SECONDS=0.1
+BLOCK_FETCH_RETRIES=5
 
 glb_lock = threading.Lock()
-glb_middleware_added = False
+
+class HeadStats:
+    def __init__(self, wss_url) -> None:
+        self.wss_url = wss_url
+        self.provider = urlparse(wss_url).hostname # metrics label, without the api key in the path
+        self.count = 0
+        self.wins = 0
+        self.total_lag = 0
+        self.max_lag = 0
+
+    def avg_lag(self):
+        return self.total_lag/self.count if self.count>0 else 0
+
+    def __str__(self) -> str:
+        return f"Provider {self.wss_url} heads {self.count} wins {self.wins} avg lag {self.avg_lag()*1000:.1f}ms max lag {self.max_lag*1000:.1f}ms"
 
 class BlockWatcher(metaclass=Singleton):
     def __init__(self, https_url, wss_url, block_broker, report_broker, factory_address, factory_abi, weth_address, pair_abi) -> None:
-        self.wss_url = wss_url
+        # comma separated endpoints, every one is subscribed and the first to deliver a head wins
+        self.wss_urls = [url.strip() for url in wss_url.split(',') if len(url.strip())>0]
         self.block_broker = block_broker
         self.report_broker = report_broker
 
@@ -37,64 +66,366 @@ class BlockWatcher(metaclass=Singleton):
         self.pair_abi = pair_abi
 
         self.inventory = []
+        self.pending_pair_created = {}
+        self.sync_subscriptions = {}
+        self.inventory_keys = {}
+
+        # (number, hash) of recent heads with their first arrival time
+        self.seen_heads = OrderedDict()
+        # addresses of the pairs already handed over, a slower provider may push their PairCreated after the flush
+        self.flushed_pairs = OrderedDict()
+        self.head_stats = {wss_url: HeadStats(wss_url) for wss_url in self.wss_urls}
+        self.sync_positions = {}
+        self.last_block_number = None
+        self.http_block_number = 0
+
+        # swaps of recently created pairs, counted as they are pushed
+        self.swap_tracker = SwapTracker()
+        self.swap_subscriptions = {}
+        self.tracked_keys = {}
+
+        # creator calls to the tokens of recent pairs, from the block bodies fetched in order by a single thread
+        self.creator_activity = CreatorActivityIndex()
+        self.activity_executor = ThreadPoolExecutor(max_workers=1)
+
         self.w3 = Web3(Web3.HTTPProvider(https_url))
-        self.factory = self.w3.eth.contract(address=self.factory_address, abi=self.factory_abi)
+        self.registry = ContractRegistry()
+        self.factory = self.registry.contract(self.w3, self.factory_address, self.factory_abi)
 
-    async def listen_block(self):
-        global glb_lock
-        global glb_middleware_added
+    async def listen_block(self, wss_url):
+        middleware_added = False
 
-        async for w3Async in AsyncWeb3.persistent_websocket(WebsocketProviderV2(self.wss_url)):
-            if not glb_middleware_added:
-                with glb_lock:
-                    glb_middleware_added=True
+        async for w3Async in AsyncWeb3.persistent_websocket(WebsocketProviderV2(wss_url)):
+            if not middleware_added:
+                middleware_added=True
                 w3Async.middleware_onion.inject(async_geth_poa_middleware, layer=0)
                 
             try:
-                logging.warning(f"WATCHER websocket connected...")
+                logging.warning(f"WATCHER websocket {wss_url} connected...")
+
+                # logs are pushed on the same connection as heads, a block is flushed on its head notification
+                head_subscription = await w3Async.eth.subscribe("newHeads")
+                pair_created_subscription = await w3Async.eth.subscribe("logs", {
+                    'address': self.factory.address,
+                    'topics': [Web3.to_hex(PAIR_CREATED_TOPIC)],
+                })
+                self.sync_subscriptions[wss_url] = None
+                self.inventory_keys[wss_url] = ()
+                self.swap_subscriptions[wss_url] = None
+                self.tracked_keys[wss_url] = ()
+                await self.subscribe_inventory(w3Async, wss_url)
+                await self.subscribe_tracked_swaps(w3Async, wss_url)
 
-                subscription_id = await w3Async.eth.subscribe("newHeads")
                 async for response in w3Async.ws.process_subscriptions():
-                    logging.debug(f"new block {response}\n")
-                    
-                    block_number = Web3.to_int(hexstr=response['result']['number'])
-                    block_timestamp = Web3.to_int(hexstr=response['result']['timestamp'])
-                    base_fee = Web3.to_int(hexstr=response['result']['baseFeePerGas'])
-                    gas_used = Web3.to_int(hexstr=response['result']['gasUsed'])
-                    gas_limit = Web3.to_int(hexstr=response['result']['gasLimit'])
+                    logging.debug("WATCHER subscription message %s\n", response)
+
+                    if response['subscription'] == head_subscription:
+                        if self.is_first_head(wss_url, response['result']):
+                            self.flush_block(response['result'])
+                        await self.subscribe_inventory(w3Async, wss_url)
+                        await self.subscribe_tracked_swaps(w3Async, wss_url)
+                    # logs dispatched by topic, a replaced subscription still delivers until it is unsubscribed
+                    elif log_topic(response['result']) == PAIR_CREATED_TOPIC:
+                        self.handle_pair_created_log(response['result'])
+                    elif log_topic(response['result']) == SYNC_TOPIC:
+                        self.handle_sync_log(response['result'])
+                    elif log_topic(response['result']) == SWAP_TOPIC:
+                        self.handle_swap_log(response['result'])
+
+            except websockets.ConnectionClosed:
+                logging.error(f"WATCHER websocket {wss_url} connection closed, reconnect...")
+                continue
+
+    def remember_flushed(self, pair_created_logs):
+        # called with glb_lock held, returns the logs of the pairs not handed over yet and marks them
+        fresh = {}
+        for address,log in pair_created_logs.items():
+            if address.lower() in self.flushed_pairs:
+                continue
+            fresh[address] = log
+            self.flushed_pairs[address.lower()] = log['blockNumber']
+            if len(self.flushed_pairs) > FLUSHED_PAIRS_CAPACITY:
+                self.flushed_pairs.popitem(last=False)
+        return fresh
+
+    def is_first_head(self, wss_url, head) -> bool:
+        # every provider delivers every head, only the first arrival is processed and the others measure their lag
+        now = time.perf_counter()
+        key = (head['number'], head['hash'])
+        stats = self.head_stats[wss_url]
+
+        with glb_lock:
+            first_arrival = self.seen_heads.get(key)
+            if first_arrival is None:
+                self.seen_heads[key] = now
+                if len(self.seen_heads) > SEEN_HEADS_CAPACITY:
+                    self.seen_heads.popitem(last=False)
+            
+            lag = now - first_arrival if first_arrival is not None else 0
+            stats.count += 1
+            stats.total_lag += lag
+            stats.max_lag = max(stats.max_lag, lag)
+            if first_arrival is None:
+                stats.wins += 1
+
+        metrics.registry.counter('watcher_heads_total', 'Heads delivered by the provider', provider=stats.provider).inc()
+        metrics.registry.histogram('watcher_head_lag_seconds', 'Head delay behind the first provider', provider=stats.provider).observe(lag)
+        if first_arrival is None:
+            metrics.registry.counter('watcher_head_wins_total', 'Heads delivered first by the provider', provider=stats.provider).inc()
+
+        if first_arrival is None and stats.wins % HEAD_STATS_LOG_INTERVAL == 0:
+            for provider_stats in self.head_stats.values():
+                logging.info(f"WATCHER {provider_stats}")
+
+        return first_arrival is None
+
+    async def subscribe_inventory(self, w3Async, wss_url):
+        # a logs subscription has a fixed address set, so it is replaced whenever the inventory changes
+        inventory_key = tuple(pair.address for pair in self.inventory)
+        if inventory_key == self.inventory_keys[wss_url]:
+            return
+
+        # the new filter first, the old one keeps delivering until then; an empty address set would match every contract
+        previous = self.sync_subscriptions[wss_url]
+        self.sync_subscriptions[wss_url] = None
+        if len(inventory_key)>0:
+            self.sync_subscriptions[wss_url] = await w3Async.eth.subscribe("logs", {
+                'address': list(inventory_key),
+                'topics': [Web3.to_hex(SYNC_TOPIC)],
+            })
+        if previous is not None:
+            await w3Async.eth.unsubscribe(previous)
+
+        self.inventory_keys[wss_url] = inventory_key
+        logging.info(f"WATCHER {wss_url} subscribed sync logs of {len(inventory_key)} inventory pairs")
+
+    async def subscribe_tracked_swaps(self, w3Async, wss_url):
+        tracked_key = tuple(self.swap_tracker.addresses())
+        if tracked_key == self.tracked_keys[wss_url]:
+            return
+
+        previous = self.swap_subscriptions[wss_url]
+        self.swap_subscriptions[wss_url] = None
+        if len(tracked_key)>0:
+            self.swap_subscriptions[wss_url] = await w3Async.eth.subscribe("logs", {
+                'address': list(tracked_key),
+                'topics': [Web3.to_hex(SWAP_TOPIC)],
+            })
+            # delivered from the next head on, the blocks up to it are covered by the seed of the pairs or not at all
+            if self.last_block_number is not None:
+                self.swap_tracker.mark_live(tracked_key, self.last_block_number + 1)
+        if previous is not None:
+            await w3Async.eth.unsubscribe(previous)
+
+        self.tracked_keys[wss_url] = tracked_key
+        logging.info(f"WATCHER {wss_url} subscribed swap logs of {len(tracked_key)} tracked pairs")
+
+    def handle_swap_log(self, log):
+        if log.get('removed', False):
+            return
+
+        self.swap_tracker.apply(decode_swap_log(log))
+
+    def track_swaps(self, pairs, from_block, to_block):
+        # swaps mined before the subscription covers the new pairs are fetched once
+        if len(pairs)==0:
+            return
+
+        for pair in pairs:
+            self.swap_tracker.track(pair.address, pair.token_index, from_block, pair.created_at)
+        self.seed_swaps([pair.address for pair in pairs], from_block, to_block)
+
+    def seed_swaps(self, addresses, from_block, to_block):
+        # up to the block number of the HTTP node, which may lag the websocket head; the blocks it has not served
+        # yet are fetched on the next flush
+        try:
+            seeded_block = min(to_block, self.w3.eth.block_number)
+            if seeded_block >= from_block:
+                for log in self.get_logs(addresses, SWAP_TOPIC, from_block, seeded_block):
+                    self.swap_tracker.apply(decode_swap_log(log))
+            self.swap_tracker.mark_seeded(addresses, seeded_block)
+        except Exception as e:
+            logging.error(f"WATCHER swap logs of new pairs #{from_block}-#{to_block} error {e}")
+
+    def reseed_swaps(self, to_block):
+        # pairs seeded short of the head or left with a gap before their subscription
+        unseeded = {}
+        for address,from_block in self.swap_tracker.unseeded(to_block):
+            unseeded.setdefault(from_block, []).append(address)
+        for from_block,addresses in unseeded.items():
+            self.seed_swaps(addresses, from_block, to_block)
+
+    def handle_pair_created_log(self, log):
+        if log.get('removed', False):
+            return
+
+        log = decode_pair_created_log(log)
+        logging.debug("WATCHER found pair created %s", log)
+        with glb_lock:
+            # the same log is pushed by every provider, a late one after its block was flushed is dropped
+            if log['args']['pair'].lower() in self.flushed_pairs:
+                return
+            self.pending_pair_created.setdefault(log['blockNumber'], {})[log['args']['pair']] = log
+
+    def handle_sync_log(self, log):
+        if log.get('removed', False):
+            return
+
+        self.apply_ordered_sync_log(decode_sync_log(log))
+
+    def apply_ordered_sync_log(self, log):
+        position = (log['blockNumber'], log['logIndex'])
+        for pair in self.inventory:
+            if pair.address.lower() == log['address'].lower():
+                # a slower provider must not roll the reserves back
+                if position > self.sync_positions.get(pair.address, (0, -1)):
+                    self.sync_positions[pair.address] = position
+                    self.apply_sync_log(pair, log)
 
-                    logging.debug(f"block number {block_number} timestamp {block_timestamp}")
+    @timer_decorator
+    def flush_block(self, head):
+        received_at = time.time()
+        block_number = Web3.to_int(hexstr=head['number'])
+        block_timestamp = Web3.to_int(hexstr=head['timestamp'])
+        base_fee = Web3.to_int(hexstr=head['baseFeePerGas'])
+        gas_used = Web3.to_int(hexstr=head['gasUsed'])
+        gas_limit = Web3.to_int(hexstr=head['gasLimit'])
 
-                    pairs = self.filter_log_in_block(block_number, block_timestamp)
+        logging.debug(f"block number {block_number} timestamp {block_timestamp}")
 
-                    logging.debug(f"WATCHER found pairs {pairs}")
+        if self.last_block_number is not None and block_number > self.last_block_number + 1:
+            logging.warning(f"WATCHER missed blocks #{self.last_block_number + 1} to #{block_number - 1}, backfill...")
+            self.backfill(self.last_block_number + 1, block_number - 1)
+        self.last_block_number = max(self.last_block_number or 0, block_number)
 
-                    self.block_broker.put(BlockData(
-                        block_number,
-                        block_timestamp,
-                        base_fee,
-                        gas_used,
-                        gas_limit,
-                        pairs,
-                        self.inventory,
-                    ))
+        # logs of this block (and of any late block before it) are assembled now
+        with glb_lock:
+            flushed = {number: self.remember_flushed(self.pending_pair_created.pop(number)) for number in sorted(self.pending_pair_created) if number <= block_number}
 
-            except websockets.ConnectionClosed:
-                logging.error(f"WATCHER websocket connection closed, reconnect...")
-                continue
+        pairs = []
+        new_pairs = {}
+        for number,pair_created_logs in flushed.items():
+            new_pairs[number] = self.resolve_pairs(self.build_pairs(pair_created_logs.values(), block_timestamp), number)
+            pairs += new_pairs[number]
+
+        logging.debug("WATCHER found pairs %s", pairs)
+
+        self.block_broker.put(BlockData(
+            block_number,
+            block_timestamp,
+            base_fee,
+            gas_used,
+            gas_limit,
+            pairs,
+            self.inventory,
+            trace=Trace(block_number).mark(TraceStage.HEADER_RECEIVED, received_at).mark(TraceStage.LOGS_FETCHED),
+        ))
+
+        # after the block is handed over, swap counts are only read from the next inspections on
+        self.swap_tracker.expire(block_timestamp)
+        self.creator_activity.expire(block_timestamp)
+        self.reseed_swaps(block_number)
+        for number,created_pairs in new_pairs.items():
+            self.track_swaps(created_pairs, number, block_number)
+            for pair in created_pairs:
+                if pair.creator is not None:
+                    self.creator_activity.watch(pair.token, pair.creator, number, pair.created_at)
+
+        if not self.creator_activity.is_empty():
+            self.activity_executor.submit(self.index_block_transactions, block_number)
+
+    def index_block_transactions(self, block_number):
+        # from the first block a tracked token misses up to the head: pairs flushed late or backfilled start before
+        # the head, a block not fetched is retried on the next head
+        next_block = self.creator_activity.next_block()
+        if next_block is None:
+            return
+
+        for number in range(next_block, block_number + 1):
+            try:
+                transactions = self.get_block_transactions(number)
+            except Exception as e:
+                logging.error(f"WATCHER index transactions of block #{number} error {e}")
+                return
+            if transactions is None:
+                logging.warning(f"WATCHER block #{number} not served by the HTTP node, index it on the next head")
+                return
+            self.creator_activity.index_block(number, transactions)
+
+    def get_block_transactions(self, block_number):
+        # raw json, formatting every transaction of a full block with web3 costs more than the request. None while
+        # the HTTP node has not imported the block
+        self.wait_http_head(block_number)
+        for _ in range(BLOCK_FETCH_RETRIES):
+            block = self.w3.provider.make_request('eth_getBlockByNumber', [hex(block_number), True])['result']
+            if block is not None:
+                return [{'from': tx['from'].lower(), 'to': (tx.get('to') or '').lower()} for tx in block['transactions']]
+            time.sleep(HTTP_HEAD_POLL_SECONDS)
+        return None
+
+    def build_pairs(self, pair_created_logs, block_timestamp):
+        pairs = []
+        for log in pair_created_logs:
+            if log['args']['token0'].lower() == self.weth_address.lower() or log['args']['token1'].lower() == self.weth_address.lower():
+                pairs.append(Pair(
+                    token=log['args']['token0'] if log['args']['token1'].lower() == self.weth_address.lower() else log['args']['token1'],
+                    token_index=0 if log['args']['token1'].lower() == self.weth_address.lower() else 1,
+                    address=log['args']['pair'],
+                    created_at=block_timestamp,
+                ))
+        return pairs
+
+    def resolve_pairs(self, pairs, block_number):
+        if len(pairs)==0:
+            return pairs
+
+        # read at the block of the pairs, the HTTP node may not have imported the head the websocket pushed
+        self.wait_http_head(block_number)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+            future_to_pair = {executor.submit(self.get_reserves_and_creator, pair.address, block_number): idx for idx,pair in enumerate(pairs)}
+            for future in concurrent.futures.as_completed(future_to_pair):
+                idx = future_to_pair[future]
+                try:
+                    result = future.result()
+                    logging.debug("WATCHER getReserves %s result %s", pairs[idx].address, result)
+                    if result[0] is not None and len(result[0])>1:
+                        pairs[idx].reserve_token = Web3.from_wei(result[0][0],'ether') if pairs[idx].token_index == 0 else Web3.from_wei(result[0][1], 'ether')
+                        pairs[idx].reserve_eth = Web3.from_wei(result[0][1],'ether') if pairs[idx].token_index == 0 else Web3.from_wei(result[0][0], 'ether')
+                    
+                    if result[1] is not None:
+                        pairs[idx].creator = Web3.to_checksum_address(result[1])
+                except Exception as e:
+                    logging.error(f"WATCHER getReserves {pairs[idx].address} error {e}")
+
+        return pairs
+
+    def apply_sync_log(self, pair, log):
+        logging.debug(f"WATCHER update reserves for inventory pair {pair.address}")
+        pair.reserve_token = Web3.from_wei(log['args']['reserve0'], 'ether') if pair.token_index==0 else Web3.from_wei(log['args']['reserve1'], 'ether')
+        pair.reserve_eth = Web3.from_wei(log['args']['reserve1'], 'ether') if pair.token_index==0 else Web3.from_wei(log['args']['reserve0'], 'ether')
+
+    def wait_http_head(self, block_number):
+        # False when the HTTP node is still behind `block_number` after HTTP_HEAD_MAX_WAIT_SECONDS
+        deadline = time.time() + HTTP_HEAD_MAX_WAIT_SECONDS
+        while self.http_block_number < block_number:
+            self.http_block_number = self.w3.eth.block_number
+            if self.http_block_number >= block_number:
+                break
+            if time.time() > deadline:
+                logging.warning(f"WATCHER HTTP node at #{self.http_block_number} behind #{block_number}")
+                return False
+            time.sleep(HTTP_HEAD_POLL_SECONDS)
+        return True
 
     @timer_decorator
     def get_reserves_and_creator(self, pair_address, block_number):
-        contract = self.w3.eth.contract(address=pair_address, abi=self.pair_abi)
-        reserves = contract.functions.getReserves().call()
+        contract = self.registry.contract(self.w3, pair_address, self.pair_abi)
+        reserves = contract.functions.getReserves().call(block_identifier=block_number)
 
-        mint_logs = contract.events.Transfer().get_logs(
-            fromBlock=block_number,
-            toBlock=block_number,
-        )
+        mint_logs = [decode_transfer_log(log) for log in self.get_logs(pair_address, TRANSFER_TOPIC, block_number, block_number)]
 
         creator = None
-        if mint_logs != ():
+        if len(mint_logs)>0:
             for log in mint_logs:
                 if log['args']['to'] != ADDRESS_ZERO:
                     creator = log['args']['to']
@@ -104,120 +435,100 @@ class BlockWatcher(metaclass=Singleton):
 
     @timer_decorator
     def get_reserves(self, pair_address):
-        contract = self.w3.eth.contract(address=pair_address, abi=self.pair_abi)
+        contract = self.registry.contract(self.w3, pair_address, self.pair_abi)
         reserves = contract.functions.getReserves().call()
         return reserves
+
+    def get_logs(self, address, topic, from_block, to_block):
+        return self.w3.eth.get_logs({
+            'address': address,
+            'topics': [Web3.to_hex(topic)],
+            'fromBlock': from_block,
+            'toBlock': to_block,
+        })
     
     @timer_decorator
-    def filter_log_in_block(self, block_number, block_timestamp):
-        #block_number = 18432668 # TODO
-
-        def filter_paircreated_log(block_number):
-            pair_created_logs = self.factory.events.PairCreated().get_logs(
-                fromBlock = block_number,
-                toBlock = block_number,
-            )
-
-            pairs = []
-            if pair_created_logs != ():
-                for log in pair_created_logs:
-                    logging.debug(f"WATCHER found pair created {log}")
-                    if log['args']['token0'].lower() == self.weth_address.lower() or log['args']['token1'].lower() == self.weth_address.lower():
-                        pairs.append(Pair(
-                            token=log['args']['token0'] if log['args']['token1'].lower() == self.weth_address.lower() else log['args']['token1'],
-                            token_index=0 if log['args']['token1'].lower() == self.weth_address.lower() else 1,
-                            address=log['args']['pair'],
-                            created_at=block_timestamp,
-                        ))
-
-            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                future_to_pair = {executor.submit(self.get_reserves_and_creator, pair.address, block_number): idx for idx,pair in enumerate(pairs)}
-                for future in concurrent.futures.as_completed(future_to_pair):
-                    idx = future_to_pair[future]
-                    try:
-                        result = future.result()
-                        logging.debug(f"WATCHER getReserves {pairs[idx].address} result {result}")
-                        if result[0] is not None and len(result[0])>1:
-                            pairs[idx].reserve_token = Web3.from_wei(result[0][0],'ether') if pairs[idx].token_index == 0 else Web3.from_wei(result[0][1], 'ether')
-                            pairs[idx].reserve_eth = Web3.from_wei(result[0][1],'ether') if pairs[idx].token_index == 0 else Web3.from_wei(result[0][0], 'ether')
-                        
-                        if result[1] is not None:
-                            pairs[idx].creator = Web3.to_checksum_address(result[1])
-                    except Exception as e:
-                        logging.error(f"WATCHER getReserves {pairs[idx].address} error {e}")
-
-            return FilterLogs(
-                type=FilterLogsType.PAIR_CREATED,
-                data=pairs,
-            )
-
-        def filter_sync_log(pair, block_number) -> None:
-            pair_contract = self.w3.eth.contract(address=pair, abi=self.pair_abi)
-            sync_logs = pair_contract.events.Sync().get_logs(
-                fromBlock = block_number,
-                toBlock = block_number,
-            )
-
-            return FilterLogs(
-                type=FilterLogsType.SYNC,
-                data=sync_logs,
-            )
-        
-        def filter_swap_log(pair, block_number) -> None:
-            pair_contract = self.w3.eth.contract(address=pair, abi=self.pair_abi)
-            sync_logs = pair_contract.events.Swap().get_logs(
-                fromBlock = block_number,
-                toBlock = block_number,
-            )
-
-            return FilterLogs(
-                type=FilterLogsType.SWAP,
-                data=sync_logs,
-            )
-
-        pairs = []
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            future_to_contract = {executor.submit(filter_paircreated_log, block_number): self.factory.address}
-
-            if len(self.inventory)>0:
-                for pair in self.inventory:
-                    future_to_contract[executor.submit(filter_sync_log, pair.address, block_number)] = pair.address
-
-            for future in concurrent.futures.as_completed(future_to_contract):
-                contract = future_to_contract[future]
+    def backfill(self, from_block, to_block):
+        # blocks mined while no websocket was delivering, fetched with chunked range queries in parallel
+        # and replayed in order as catch-up BlockData before the live head
+        if to_block - from_block + 1 > BACKFILL_MAX_BLOCKS:
+            logging.warning(f"WATCHER gap of {to_block - from_block + 1} blocks exceeds {BACKFILL_MAX_BLOCKS}, backfill the latest ones only")
+            from_block = to_block - BACKFILL_MAX_BLOCKS + 1
+
+        inventory_addresses = [pair.address for pair in self.inventory]
+        tracked_addresses = self.swap_tracker.addresses()
+        chunks = [(start, min(start + BACKFILL_CHUNK_SIZE - 1, to_block)) for start in range(from_block, to_block + 1, BACKFILL_CHUNK_SIZE)]
+
+        pair_created_logs = {}
+        sync_logs = {}
+        swap_logs = {}
+        with ThreadPoolExecutor(max_workers=BACKFILL_WORKERS) as executor:
+            future_to_chunk = {executor.submit(self.get_logs, self.factory.address, PAIR_CREATED_TOPIC, start, end): (start, end) for start,end in chunks}
+            if len(inventory_addresses)>0:
+                for start,end in chunks:
+                    future_to_chunk[executor.submit(self.get_logs, inventory_addresses, SYNC_TOPIC, start, end)] = (start, end)
+            if len(tracked_addresses)>0:
+                for start,end in chunks:
+                    future_to_chunk[executor.submit(self.get_logs, tracked_addresses, SWAP_TOPIC, start, end)] = (start, end)
+
+            for future in concurrent.futures.as_completed(future_to_chunk):
                 try:
-                    result = future.result()
-                    logging.debug(f"contract {contract} result {result}")
-
-                    if result is not None and isinstance(result, FilterLogs):
-                        if result.type == FilterLogsType.PAIR_CREATED:
-                            if len(result.data)>0:
-                                pairs = result.data
-
-                        elif result.type == FilterLogsType.SYNC:
-                            if result.data != ():
-                                for log in result.data:
-                                    logging.debug(f"sync {log}")
+                    for log in future.result():
+                        if log_topic(log) == PAIR_CREATED_TOPIC:
+                            log = decode_pair_created_log(log)
+                            pair_created_logs.setdefault(log['blockNumber'], {})[log['args']['pair']] = log
+                        elif log_topic(log) == SYNC_TOPIC:
+                            log = decode_sync_log(log)
+                            sync_logs.setdefault(log['blockNumber'], []).append(log)
+                        elif log_topic(log) == SWAP_TOPIC:
+                            log = decode_swap_log(log)
+                            swap_logs.setdefault(log['blockNumber'], []).append(log)
+                except Exception as e:
+                    logging.error(f"WATCHER backfill blocks {future_to_chunk[future]} error {e}")
 
-                                    for pair in self.inventory:
-                                        if pair.address == contract:
-                                            logging.debug(f"WATCHER update reserves for inventory pair {pair.address}")
-                                            pair.reserve_token = Web3.from_wei(log['args']['reserve0'], 'ether') if pair.token_index==0 else Web3.from_wei(log['args']['reserve1'], 'ether')
-                                            pair.reserve_eth = Web3.from_wei(log['args']['reserve1'], 'ether') if pair.token_index==0 else Web3.from_wei(log['args']['reserve0'], 'ether')
+            # logs of the gap already pushed after reconnect
+            with glb_lock:
+                for number in [number for number in self.pending_pair_created if from_block <= number <= to_block]:
+                    pair_created_logs.setdefault(number, {}).update(self.pending_pair_created.pop(number))
+                pair_created_logs = {number: self.remember_flushed(logs) for number,logs in pair_created_logs.items()}
+                pair_created_logs = {number: logs for number,logs in pair_created_logs.items() if len(logs)>0}
+
+            # only blocks carrying events are replayed, their headers are fetched concurrently
+            block_numbers = sorted(set(pair_created_logs) | set(sync_logs))
+            headers = dict(zip(block_numbers, executor.map(self.w3.eth.get_block, block_numbers)))
+
+        for number in sorted(swap_logs):
+            for log in sorted(swap_logs[number], key=lambda log: log['logIndex']):
+                self.swap_tracker.apply(log)
+
+        for number in block_numbers:
+            for log in sorted(sync_logs.get(number, []), key=lambda log: log['logIndex']):
+                self.apply_ordered_sync_log(log)
+
+            header = headers[number]
+            pairs = self.resolve_pairs(self.build_pairs(pair_created_logs.get(number, {}).values(), header['timestamp']), number)
+            self.track_swaps(pairs, number, to_block)
+
+            logging.warning(f"WATCHER backfill block #{number} pairs {len(pairs)}")
+
+            self.block_broker.put(BlockData(
+                number,
+                header['timestamp'],
+                header['baseFeePerGas'],
+                header['gasUsed'],
+                header['gasLimit'],
+                pairs,
+                self.inventory,
+                trace=Trace(number).mark(TraceStage.HEADER_RECEIVED).mark(TraceStage.LOGS_FETCHED),
+            ))
 
-                except Exception as e:
-                    logging.error(f"WATCHER pair {contract} error {e}")
-        
-        return pairs
-    
     async def listen_report(self):
         global glb_lock
 
         def add_pair_to_inventory(pair):
             # sync current reserves
             result = self.get_reserves(pair.address)
-            logging.debug(f"WATCHER get reserves {pair.address} result {result}")
+            logging.debug("WATCHER get reserves %s result %s", pair.address, result)
 
             pair.reserve_token = Web3.from_wei(result[0],'ether') if pair.token_index == 0 else Web3.from_wei(result[1], 'ether')
             pair.reserve_eth = Web3.from_wei(result[1],'ether') if pair.token_index == 0 else Web3.from_wei(result[0], 'ether')
@@ -231,13 +542,14 @@ class BlockWatcher(metaclass=Singleton):
                 if pr.address == pair.address:
                     with glb_lock:
                         self.inventory.pop(idx)
+                        self.sync_positions.pop(pr.address, None)
                         logging.warning(f"WATCHER remove pair {pair.address} from inventory length {len(self.inventory)}")
 
         while True:
             report = await self.report_broker.coro_get()
 
             if report is not None and isinstance(report, ExecutionAck) and report.pair is not None:
-                logging.warning(f"WATCHER receive report {report}")
+                logging.warning("WATCHER receive report %s", report)
                 if report.is_buy and report.tx_status == TxStatus.SUCCESS:
                     if report.pair.address not in [pair.address for pair in self.inventory]:
                         add_pair_to_inventory(report.pair)
@@ -247,7 +559,7 @@ class BlockWatcher(metaclass=Singleton):
     
     async def main(self):
         await asyncio.gather(
-            self.listen_block(),
+            *[self.listen_block(wss_url) for wss_url in self.wss_urls],
             self.listen_report(),
         )
 
@@ -0,0 +1,249 @@
+import os
+import logging
+import time
+import threading
+import asyncio
+import websockets
+from collections import OrderedDict
+
+from web3 import AsyncWeb3, Web3
+from web3.providers import WebsocketProviderV2
+from web3.middleware import async_geth_poa_middleware
+
+import sys # for testing
+sys.path.append('..')
+
+from library import Singleton, to_bytes, decode_words
+from data import Pair, PendingLiquidity, PendingThreat, PendingThreatType
+from helpers import constants, calculate_pair_address, word_to_address, selector
+
+RECONNECT_SLEEP_SECONDS=1
+CREATOR_SELL_RESERVE_RATIO=0.05 # creator sells of at least 5% of the pooled tokens are treated as a dump
+
+# router methods removing liquidity, mapped to the number of leading token arguments
+REMOVE_LIQUIDITY_METHODS = {
+    selector('removeLiquidity(address,address,uint256,uint256,uint256,address,uint256)'): 2,
+    selector('removeLiquidityWithPermit(address,address,uint256,uint256,uint256,address,uint256,bool,uint8,bytes32,bytes32)'): 2,
+    bytes.fromhex(constants.REMOVE_LIQUIDITY_METHOD_ID[2:]): 1,
+    selector('removeLiquidityETHWithPermit(address,uint256,uint256,uint256,address,uint256,bool,uint8,bytes32,bytes32)'): 1,
+    selector('removeLiquidityETHSupportingFeeOnTransferTokens(address,uint256,uint256,uint256,address,uint256)'): 1,
+    selector('removeLiquidityETHWithPermitSupportingFeeOnTransferTokens(address,uint256,uint256,uint256,address,uint256,bool,uint8,bytes32,bytes32)'): 1,
+}
+
+# router methods selling tokens, mapped to the index of the amount-in argument; the path is always the 3rd argument
+SELL_METHODS = {
+    selector('swapExactTokensForETH(uint256,uint256,address[],address,uint256)'): 0,
+    selector('swapExactTokensForETHSupportingFeeOnTransferTokens(uint256,uint256,address[],address,uint256)'): 0,
+    selector('swapExactTokensForTokens(uint256,uint256,address[],address,uint256)'): 0,
+    selector('swapExactTokensForTokensSupportingFeeOnTransferTokens(uint256,uint256,address[],address,uint256)'): 0,
+    selector('swapTokensForExactETH(uint256,uint256,address[],address,uint256)'): 1,
+    selector('swapTokensForExactTokens(uint256,uint256,address[],address,uint256)'): 1,
+}
+
+PAIR_BURN_METHOD = selector('burn(address)')
+HARMLESS_OWNER_METHODS = {
+    selector('transfer(address,uint256)'),
+    selector('approve(address,uint256)'),
+}
+
+glb_lock = threading.Lock()
+
+def to_int(value):
+    if isinstance(value, str):
+        return Web3.to_int(hexstr=value)
+    return int(value)
+
+class MempoolWatcher(metaclass=Singleton):
+    def __init__(self, wss_url, pending_broker, factory_address, weth_address, router_address=constants.UNI_V2_ROUTER_ADDRESS, init_code_hash=constants.UNI_V2_PAIR_INIT_CODE_HASH, inventory=None) -> None:
+        self.wss_url = wss_url
+        self.pending_broker = pending_broker
+
+        self.factory_address = Web3.to_checksum_address(factory_address)
+        self.weth_address = Web3.to_checksum_address(weth_address)
+        self.router_address = router_address.lower()
+        self.init_code_hash = init_code_hash
+
+        self.add_liquidity_method_id = to_bytes(constants.ADD_LIQUIDITY_METHOD_ID)
+        self.seen = OrderedDict() # insertion order is the order of received_at
+
+        # pairs held in inventory, shared with the block watcher which keeps it up to date from execution acks
+        self.inventory = inventory if inventory is not None else []
+        self.held = {}
+        self.held_key = ()
+        self.alerted = set()
+
+    def refresh_held(self):
+        # index held pairs by both token and pair address, rebuilt only when the inventory changes
+        held_key = tuple(pair.address for pair in self.inventory)
+        if held_key != self.held_key:
+            held = {}
+            for pair in self.inventory:
+                held[pair.token.lower()] = pair
+                held[pair.address.lower()] = pair
+            self.held = held
+            self.held_key = held_key
+            self.alerted = {address for address in self.alerted if address in held}
+
+    def detect_router_threat(self, tx, method_id, calldata) -> PendingThreat:
+        words = decode_words(calldata[4:])
+
+        if method_id in REMOVE_LIQUIDITY_METHODS:
+            for word in words[:REMOVE_LIQUIDITY_METHODS[method_id]]:
+                pair = self.held.get(word_to_address(word))
+                if pair is not None:
+                    return self.build_threat(PendingThreatType.REMOVE_LIQUIDITY, pair, tx)
+
+        elif method_id in SELL_METHODS and len(words) > 3:
+            # path offset is relative to the arguments, its first element is the token being sold
+            path_index = words[2]//32
+            if path_index + 1 < len(words) and words[path_index] > 0:
+                pair = self.held.get(word_to_address(words[path_index + 1]))
+                if pair is not None and pair.creator is not None and tx['from'].lower() == pair.creator.lower():
+                    amount_in = words[SELL_METHODS[method_id]]
+                    if pair.reserve_token == 0 or amount_in >= Web3.to_wei(pair.reserve_token, 'ether')*CREATOR_SELL_RESERVE_RATIO:
+                        return self.build_threat(PendingThreatType.CREATOR_SELL, pair, tx)
+
+        return None
+
+    def detect_direct_threat(self, tx, to, calldata) -> PendingThreat:
+        pair = self.held[to]
+        method_id = calldata[:4]
+
+        if to == pair.address.lower():
+            if method_id == PAIR_BURN_METHOD:
+                return self.build_threat(PendingThreatType.REMOVE_LIQUIDITY, pair, tx)
+        elif pair.creator is not None and tx['from'].lower() == pair.creator.lower() and len(calldata) >= 4 and method_id not in HARMLESS_OWNER_METHODS:
+            # fee/limit setters, blacklists, pauses... anything the owner calls on the token itself
+            return self.build_threat(PendingThreatType.OWNER_CALL, pair, tx)
+
+        return None
+
+    def build_threat(self, type, pair, tx) -> PendingThreat:
+        return PendingThreat(
+            type=type,
+            pair=pair,
+            tx_hash=Web3.to_hex(to_bytes(tx['hash'])),
+            sender=Web3.to_checksum_address(tx['from']),
+            received_at=time.time(),
+        )
+
+    def decode_add_liquidity(self, tx) -> PendingLiquidity:
+        # addLiquidityETH(address token, uint amountTokenDesired, uint amountTokenMin, uint amountETHMin, address to, uint deadline)
+        calldata = to_bytes(tx['input'])
+        words = decode_words(calldata[4:])
+        if len(words) < 6:
+            return None
+
+        token = Web3.to_checksum_address(word_to_address(words[0]))
+        pair_address = calculate_pair_address(self.factory_address, token, self.weth_address, self.init_code_hash)
+
+        amount_token = Web3.from_wei(words[1], 'ether')
+        amount_eth = Web3.from_wei(to_int(tx['value']), 'ether')
+
+        return PendingLiquidity(
+            pair=Pair(
+                token=token,
+                token_index=0 if token.lower() < self.weth_address.lower() else 1,
+                address=pair_address,
+                reserve_token=amount_token,
+                reserve_eth=amount_eth,
+                creator=Web3.to_checksum_address(tx['from']),
+            ),
+            tx_hash=Web3.to_hex(to_bytes(tx['hash'])),
+            amount_token=amount_token,
+            amount_eth=amount_eth,
+            received_at=time.time(),
+        )
+
+    def handle_pending_tx(self, tx):
+        if tx.get('to') is None:
+            return
+
+        to = tx['to'].lower()
+        if to != self.router_address and to not in self.held:
+            return
+
+        calldata = to_bytes(tx['input'])
+        method_id = calldata[:4]
+
+        threat = None
+        if to != self.router_address:
+            threat = self.detect_direct_threat(tx, to, calldata)
+        elif method_id == self.add_liquidity_method_id:
+            pending = self.decode_add_liquidity(tx)
+            if pending is not None and pending.pair.address not in self.seen:
+                with glb_lock:
+                    self.seen[pending.pair.address] = pending.received_at
+                logging.warning("MEMPOOL found %s", pending)
+                self.pending_broker.put(pending)
+        elif len(self.held) > 0:
+            threat = self.detect_router_threat(tx, method_id, calldata)
+
+        if threat is not None and threat.pair.address.lower() not in self.alerted:
+            # one alert per held pair, the position is liquidated right away
+            self.alerted.add(threat.pair.address.lower())
+            logging.warning("MEMPOOL found %s", threat)
+            self.pending_broker.put(threat)
+
+    def evict_seen(self):
+        # the oldest first, stops at the first entry still fresh
+        now = time.time()
+        with glb_lock:
+            while len(self.seen) > 0 and now - next(iter(self.seen.values())) >= 3600:
+                self.seen.popitem(last=False)
+
+    async def listen_pending_tx(self):
+        async for w3Async in AsyncWeb3.persistent_websocket(WebsocketProviderV2(self.wss_url)):
+            w3Async.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+
+            try:
+                logging.warning(f"MEMPOOL websocket connected...")
+
+                # full transaction bodies, so no eth_getTransactionByHash round trip per pending tx
+                subscription_id = await w3Async.eth.subscribe("newPendingTransactions", True)
+                async for response in w3Async.ws.process_subscriptions():
+                    tx = response['result']
+                    if isinstance(tx, dict):
+                        self.refresh_held()
+                        try:
+                            self.handle_pending_tx(tx)
+                        except Exception as e:
+                            logging.error(f"MEMPOOL handle pending tx error {e}")
+
+                    if len(self.seen) > 1000:
+                        self.evict_seen()
+
+            except websockets.ConnectionClosed:
+                logging.error(f"MEMPOOL websocket connection closed, reconnect...")
+                await asyncio.sleep(RECONNECT_SLEEP_SECONDS)
+                continue
+
+    async def main(self):
+        await self.listen_pending_tx()
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    import aioprocessing
+
+    pending_broker = aioprocessing.AioQueue()
+
+    mempool_watcher = MempoolWatcher(
+        wss_url=os.environ.get('WSS_URL').split(',')[0],
+        pending_broker=pending_broker,
+        factory_address=os.environ.get('FACTORY_ADDRESS'),
+        weth_address=os.environ.get('WETH_ADDRESS'),
+        router_address=os.environ.get('ROUTER_ADDRESS', constants.UNI_V2_ROUTER_ADDRESS),
+    )
+
+    async def receive_pending():
+        while True:
+            pending = await pending_broker.coro_get()
+            logging.info(f"receive {pending}")
+
+    async def run_all():
+        await asyncio.gather(mempool_watcher.main(), receive_pending())
+
+    asyncio.run(run_all())